@@ -182,6 +182,8 @@ async def update_project(project_id: str, project_in: ProjectUpdate, current_use
         update_data['updated_at'] = datetime.utcnow()
         
         doc_ref.update(update_data)
+        if "outline" in update_data:
+            get_speculator().cancel_project(project_id)
         
         # Return updated document
         updated_doc = doc_ref.get()
@@ -210,6 +212,7 @@ async def delete_project(project_id: str, current_user: dict = Depends(get_curre
              raise HTTPException(status_code=403, detail="Not authorized to delete this project")
 
         doc_ref.delete()
+        get_speculator().cancel_project(project_id)
         return None
     except HTTPException:
         raise
@@ -359,6 +362,9 @@ async def add_section(
             "updated_at": datetime.utcnow()
         })
 
+        # Outline changed - speculative results for this project are stale
+        get_speculator().cancel_project(project_id)
+
         return new_section
 
     except HTTPException:
@@ -405,6 +411,9 @@ async def delete_section(
             "updated_at": datetime.utcnow()
         })
 
+        # Outline changed - speculative results for this project are stale
+        get_speculator().cancel_project(project_id)
+
         return None
 
     except HTTPException:
@@ -457,6 +466,9 @@ async def reorder_outline(
             "updated_at": datetime.utcnow()
         })
 
+        # Outline changed - speculative results for this project are stale
+        get_speculator().cancel_project(project_id)
+
         return reordered_sections
 
     except HTTPException:
@@ -465,8 +477,46 @@ async def reorder_outline(
         raise HTTPException(status_code=500, detail=f"Failed to reorder sections: {str(e)}")
 
 from app.models import SuggestOutlineRequest, GenerateContentRequest, Section, GenerationHistoryItem
+from app.models import GenerateAllRequest, GenerateAllResponse, SectionGenerationResult
 from app.core.llm import get_llm_adapter
+from app.core.scheduler import llm_request_context, get_llm_scheduler_stats, PRIORITY_BULK
+from app.core.singleflight import get_single_flight, get_single_flight_stats, input_hash
+from app.core.speculation import get_speculator, get_speculation_stats
+from app.core.streaming import format_sse, IncrementalMarkdownRenderer
+from fastapi.responses import StreamingResponse
+import asyncio
 import hashlib
+import time
+
+def _generation_history_item(section_title: str, content_data: dict) -> GenerationHistoryItem:
+    prompt_used = f"Generate section '{section_title}'..." # Simplified for logging
+    return GenerationHistoryItem(
+        timestamp=datetime.utcnow(),
+        prompt=prompt_used,
+        response=content_data,
+        model_meta={"provider": os.getenv("LLM_PROVIDER", "mock"), **content_data.get("model_meta", {})},
+        hash=hashlib.sha256((prompt_used + str(content_data)).encode()).hexdigest()
+    )
+
+def _section_generation_kwargs(project_data: dict, sections: List[Section], section: Section, use_rag: bool) -> dict:
+    """agenerate_section arguments for a section in its outline context"""
+    return {
+        "title": section.title,
+        "topic": project_data.get("title", "Document"),
+        "word_count": section.word_count,
+        "outline_context": [s.title for s in sections],
+        "doc_type": project_data.get("doc_type", "docx"),
+        "section_position": next((idx + 1 for idx, s in enumerate(sections) if s.id == section.id), 0),
+        "use_rag": use_rag
+    }
+
+async def _agenerate_section(adapter, project_id: str, section_id: str, kwargs: dict) -> dict:
+    """Use the speculative result for this section if one is ready (or running), else generate"""
+    content_data = await get_speculator().take(project_id, section_id, kwargs)
+    if content_data is not None:
+        logger.info(f"Speculative hit for project {project_id}, section {section_id}")
+        return content_data
+    return await adapter.agenerate_section(**kwargs)
 
 @router.post("/projects/{project_id}/suggest-outline", response_model=List[Section])
 async def suggest_outline(project_id: str, request: SuggestOutlineRequest, current_user: dict = Depends(get_current_user)):
@@ -484,46 +534,62 @@ async def suggest_outline(project_id: str, request: SuggestOutlineRequest, curre
     if project_data['owner_uid'] != current_user['uid']:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    adapter = get_llm_adapter()
-    try:
-        # Get document type from project data (default to docx if not specified)
-        doc_type = project_data.get("doc_type", "docx")
-
-        # Get existing sections from project
-        existing_sections_data = project_data.get("outline", [])
-        existing_sections = [Section(**s) for s in existing_sections_data]
-        existing_titles = [s.title for s in existing_sections]
-
-        # Generate outline with document type context and existing sections
-        outline_data = adapter.generate_outline(
-            request.topic,
-            doc_type=doc_type,
-            existing_sections=existing_titles if existing_titles else None
-        )
+    async def run():
+        adapter = get_llm_adapter()
+        try:
+            # Get document type from project data (default to docx if not specified)
+            doc_type = project_data.get("doc_type", "docx")
+
+            # Get existing sections from project
+            existing_sections_data = project_data.get("outline", [])
+            existing_sections = [Section(**s) for s in existing_sections_data]
+            existing_titles = [s.title for s in existing_sections]
+
+            # Generate outline with document type context and existing sections
+            outline_data = await adapter.agenerate_outline(
+                request.topic,
+                doc_type=doc_type,
+                existing_sections=existing_titles if existing_titles else None,
+                use_cache=request.use_cache is not False
+            )
 
-        # Create new section objects with deduplication
-        new_sections = []
-        existing_titles_lower = [title.lower().strip() for title in existing_titles]
-
-        for item in outline_data:
-            new_title = item.get("title", "Untitled")
-            # Skip if this title already exists (case-insensitive)
-            if new_title.lower().strip() not in existing_titles_lower:
-                new_sections.append(Section(
-                    id=item.get("id", str(uuid.uuid4())),
-                    title=new_title,
-                    word_count=item.get("word_count", 0),
-                    status="queued"
-                ))
-
-        # Combine existing and new sections
-        all_sections = existing_sections + new_sections
-
-        # Update project with combined outline
-        doc_ref.update({"outline": [s.dict() for s in all_sections], "updated_at": datetime.utcnow()})
-        return new_sections  # Return only the newly generated sections
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM Error: {str(e)}")
+            # Create new section objects with deduplication
+            new_sections = []
+            existing_titles_lower = [title.lower().strip() for title in existing_titles]
+
+            for item in outline_data:
+                new_title = item.get("title", "Untitled")
+                # Skip if this title already exists (case-insensitive)
+                if new_title.lower().strip() not in existing_titles_lower:
+                    new_sections.append(Section(
+                        id=item.get("id", str(uuid.uuid4())),
+                        title=new_title,
+                        word_count=item.get("word_count", 0),
+                        status="queued"
+                    ))
+
+            # Combine existing and new sections
+            all_sections = existing_sections + new_sections
+
+            # Update project with combined outline
+            doc_ref.update({"outline": [s.dict() for s in all_sections], "updated_at": datetime.utcnow()})
+
+            # Optionally start generating the first queued sections before the user asks
+            speculative_sections = request.speculative_sections
+            if speculative_sections is None:
+                speculative_sections = int(os.getenv("SPECULATIVE_GENERATION_SECTIONS", "0"))
+            if speculative_sections > 0:
+                queued = [s for s in all_sections if s.status == "queued"][:speculative_sections]
+                get_speculator().start(project_id, adapter, [
+                    (s.id, _section_generation_kwargs(project_data, all_sections, s, use_rag=False)) for s in queued
+                ])
+
+            return new_sections  # Return only the newly generated sections
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"LLM Error: {str(e)}")
+
+    # Concurrent duplicates (double-click, client retry) share one in-flight call
+    return await get_single_flight().do("outline", (project_id, input_hash(request.dict())), run)
 
 @router.post("/projects/{project_id}/generate", response_model=Section)
 async def generate_content(project_id: str, request: GenerateContentRequest, current_user: dict = Depends(get_current_user)):
@@ -548,68 +614,324 @@ async def generate_content(project_id: str, request: GenerateContentRequest, cur
     if not target_section:
         raise HTTPException(status_code=404, detail="Section not found")
 
-    # Update status to generating
-    target_section.status = "generating"
-    doc_ref.update({"outline": [s.dict() for s in sections]})
+    async def run():
+        # Update status to generating
+        target_section.status = "generating"
+        doc_ref.update({"outline": [s.dict() for s in sections]})
 
-    adapter = get_llm_adapter()
-    try:
-        # Build outline context (all section titles)
-        outline_context = [s.title for s in sections]
-
-        # Find the position of the current section
-        section_position = next((idx + 1 for idx, s in enumerate(sections) if s.id == request.section_id), 0)
-
-        # Get document type (default to docx if not specified)
-        doc_type = project_data.get("doc_type", "docx")
-
-        # Generate with full context (with optional RAG)
-        content_data = adapter.generate_section(
-            title=target_section.title,
-            topic=project_data.get("title", "Document"),
-            word_count=target_section.word_count,
-            outline_context=outline_context,
-            doc_type=doc_type,
-            section_position=section_position,
-            use_rag=request.use_rag or False
-        )
+        adapter = get_llm_adapter()
+        try:
+            # Generate with full context (with optional RAG); outline context is all section titles
+            generation_kwargs = _section_generation_kwargs(project_data, sections, target_section, request.use_rag or False)
+            content_data = await _agenerate_section(adapter, project_id, target_section.id, generation_kwargs)
 
-        # Update section
-        target_section.content = content_data.get("text", "")
-        target_section.bullets = content_data.get("bullets", [])
-        target_section.status = "done"
+            # Update section
+            target_section.content = content_data.get("text", "")
+            target_section.bullets = content_data.get("bullets", [])
+            target_section.status = "done"
         
-        # Record history
-        prompt_used = f"Generate section '{target_section.title}'..." # Simplified for logging
-        history_item = GenerationHistoryItem(
-            timestamp=datetime.utcnow(),
-            prompt=prompt_used,
-            response=content_data,
-            model_meta={"provider": os.getenv("LLM_PROVIDER", "mock")},
-            hash=hashlib.sha256((prompt_used + str(content_data)).encode()).hexdigest()
-        )
+            # Record history
+            history_item = _generation_history_item(target_section.title, content_data)
         
-        # Update DB
-        # Note: Firestore array_union might be cleaner but we need to update the specific section in the array too
-        # So we just replace the whole outline array
+            # Update DB
+            # Note: Firestore array_union might be cleaner but we need to update the specific section in the array too
+            # So we just replace the whole outline array
         
-        current_history = project_data.get("generation_history", [])
-        current_history.append(history_item.dict())
+            current_history = project_data.get("generation_history", [])
+            current_history.append(history_item.dict())
         
+            doc_ref.update({
+                "outline": [s.dict() for s in sections],
+                "generation_history": current_history,
+                "updated_at": datetime.utcnow()
+            })
+        
+            return target_section
+        
+        except Exception as e:
+            target_section.status = "failed"
+            doc_ref.update({"outline": [s.dict() for s in sections]})
+            raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+    # Concurrent duplicates (double-click, client retry) share one in-flight call
+    return await get_single_flight().do("generate", (project_id, request.section_id, input_hash(request.dict())), run)
+
+@router.post("/projects/{project_id}/generate/stream")
+async def generate_content_stream(project_id: str, request: GenerateContentRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Streaming variant of /generate (Server-Sent Events).
+
+    Events: "token" ({"delta", "closed_html", "tail_html"}, see
+    IncrementalMarkdownRenderer.update) while the section is written, then
+    "done" with the saved section, or "error". If the client disconnects
+    first, the section goes back to "queued".
+    """
+    db = get_db()
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    doc_ref = db.collection("projects").document(project_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project_data = doc.to_dict()
+    if project_data['owner_uid'] != current_user['uid']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    sections = [Section(**s) for s in project_data.get('outline', [])]
+    target_section = next((s for s in sections if s.id == request.section_id), None)
+
+    if not target_section:
+        raise HTTPException(status_code=404, detail="Section not found")
+
+    target_section.status = "generating"
+    doc_ref.update({"outline": [s.dict() for s in sections]})
+
+    adapter = get_llm_adapter()
+    generation_kwargs = _section_generation_kwargs(project_data, sections, target_section, request.use_rag or False)
+
+    async def section_events():
+        # A speculative result is already complete - skip straight to the result
+        content_data = await get_speculator().take(project_id, target_section.id, generation_kwargs)
+        if content_data is not None:
+            yield {"type": "result", "data": content_data}
+            return
+        async for event in adapter.astream_section(**generation_kwargs):
+            yield event
+
+    async def event_stream():
+        renderer = IncrementalMarkdownRenderer()
+        markdown_text = ""
+        events = section_events()
+        try:
+            async for event in events:
+                if event["type"] == "token":
+                    markdown_text += event["delta"]
+                    yield format_sse("token", {"delta": event["delta"], **renderer.update(markdown_text)})
+                    continue
+
+                content_data = event["data"]
+                target_section.content = content_data.get("text", "")
+                target_section.bullets = content_data.get("bullets", [])
+                target_section.status = "done"
+
+                current_history = project_data.get("generation_history", [])
+                current_history.append(_generation_history_item(target_section.title, content_data).dict())
+
+                doc_ref.update({
+                    "outline": [s.dict() for s in sections],
+                    "generation_history": current_history,
+                    "updated_at": datetime.utcnow()
+                })
+                yield format_sse("done", target_section.dict())
+        except Exception as e:
+            target_section.status = "failed"
+            doc_ref.update({"outline": [s.dict() for s in sections]})
+            yield format_sse("error", {"detail": f"Generation failed: {str(e)}"})
+        finally:
+            # Stop the LLM stream now rather than whenever the generator is collected
+            await events.aclose()
+            if target_section.status == "generating":
+                # Client disconnected (GeneratorExit/CancelledError) - don't leave the section stuck
+                logger.info(f"Streaming generation abandoned for project {project_id}, section {target_section.id}")
+                target_section.status = "queued"
+                doc_ref.update({"outline": [s.dict() for s in sections]})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/projects/{project_id}/generate-all", response_model=GenerateAllResponse)
+async def generate_all_content(project_id: str, request: GenerateAllRequest, current_user: dict = Depends(get_current_user)):
+    """Generate every queued section (or the given section_ids) concurrently, saving once at the end"""
+    db = get_db()
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    doc_ref = db.collection("projects").document(project_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project_data = doc.to_dict()
+    if project_data['owner_uid'] != current_user['uid']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    sections = [Section(**s) for s in project_data.get('outline', [])]
+    if request.section_ids is not None:
+        section_map = {s.id: s for s in sections}
+        missing = [sid for sid in request.section_ids if sid not in section_map]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Section {missing[0]} not found")
+        targets = [section_map[sid] for sid in dict.fromkeys(request.section_ids)]
+    else:
+        targets = [s for s in sections if s.status == "queued"]
+
+    max_concurrency = request.max_concurrency or int(os.getenv("GENERATE_ALL_CONCURRENCY", "4"))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    adapter = get_llm_adapter()
+    history_items = []
+    completed = 0
+
+    logger.info(f"Bulk generation started for project {project_id}: {len(targets)} sections, concurrency {max_concurrency}")
+
+    async def generate_one(section: Section) -> SectionGenerationResult:
+        nonlocal completed
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                generation_kwargs = _section_generation_kwargs(project_data, sections, section, request.use_rag or False)
+                content_data = await _agenerate_section(adapter, project_id, section.id, generation_kwargs)
+                section.content = content_data.get("text", "")
+                section.bullets = content_data.get("bullets", [])
+                section.status = "done"
+                history_items.append(_generation_history_item(section.title, content_data).dict())
+                error = None
+            except Exception as e:
+                section.status = "failed"
+                error = str(e)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+
+        completed += 1
+        logger.info(f"Bulk generation [{completed}/{len(targets)}] section {section.id}: {section.status} in {duration_ms}ms")
+        return SectionGenerationResult(section_id=section.id, status=section.status, error=error, duration_ms=duration_ms)
+
+    # Bulk priority: queued interactive calls (refines etc.) are scheduled ahead of these
+    with llm_request_context(PRIORITY_BULK):
+        results = await asyncio.gather(*(generate_one(s) for s in targets))
+
+    if targets:
+        current_history = project_data.get("generation_history", [])
+        current_history.extend(history_items)
         doc_ref.update({
             "outline": [s.dict() for s in sections],
             "generation_history": current_history,
             "updated_at": datetime.utcnow()
         })
-        
-        return target_section
-        
-    except Exception as e:
-        target_section.status = "failed"
-        doc_ref.update({"outline": [s.dict() for s in sections]})
-        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+    return GenerateAllResponse(sections=targets, results=list(results))
 
 from app.models import RefineRequest, CommentRequest, Refinement, Comment
+from app.models import RefineBatchRequest, RefineBatchResponse, SectionRefinementResult
+from app.core.selection import resolve_selection, context_window, splice
+from app.core.history import entries_to_fold
+
+def _refine_context(project_data: dict, sections: List[Section], unit_id: str, request: RefineRequest) -> dict:
+    """Build the adapter keyword arguments for refining one section with full document context"""
+    # Build outline context (all section titles)
+    outline_context = [s.title for s in sections]
+
+    # Get document type (default to docx if not specified)
+    doc_type = project_data.get("doc_type", "docx")
+
+    # Find section position
+    section_idx = next((idx for idx, s in enumerate(sections) if s.id == unit_id), -1)
+    section_position = section_idx + 1
+    total_sections = len(sections)
+    target_section = sections[section_idx]
+
+    # Build adjacent section context
+    previous_section_context = None
+    next_section_context = None
+
+    if section_idx > 0:
+        prev = sections[section_idx - 1]
+        previous_section_context = f"Title: '{prev.title}'"
+        if prev.bullets:
+            previous_section_context += f"\nKey points: {', '.join(prev.bullets[:3])}"
+
+    if section_idx < len(sections) - 1 and section_idx >= 0:
+        next_sec = sections[section_idx + 1]
+        next_section_context = f"Title: '{next_sec.title}'"
+
+    return dict(
+        current_text=target_section.content or "",
+        history=[h.dict() for h in target_section.refinement_history],
+        instructions=request.prompt,
+        current_bullets=target_section.bullets,
+        doc_title=project_data.get("title", "Document"),
+        outline_context=outline_context,
+        doc_type=doc_type,
+        section_title=target_section.title,
+        section_position=section_position,
+        total_sections=total_sections,
+        target_word_count=request.target_word_count,
+        previous_section_context=previous_section_context,
+        next_section_context=next_section_context,
+        history_summary=target_section.history_summary
+    )
+
+def _apply_refinement(target_section: Section, request: RefineRequest, refinement_data: dict) -> Refinement:
+    """Record a Refinement and update the section content, bullets and version in place"""
+    new_refinement = Refinement(
+        id=str(uuid.uuid4()),
+        user_id=request.user_id,
+        prompt=request.prompt,
+        raw_response=str(refinement_data),
+        parsed_text=refinement_data.get("text", ""),
+        diff_summary=refinement_data.get("diff_summary", ""),
+        model_meta=refinement_data.get("model_meta"),
+        selection=refinement_data.get("selection"),
+        created_at=datetime.utcnow()
+    )
+
+    # Update section content and bullets
+    target_section.content = new_refinement.parsed_text
+    if refinement_data.get("bullets"):
+        target_section.bullets = refinement_data.get("bullets")
+    target_section.refinement_history.append(new_refinement)
+    target_section.version += 1
+    return new_refinement
+
+async def _compact_history(adapter, project_data: dict, target_section: Section):
+    """
+    Fold the oldest refinements into the section's rolling summary, run
+    alongside the refinement itself. Returns (folded count, summary) or None.
+    """
+    count = entries_to_fold(len(target_section.refinement_history))
+    if not count:
+        return None
+    entries = [h.dict() for h in target_section.refinement_history[:count]]
+    try:
+        # Not on the user's critical path: queue behind interactive calls
+        with llm_request_context(PRIORITY_BULK):
+            summary = await adapter.asummarize_history(target_section.history_summary, entries, project_data.get("doc_type", "docx"))
+    except Exception as e:
+        print(f"[History Compaction Warning] Keeping full history for section {target_section.id}: {e}")
+        return None
+    return count, summary
+
+def _apply_compaction(target_section: Section, compaction) -> None:
+    if compaction:
+        count, summary = compaction
+        target_section.history_summary = summary
+        target_section.history_summarized += count
+        target_section.refinement_history = target_section.refinement_history[count:]
+
+def _selection_span(target_section: Section, request: RefineRequest):
+    """(start, end) of the requested selection in the section HTML, None for whole-section refinement"""
+    if request.selection is None:
+        return None
+    try:
+        return resolve_selection(target_section.content or "", **request.selection.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid selection: {str(e)}")
+
+async def _refine_selection(adapter, project_data: dict, target_section: Section, request: RefineRequest, span) -> dict:
+    """Refine only the selected span (plus a small context window) and splice it back into the section HTML"""
+    content = target_section.content or ""
+    start, end = span
+    context_before, context_after = context_window(content, start, end)
+    result = await adapter.arefine_selection(
+        content[start:end], request.prompt, context_before, context_after,
+        doc_title=project_data.get("title", "Document"),
+        section_title=target_section.title,
+        doc_type=project_data.get("doc_type", "docx")
+    )
+    return dict(result, text=splice(content, start, end, result["text"]), selection={"start": start, "end": end})
 
 @router.post("/projects/{project_id}/units/{unit_id}/refine", response_model=Section)
 async def refine_unit(project_id: str, unit_id: str, request: RefineRequest, current_user: dict = Depends(get_current_user)):
@@ -632,68 +954,21 @@ async def refine_unit(project_id: str, unit_id: str, request: RefineRequest, cur
     if not target_section:
         raise HTTPException(status_code=404, detail="Unit not found")
         
+    span = _selection_span(target_section, request)
     adapter = get_llm_adapter()
     try:
-        # Build outline context (all section titles)
-        outline_context = [s.title for s in sections]
-
-        # Get document type (default to docx if not specified)
-        doc_type = project_data.get("doc_type", "docx")
-
-        # Find section position
-        section_idx = next((idx for idx, s in enumerate(sections) if s.id == unit_id), -1)
-        section_position = section_idx + 1
-        total_sections = len(sections)
-
-        # Build adjacent section context
-        previous_section_context = None
-        next_section_context = None
-
-        if section_idx > 0:
-            prev = sections[section_idx - 1]
-            previous_section_context = f"Title: '{prev.title}'"
-            if prev.bullets:
-                previous_section_context += f"\nKey points: {', '.join(prev.bullets[:3])}"
-
-        if section_idx < len(sections) - 1 and section_idx >= 0:
-            next_sec = sections[section_idx + 1]
-            next_section_context = f"Title: '{next_sec.title}'"
-
-        # Call LLM with full context including document title and outline
-        refinement_data = adapter.refine_section(
-            current_text=target_section.content or "",
-            history=[h.dict() for h in target_section.refinement_history],
-            instructions=request.prompt,
-            current_bullets=target_section.bullets,
-            doc_title=project_data.get("title", "Document"),
-            outline_context=outline_context,
-            doc_type=doc_type,
-            section_title=target_section.title,
-            section_position=section_position,
-            total_sections=total_sections,
-            target_word_count=request.target_word_count,
-            previous_section_context=previous_section_context,
-            next_section_context=next_section_context
-        )
+        if span:
+            # Micro-edit: only the selected span goes to the LLM
+            refinement = _refine_selection(adapter, project_data, target_section, request, span)
+        else:
+            # Call LLM with full context including document title and outline
+            refinement = adapter.arefine_section(**_refine_context(project_data, sections, unit_id, request))
+        refinement_data, compaction = await asyncio.gather(refinement, _compact_history(adapter, project_data, target_section))
+
+        # Create Refinement record and update the section
+        _apply_refinement(target_section, request, refinement_data)
+        _apply_compaction(target_section, compaction)
 
-        # Create Refinement record
-        new_refinement = Refinement(
-            id=str(uuid.uuid4()),
-            user_id=request.user_id,
-            prompt=request.prompt,
-            raw_response=str(refinement_data),
-            parsed_text=refinement_data.get("text", ""),
-            diff_summary=refinement_data.get("diff_summary", ""),
-            created_at=datetime.utcnow()
-        )
-        
-        # Update section content and bullets
-        target_section.content = new_refinement.parsed_text
-        if refinement_data.get("bullets"):
-            target_section.bullets = refinement_data.get("bullets")
-        target_section.refinement_history.append(new_refinement)
-        target_section.version += 1
-        
         # Save
         doc_ref.update({
             "outline": [s.dict() for s in sections],
@@ -705,6 +980,155 @@ async def refine_unit(project_id: str, unit_id: str, request: RefineRequest, cur
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Refinement failed: {str(e)}")
 
+@router.post("/projects/{project_id}/refine-batch", response_model=RefineBatchResponse)
+async def refine_batch(project_id: str, request: RefineBatchRequest, current_user: dict = Depends(get_current_user)):
+    """Apply one instruction to many sections concurrently, saving every refinement in one write"""
+    db = get_db()
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    doc_ref = db.collection("projects").document(project_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project_data = doc.to_dict()
+    if project_data['owner_uid'] != current_user['uid']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    sections = [Section(**s) for s in project_data.get('outline', [])]
+    if request.section_ids is not None:
+        section_map = {s.id: s for s in sections}
+        missing = [sid for sid in request.section_ids if sid not in section_map]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Section {missing[0]} not found")
+        targets = [section_map[sid] for sid in dict.fromkeys(request.section_ids)]
+    else:
+        targets = [s for s in sections if s.content]
+
+    # Every prompt sees the document as it was before the batch, not half-refined neighbours
+    refine_kwargs = {s.id: _refine_context(project_data, sections, s.id, request) for s in targets}
+
+    max_concurrency = request.max_concurrency or int(os.getenv("REFINE_BATCH_CONCURRENCY", "4"))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    adapter = get_llm_adapter()
+
+    logger.info(f"Batch refinement started for project {project_id}: {len(targets)} sections, concurrency {max_concurrency}")
+
+    async def refine_one(section: Section) -> SectionRefinementResult:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if not section.content:
+                    raise ValueError("Section has no content to refine")
+                refinement_data, compaction = await asyncio.gather(
+                    adapter.arefine_section(**refine_kwargs[section.id]),
+                    _compact_history(adapter, project_data, section)
+                )
+                refinement_id = _apply_refinement(section, request, refinement_data).id
+                _apply_compaction(section, compaction)
+                status, error = "done", None
+            except Exception as e:
+                refinement_id, status, error = None, "failed", str(e)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+
+        logger.info(f"Batch refinement section {section.id}: {status} in {duration_ms}ms")
+        return SectionRefinementResult(section_id=section.id, status=status, refinement_id=refinement_id, error=error, duration_ms=duration_ms)
+
+    with llm_request_context(PRIORITY_BULK):
+        results = await asyncio.gather(*(refine_one(s) for s in targets))
+
+    if any(r.status == "done" for r in results):
+        doc_ref.update({
+            "outline": [s.dict() for s in sections],
+            "updated_at": datetime.utcnow()
+        })
+
+    return RefineBatchResponse(sections=targets, results=list(results))
+
+@router.post("/projects/{project_id}/units/{unit_id}/refine/stream")
+async def refine_unit_stream(project_id: str, unit_id: str, request: RefineRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Streaming variant of /refine (Server-Sent Events).
+
+    Events: "token" ({"delta", "closed_html", "tail_html"}, as for
+    /generate/stream) while the rewritten text is produced, "summary"
+    ({"bullets", "diff_summary"}) once it is parsed and saved, then "done"
+    with the saved section, or "error". Selection refinements send no tokens.
+    A client that disconnects before "summary" leaves the section unchanged.
+    """
+    db = get_db()
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    doc_ref = db.collection("projects").document(project_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project_data = doc.to_dict()
+    if project_data['owner_uid'] != current_user['uid']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    sections = [Section(**s) for s in project_data.get('outline', [])]
+    target_section = next((s for s in sections if s.id == unit_id), None)
+
+    if not target_section:
+        raise HTTPException(status_code=404, detail="Unit not found")
+
+    span = _selection_span(target_section, request)
+    adapter = get_llm_adapter()
+
+    async def refinement_events():
+        if span:
+            # A selection refinement is small enough to answer in one piece
+            yield {"type": "result", "data": await _refine_selection(adapter, project_data, target_section, request, span)}
+            return
+        async for event in adapter.astream_refine_section(**_refine_context(project_data, sections, unit_id, request)):
+            yield event
+
+    async def event_stream():
+        renderer = IncrementalMarkdownRenderer()
+        markdown_text = ""
+        compaction = asyncio.ensure_future(_compact_history(adapter, project_data, target_section))
+        events = refinement_events()
+        saved = False
+        try:
+            async for event in events:
+                if event["type"] == "token":
+                    markdown_text += event["delta"]
+                    yield format_sse("token", {"delta": event["delta"], **renderer.update(markdown_text)})
+                    continue
+
+                refinement_data = event["data"]
+                new_refinement = _apply_refinement(target_section, request, refinement_data)
+                _apply_compaction(target_section, await compaction)
+                # Save before telling the client, so a disconnect can't lose a refinement it was shown
+                doc_ref.update({
+                    "outline": [s.dict() for s in sections],
+                    "updated_at": datetime.utcnow()
+                })
+                saved = True
+                yield format_sse("summary", {
+                    "bullets": target_section.bullets,
+                    "diff_summary": new_refinement.diff_summary
+                })
+                yield format_sse("done", target_section.dict())
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Refinement failed: {str(e)}"})
+        finally:
+            # Stop the LLM stream and history compaction now rather than whenever the generator is collected
+            compaction.cancel()
+            await events.aclose()
+            if not saved:
+                logger.info(f"Streaming refinement ended unsaved for project {project_id}, unit {unit_id}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/projects/{project_id}/units/{unit_id}/comments", response_model=Section)
 async def add_comment(project_id: str, unit_id: str, request: CommentRequest, current_user: dict = Depends(get_current_user)):
     db = get_db()
@@ -795,6 +1219,30 @@ async def _toggle_reaction(project_id: str, unit_id: str, rid: str, user_id: str
 
 from fastapi.responses import StreamingResponse
 from app.services.export_service import ExportService
+from app.core.cache import get_page_cache_stats, get_response_cache_stats, get_search_cache_stats, get_semantic_outline_cache_stats
+from app.core.embedding_cache import get_embedding_cache_stats
+from app.core.structured_output import get_parse_stats
+from app.core.hedging import get_hedging_stats
+
+@router.get("/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    """
+    Per-process performance counters (LLM, page, search and embedding caches, scheduler,
+    coalescing, speculation, JSON parsing, hedging). Requires auth like every data route:
+    cache sizes, search-quota usage and failover state aren't for anonymous callers.
+    """
+    return {
+        "llm_cache": get_response_cache_stats(),
+        "outline_semantic_cache": get_semantic_outline_cache_stats(),
+        "page_cache": get_page_cache_stats(),
+        "search_cache": get_search_cache_stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "llm_scheduler": get_llm_scheduler_stats(),
+        "single_flight": get_single_flight_stats(),
+        "speculation": get_speculation_stats(),
+        "structured_output": get_parse_stats(),
+        "hedging": get_hedging_stats()
+    }
 
 @router.get("/themes")
 async def get_themes():
@@ -0,0 +1,666 @@
+"""
+LLM response caches.
+
+BoundedSQLiteCache replaces LangChain's SQLiteCache, which grows forever and
+isn't tuned for several uvicorn workers sharing one file. Entries live in a
+single SQLite table opened in WAL mode (readers never block the writer,
+writers wait on busy_timeout instead of failing), expire after a TTL and are
+evicted least-recently-used once the entry or byte cap is exceeded.
+
+SemanticOutlineCache sits in front of it for outline suggestions and matches
+topics by embedding similarity rather than exact prompt text.
+
+PageCache applies the same storage scheme to web pages fetched for RAG:
+extracted text keyed by URL, zlib-compressed, revalidated with ETag /
+Last-Modified once its TTL has passed. SearchResultCache keeps Google
+Custom Search results per normalized query and counts the API calls made
+against the daily quota.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import os
+import time
+import sqlite3
+import hashlib
+import zlib
+import json
+import unicodedata
+from datetime import datetime, timezone
+import threading
+import numpy as np
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+
+def _thread_connection(local: threading.local, database_path: str) -> sqlite3.Connection:
+    """One WAL-mode connection per thread (sqlite3 connections aren't shareable across threads)"""
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(database_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        local.conn = conn
+    return conn
+
+
+class BoundedSQLiteCache(BaseCache):
+    """
+    LangChain cache backend with size/entry caps, LRU + TTL eviction and counters.
+
+    Several instances may share one database file (one per operation, so
+    hit rates are counted separately); the caps apply to the whole file.
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".llm_cache.db",
+        max_entries: int = 5000,
+        max_bytes: int = 100 * 1024 * 1024,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        name: str = "default"
+    ):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0, "lookup_seconds": 0.0}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_response_cache_access ON llm_response_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return _thread_connection(self._local, self.database_path)
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def _count(self, stat: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        started = time.perf_counter()
+        key = self._key(prompt, llm_string)
+        conn = self._connect()
+        row = conn.execute("SELECT response, created_at FROM llm_response_cache WHERE key = ?", (key,)).fetchone()
+
+        result = None
+        now = time.time()
+        if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+            conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            self._count("expired")
+        elif row is not None:
+            try:
+                result = loads(row[0])
+                conn.execute("UPDATE llm_response_cache SET last_access = ? WHERE key = ?", (now, key))
+            except Exception as e:
+                print(f"[LLM Cache] Dropping unreadable entry: {e}")
+                conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+
+        self._count("hits" if result is not None else "misses")
+        self._count("lookup_seconds", time.perf_counter() - started)
+        return result
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        response = dumps(return_val)
+        size = len(response.encode())
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent workers
+        # serialize their insert + eviction instead of deadlocking on upgrade
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (self._key(prompt, llm_string), response, size, now, now)
+            )
+            evicted = self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._count("writes")
+        self._count("evictions", evicted)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """Drop expired entries, then least-recently-used ones until both caps hold"""
+        evicted = 0
+        if self.ttl_seconds is not None:
+            evicted += conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+
+        entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return evicted
+
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM llm_response_cache ORDER BY last_access ASC"):
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            victims.append((key,))
+            entries -= 1
+            total_bytes -= size
+
+        conn.executemany("DELETE FROM llm_response_cache WHERE key = ?", victims)
+        return evicted + len(victims)
+
+    def clear(self, **kwargs: Any) -> None:
+        self._connect().execute("DELETE FROM llm_response_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/latency counters for this process, plus current size of the shared file"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        entries, total_bytes = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()
+        return {
+            "name": self.name,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "expired": stats["expired"],
+            "writes": stats["writes"],
+            "evictions": stats["evictions"],
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            "avg_lookup_ms": round(stats["lookup_seconds"] / lookups * 1000, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": total_bytes
+        }
+
+
+# Per-operation cache instances (share one database file)
+_response_caches: Dict[str, BoundedSQLiteCache] = {}
+_response_caches_lock = threading.Lock()
+
+
+def get_response_cache(operation: str) -> Optional[BoundedSQLiteCache]:
+    """
+    Get the response cache for an LLM operation, or None if caching is off for it.
+
+    LLM_CACHE_OPERATIONS lists the operations that are cached (default
+    "outline,section"; refinements are excluded because reusing a
+    temperature-0.7 rewrite for a repeated instruction is undesirable).
+    """
+    enabled = os.getenv("LLM_CACHE_OPERATIONS", "outline,section")
+    if operation not in [op.strip() for op in enabled.split(",")]:
+        return None
+
+    with _response_caches_lock:
+        if operation not in _response_caches:
+            ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+            _response_caches[operation] = BoundedSQLiteCache(
+                database_path=os.getenv("LLM_CACHE_PATH", ".llm_cache.db"),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024),
+                ttl_seconds=ttl if ttl > 0 else None,
+                name=operation
+            )
+        return _response_caches[operation]
+
+
+def get_response_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters for every response cache created so far in this process"""
+    with _response_caches_lock:
+        caches = list(_response_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+class SemanticOutlineCache:
+    """
+    Reuses outlines for near-identical topics ("Climate change impacts" vs
+    "Impacts of climate change") that the exact-match response cache misses.
+
+    doc_type and the set of existing section titles must match exactly; the
+    topic is compared by cosine similarity of its embedding. In-memory, per
+    process, bounded by max_entries (oldest dropped first) and a TTL.
+    """
+
+    def __init__(
+        self,
+        embed_query: Callable[[str], List[float]],
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600,
+        max_entries: int = 500
+    ):
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _context_key(doc_type: str, existing_sections: Optional[List[str]]) -> tuple:
+        titles = sorted({title.lower().strip() for title in (existing_sections or [])})
+        return (doc_type, tuple(titles))
+
+    def _embed(self, topic: str) -> np.ndarray:
+        vector = np.asarray(self.embed_query(topic.strip().lower()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, topic: str, doc_type: str, existing_sections: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        key = self._context_key(doc_type, existing_sections)
+        vector = self._embed(topic)
+        cutoff = time.time() - self.ttl_seconds
+
+        with self._lock:
+            self._entries = [e for e in self._entries if e["created_at"] >= cutoff]
+            best, best_score = None, self.threshold
+            for entry in self._entries:
+                if entry["key"] != key:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best, best_score = entry, score
+
+            self._stats["hits" if best else "misses"] += 1
+            if best is None:
+                return None
+            print(f"[Outline Cache] Reusing outline for '{best['topic']}' (similarity {best_score:.3f})")
+            return [dict(item) for item in best["outline"]]
+
+    def update(self, topic: str, doc_type: str, existing_sections: Optional[List[str]], outline: List[Dict[str, Any]]) -> None:
+        entry = {
+            "key": self._context_key(doc_type, existing_sections),
+            "topic": topic,
+            "vector": self._embed(topic),
+            "outline": [dict(item) for item in outline],
+            "created_at": time.time()
+        }
+        with self._lock:
+            self._entries.append(entry)
+            del self._entries[:-self.max_entries]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries)
+            }
+
+
+_semantic_outline_cache: Optional[SemanticOutlineCache] = None
+
+
+def get_semantic_outline_cache(embed_query: Callable[[str], List[float]]) -> Optional[SemanticOutlineCache]:
+    """
+    Get the process-wide semantic outline cache, or None when disabled via
+    OUTLINE_SEMANTIC_CACHE=false. embed_query is only used on first creation.
+    """
+    global _semantic_outline_cache
+    if os.getenv("OUTLINE_SEMANTIC_CACHE", "true").lower() != "true":
+        return None
+    if _semantic_outline_cache is None:
+        _semantic_outline_cache = SemanticOutlineCache(
+            embed_query,
+            threshold=float(os.getenv("OUTLINE_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            ttl_seconds=float(os.getenv("OUTLINE_SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+        )
+    return _semantic_outline_cache
+
+
+def get_semantic_outline_cache_stats() -> Optional[Dict[str, Any]]:
+    return _semantic_outline_cache.stats() if _semantic_outline_cache is not None else None
+
+
+class PageCache:
+    """
+    On-disk cache of extracted web page text for RAG, keyed by URL.
+
+    A fresh entry (younger than ttl_seconds) is served without touching the
+    network. A stale one is returned with its ETag / Last-Modified so the
+    fetcher can send a conditional GET; a 304 just renews it. Text is stored
+    zlib-compressed and entries are evicted least-recently-used under the
+    entry and byte caps.
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".page_cache.db",
+        max_entries: int = 20000,
+        max_bytes: int = 200 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600
+    ):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "writes": 0, "evictions": 0}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS web_page_cache (
+                    url TEXT PRIMARY KEY,
+                    text BLOB NOT NULL,
+                    status TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_web_page_cache_access ON web_page_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return _thread_connection(self._local, self.database_path)
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        {"text", "status", "etag", "last_modified", "fresh"} for a cached URL,
+        or None. Stale entries without a validator count as misses.
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT text, status, etag, last_modified, fetched_at FROM web_page_cache WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        now = time.time()
+        fresh = now - row[4] <= self.ttl_seconds
+        if not fresh and not (row[2] or row[3]):
+            self._count("misses")
+            return None
+        try:
+            text = zlib.decompress(row[0]).decode()
+        except Exception as e:
+            print(f"[Page Cache] Dropping unreadable entry: {e}")
+            conn.execute("DELETE FROM web_page_cache WHERE url = ?", (url,))
+            self._count("misses")
+            return None
+
+        conn.execute("UPDATE web_page_cache SET last_access = ? WHERE url = ?", (now, url))
+        self._count("hits" if fresh else "stale")
+        return {"text": text, "status": row[1], "etag": row[2], "last_modified": row[3], "fresh": fresh}
+
+    def revalidated(self, url: str) -> None:
+        """The origin answered 304 Not Modified: the entry is fresh for another TTL"""
+        now = time.time()
+        self._connect().execute("UPDATE web_page_cache SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+        self._count("revalidated")
+
+    def store(self, url: str, text: str, status: str = "ok", etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        blob = zlib.compress(text.encode(), 6)
+        if len(blob) > self.max_bytes:
+            return
+
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO web_page_cache (url, text, status, etag, last_modified, size, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, blob, status, etag, last_modified, len(blob), now, now)
+            )
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._count("writes")
+        self._count("evictions", evicted)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """Least-recently-used entries go first; stale ones stay until then, for revalidation"""
+        entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM web_page_cache").fetchone()
+        victims = []
+        if entries > self.max_entries or total_bytes > self.max_bytes:
+            for url, size in conn.execute("SELECT url, size FROM web_page_cache ORDER BY last_access ASC"):
+                if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                    break
+                victims.append((url,))
+                entries -= 1
+                total_bytes -= size
+            conn.executemany("DELETE FROM web_page_cache WHERE url = ?", victims)
+        return len(victims)
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM web_page_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for this process; hit_rate counts lookups answered without a download"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["stale"] + stats["misses"]
+        entries, total_bytes = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM web_page_cache").fetchone()
+        return dict(
+            stats,
+            hit_rate=round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0,
+            entries=entries,
+            bytes=total_bytes
+        )
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Shared page cache sized from RAG_PAGE_CACHE_* env vars; RAG_PAGE_CACHE_MAX_MB=0 turns it off"""
+    global _page_cache
+    max_mb = float(os.getenv("RAG_PAGE_CACHE_MAX_MB", "200"))
+    if max_mb <= 0:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(
+                database_path=os.getenv("RAG_PAGE_CACHE_PATH", ".page_cache.db"),
+                max_entries=int(os.getenv("RAG_PAGE_CACHE_MAX_ENTRIES", "20000")),
+                max_bytes=int(max_mb * 1024 * 1024),
+                ttl_seconds=float(os.getenv("RAG_PAGE_CACHE_TTL_SECONDS", str(24 * 3600)))
+            )
+        return _page_cache
+
+
+def get_page_cache_stats() -> Optional[Dict[str, Any]]:
+    return _page_cache.stats() if _page_cache is not None else None
+
+
+_QUERY_OPERATORS = {"OR"}  # only recognised in upper case
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")  # CSE quotas reset at midnight Pacific
+except Exception:
+    _QUOTA_TIMEZONE = timezone.utc
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    Cache key for a query: whitespace and letter case (except the OR operator)
+    don't change Google's results, so they don't split the cache. Punctuation
+    is kept - quotes, -term, site: and the like are search operators.
+    """
+    words = unicodedata.normalize("NFKC", query).split()
+    return " ".join(word if word in _QUERY_OPERATORS else word.lower() for word in words)
+
+
+class SearchResultCache:
+    """
+    Persistent query -> Google Custom Search results cache.
+
+    Results live for ttl_seconds. Expired entries are kept (until LRU
+    eviction) so that they can still be served once the day's API quota is
+    used up; every real API call is counted per quota day in the same file,
+    so all workers see one shared count. ttl_seconds <= 0 turns caching off
+    but keeps the quota count.
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".search_cache.db",
+        max_entries: int = 5000,
+        ttl_seconds: float = 3 * 24 * 3600,
+        daily_quota: int = 100
+    ):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.daily_quota = daily_quota
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stale_served": 0, "api_calls": 0, "evictions": 0}
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_result_cache (
+                    key TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_result_cache_access ON search_result_cache (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS search_api_calls (day TEXT PRIMARY KEY, calls INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return _thread_connection(self._local, self.database_path)
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    @staticmethod
+    def _key(query: str, num_results: int) -> str:
+        return f"{num_results}:{normalize_search_query(query)}"
+
+    @staticmethod
+    def _quota_day() -> str:
+        return datetime.now(_QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+    def lookup(self, query: str, num_results: int, allow_stale: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Cached results for the query, or None; allow_stale also returns expired ones"""
+        if self.ttl_seconds <= 0:
+            self._count("misses")
+            return None
+        key = self._key(query, num_results)
+        conn = self._connect()
+        row = conn.execute("SELECT results, created_at FROM search_result_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        now = time.time()
+        expired = now - row[1] > self.ttl_seconds
+        if expired and not allow_stale:
+            self._count("expired")
+            return None
+
+        conn.execute("UPDATE search_result_cache SET last_access = ? WHERE key = ?", (now, key))
+        self._count("stale_served" if expired else "hits")
+        return json.loads(row[0])
+
+    def update(self, query: str, num_results: int, results: List[Dict[str, Any]]) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_result_cache (key, results, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (self._key(query, num_results), json.dumps(results), now, now)
+            )
+            evicted = 0
+            entries = conn.execute("SELECT COUNT(*) FROM search_result_cache").fetchone()[0]
+            if entries > self.max_entries:
+                evicted = conn.execute(
+                    "DELETE FROM search_result_cache WHERE key IN "
+                    "(SELECT key FROM search_result_cache ORDER BY last_access ASC LIMIT ?)",
+                    (entries - self.max_entries,)
+                ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("evictions", evicted)
+
+    def record_api_call(self) -> None:
+        self._connect().execute(
+            "INSERT INTO search_api_calls (day, calls) VALUES (?, 1) ON CONFLICT(day) DO UPDATE SET calls = calls + 1",
+            (self._quota_day(),)
+        )
+        self._count("api_calls")
+
+    def calls_today(self) -> int:
+        row = self._connect().execute("SELECT calls FROM search_api_calls WHERE day = ?", (self._quota_day(),)).fetchone()
+        return row[0] if row else 0
+
+    def quota_exhausted(self) -> bool:
+        return self.daily_quota > 0 and self.calls_today() >= self.daily_quota
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for this process, plus today's API calls across all workers"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["stale_served"] + stats["misses"] + stats["expired"]
+        calls_today = self.calls_today()
+        entries = self._connect().execute("SELECT COUNT(*) FROM search_result_cache").fetchone()[0]
+        return dict(
+            stats,
+            hit_rate=round((stats["hits"] + stats["stale_served"]) / lookups, 3) if lookups else 0.0,
+            api_calls_today=calls_today,
+            daily_quota=self.daily_quota,
+            quota_remaining=max(0, self.daily_quota - calls_today) if self.daily_quota > 0 else None,
+            entries=entries
+        )
+
+
+_search_cache: Optional[SearchResultCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchResultCache:
+    """
+    Shared search result cache from RAG_SEARCH_CACHE_* env vars.
+    RAG_SEARCH_CACHE_TTL_SECONDS=0 turns caching off; API calls are still counted.
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchResultCache(
+                database_path=os.getenv("RAG_SEARCH_CACHE_PATH", ".search_cache.db"),
+                max_entries=int(os.getenv("RAG_SEARCH_CACHE_MAX_ENTRIES", "5000")),
+                ttl_seconds=float(os.getenv("RAG_SEARCH_CACHE_TTL_SECONDS", str(3 * 24 * 3600))),
+                daily_quota=int(os.getenv("RAG_SEARCH_DAILY_QUOTA", "100"))
+            )
+        return _search_cache
+
+
+def get_search_cache_stats() -> Optional[Dict[str, Any]]:
+    return _search_cache.stats() if _search_cache is not None else None
@@ -0,0 +1,240 @@
+"""
+Content-addressed embedding cache for RAG.
+
+get_relevant_context() embeds every chunk of every fetched page, and most of
+those pages (and so chunks) come back unchanged on the next call for the same
+topic. Vectors are cached on disk keyed by a hash of the model name and the
+chunk text, so only chunks never seen before reach the model.
+
+Per model there are two append-only files: a raw float16/float32 matrix
+(.vec), opened with np.memmap so cached rows are read straight from the page
+cache instead of being loaded, and an index (.idx) holding a header and one
+16-byte digest per row. Writers append under a file lock, so several uvicorn
+workers can share the files. Rows can't be removed from the middle of the
+matrix, so once RAG_EMBEDDING_CACHE_MAX_MB would be exceeded the cache starts
+over with a new matrix file and refills.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+from contextlib import contextmanager
+import os
+import re
+import struct
+import hashlib
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+_MAGIC = b"EMBCACHE"
+_HEADER = struct.Struct("<8sII")  # magic, dimension, generation (changes on every reset)
+_DIGEST_BYTES = 16
+
+
+class EmbeddingCache:
+    """Memory-mapped vector store for one embedding model"""
+
+    def __init__(
+        self,
+        directory: str = ".embedding_cache",
+        model_name: str = "default",
+        dtype: str = "float16",
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^\w.-]+", "_", model_name)
+        self._base = os.path.join(directory, f"{slug}.{self.dtype.name}")
+        self.index_path = self._base + ".idx"
+        self.lock_path = self._base + ".lock"
+
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._index_bytes = 0
+        self._dimension = 0
+        self._generation = None
+        self._matrix: Optional[np.memmap] = None
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "resets": 0}
+
+    def _matrix_path(self, generation: int) -> str:
+        # A reset starts a new file: other processes may still have the old one mapped
+        return f"{self._base}.{generation}.vec"
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode()).digest()[:_DIGEST_BYTES]
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializes writers across processes (flock) and threads"""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _forget(self) -> None:
+        self._rows = {}
+        self._index_bytes = 0
+        self._dimension = 0
+        self._generation = None
+        self._matrix = None
+
+    def _refresh(self) -> None:
+        """Pick up rows appended since the last call (by any process); caller holds self._lock"""
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    self._forget()
+                    return
+                magic, dimension, generation = _HEADER.unpack(header)
+                if magic != _MAGIC:
+                    self._forget()
+                    return
+                if generation != self._generation:
+                    self._forget()
+                    self._dimension, self._generation = dimension, generation
+                    self._index_bytes = _HEADER.size
+                f.seek(self._index_bytes)
+                data = f.read()
+        except FileNotFoundError:
+            self._forget()
+            return
+
+        data = data[:len(data) - len(data) % _DIGEST_BYTES]
+        first_row = (self._index_bytes - _HEADER.size) // _DIGEST_BYTES
+        for offset in range(0, len(data), _DIGEST_BYTES):
+            self._rows.setdefault(data[offset:offset + _DIGEST_BYTES], first_row + offset // _DIGEST_BYTES)
+        self._index_bytes += len(data)
+
+        rows = (self._index_bytes - _HEADER.size) // _DIGEST_BYTES
+        if rows and (self._matrix is None or self._matrix.shape[0] != rows):
+            self._matrix = np.memmap(self._matrix_path(self._generation), dtype=self.dtype, mode="r", shape=(rows, self._dimension))
+
+    def lookup(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """{key: vector} for the keys that are cached; vectors are views into the memory map"""
+        with self._lock:
+            self._refresh()
+            found = {key: self._matrix[self._rows[key]] for key in keys if key in self._rows}
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(keys) - len(found)
+        return found
+
+    def store(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]]) -> None:
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        if not len(keys) or vectors.ndim != 2:
+            return
+
+        with self._file_lock():
+            self._refresh()
+            new = {key: idx for idx, key in enumerate(keys) if key not in self._rows}
+            if not new:
+                return
+
+            dimension = vectors.shape[1]
+            rows = (self._index_bytes - _HEADER.size) // _DIGEST_BYTES if self._generation is not None else 0
+            row_bytes = dimension * self.dtype.itemsize
+            generation = self._generation
+            if generation is None or dimension != self._dimension or (rows + len(new)) * row_bytes > self.max_bytes:
+                generation = ((generation or 0) + 1) % 2 ** 32
+                with open(self.index_path, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, dimension, generation))
+                if self._generation is not None:
+                    print(f"[Embedding Cache] Reset {self.model_name} cache ({rows} rows)")
+                    self._stats["resets"] += 1
+                    try:
+                        os.remove(self._matrix_path(self._generation))
+                    except OSError:
+                        pass  # still mapped (Windows); truncated if its name is ever reused
+                self._forget()
+                rows = 0
+
+            # Matrix first, then index: readers only map rows the index covers,
+            # and truncating drops rows a crashed writer never indexed
+            with open(self._matrix_path(generation), "ab") as f:
+                f.truncate(rows * row_bytes)
+                f.write(vectors[list(new.values())].tobytes())
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(new))
+
+            self._matrix = None
+            self._refresh()
+            self._stats["writes"] += len(new)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            stats = dict(self._stats)
+            rows = self._matrix.shape[0] if self._matrix is not None else 0
+            matrix_bytes = rows * self._dimension * self.dtype.itemsize
+        lookups = stats["hits"] + stats["misses"]
+        return dict(
+            stats,
+            hit_rate=round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            rows=rows,
+            bytes=matrix_bytes,
+            dtype=self.dtype.name
+        )
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings model so only texts missing from the cache are embedded"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _embed(self, texts: List[str], keys: List[bytes], embed_missing) -> List[List[float]]:
+        found = self.cache.lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = embed_missing(list(missing.values()))
+            self.cache.store(list(missing), vectors)
+            # Same precision as later cache hits, so results don't depend on hit/miss
+            found.update(zip(missing, np.asarray(vectors, dtype=self.cache.dtype)))
+        return [np.asarray(found[key], dtype=np.float32).tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, [self.cache.key(text) for text in texts], self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Some models embed queries differently from documents: separate key space
+        key = self.cache.key(f"query\x00{text}")
+        return self._embed([text], [key], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+
+_embedding_caches: Dict[str, EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    """Shared cache for an embedding model from RAG_EMBEDDING_CACHE_* env vars; MAX_MB=0 turns it off"""
+    max_mb = float(os.getenv("RAG_EMBEDDING_CACHE_MAX_MB", "256"))
+    if max_mb <= 0:
+        return None
+    with _embedding_caches_lock:
+        if model_name not in _embedding_caches:
+            _embedding_caches[model_name] = EmbeddingCache(
+                directory=os.getenv("RAG_EMBEDDING_CACHE_DIR", ".embedding_cache"),
+                model_name=model_name,
+                dtype=os.getenv("RAG_EMBEDDING_CACHE_DTYPE", "float16"),
+                max_bytes=int(max_mb * 1024 * 1024)
+            )
+        return _embedding_caches[model_name]
+
+
+def get_embedding_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters for every embedding cache created so far in this process"""
+    with _embedding_caches_lock:
+        caches = list(_embedding_caches.values())
+    return {cache.model_name: cache.stats() for cache in caches}
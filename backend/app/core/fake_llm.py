@@ -0,0 +1,133 @@
+"""
+Latency-simulating fake LLM adapter (LLM_PROVIDER=fake).
+
+MockLLMAdapter answers instantly, which hides how the API behaves while
+many requests wait on a slow model. FakeLLMAdapter returns the same kind of
+content but only after a realistic delay: a lognormal latency with the
+given median and p95, streaming at a fixed tokens-per-second rate, and
+optional injected errors and timeouts. Used by loadtest.py and for local
+frontend work without a Groq key.
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import os
+import math
+import time
+import random
+import asyncio
+from app.core.llm import MockLLMAdapter
+
+
+class FakeLLMAdapter(MockLLMAdapter):
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        latency_p95_ms: float = 2500,
+        tokens_per_second: float = 80,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 30,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.latency_p95_ms = latency_p95_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self._random = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """Seconds until the (first token of the) response, lognormal around the median"""
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_p95_ms <= self.latency_ms:
+            return self.latency_ms / 1000
+        sigma = math.log(self.latency_p95_ms / self.latency_ms) / 1.645
+        return self._random.lognormvariate(math.log(self.latency_ms), sigma) / 1000
+
+    async def _simulate(self, operation: str) -> float:
+        """Wait like the real model would; raise the injected error/timeout. Returns the wait in seconds"""
+        roll = self._random.random()
+        if roll < self.timeout_rate:
+            await asyncio.sleep(self.timeout_seconds)
+            raise ValueError(f"Failed to {operation}: simulated timeout after {self.timeout_seconds}s")
+
+        latency = self.sample_latency()
+        await asyncio.sleep(latency)
+        if roll < self.timeout_rate + self.error_rate:
+            raise ValueError(f"Failed to {operation}: simulated provider error")
+        return latency
+
+    async def _paced_tokens(self, text: str) -> AsyncIterator[Dict[str, Any]]:
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for word in text.split(" "):
+            await asyncio.sleep(delay)
+            yield {"type": "token", "delta": word + " "}
+
+    @staticmethod
+    def _model_meta(started: float) -> Dict[str, Any]:
+        return {"provider": "fake", "model": "fake", "route": "default", "latency_ms": int((time.perf_counter() - started) * 1000)}
+
+    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
+        result = super().generate_section(title, topic, word_count, outline_context, doc_type, section_position, use_rag)
+        # Pad to the requested length so streaming takes as long as a real answer
+        filler = max(0, word_count - len(result["text"].split()))
+        result["text"] += " " + " ".join(["Lorem"] * filler) if filler else ""
+        result["word_count"] = len(result["text"].split())
+        return result
+
+    async def agenerate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        await self._simulate("generate outline")
+        return self.generate_outline(topic, doc_type, existing_sections, use_cache)
+
+    async def agenerate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result = self.generate_section(title, topic, word_count, outline_context, doc_type, section_position, use_rag)
+        await self._simulate("generate section")
+        # Non-streaming calls still pay for generating every token
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(result["word_count"] / self.tokens_per_second)
+        result["model_meta"] = self._model_meta(started)
+        return result
+
+    async def astream_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        result = self.generate_section(title, topic, word_count, outline_context, doc_type, section_position, use_rag)
+        await self._simulate("generate section")
+        async for event in self._paced_tokens(result["text"]):
+            yield event
+        result["model_meta"] = self._model_meta(started)
+        yield {"type": "result", "data": result}
+
+    async def arefine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        await self._simulate("refine section")
+        result = self.refine_section(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(current_text.split()) / self.tokens_per_second)
+        result["model_meta"] = self._model_meta(started)
+        return result
+
+    async def astream_refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        await self._simulate("refine section")
+        result = self.refine_section(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary)
+        async for event in self._paced_tokens(result["text"]):
+            yield event
+        result["model_meta"] = self._model_meta(started)
+        yield {"type": "result", "data": result}
+
+
+def create_fake_adapter() -> FakeLLMAdapter:
+    """FakeLLMAdapter configured from FAKE_LLM_* env vars"""
+    seed = os.getenv("FAKE_LLM_SEED")
+    return FakeLLMAdapter(
+        latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "800")),
+        latency_p95_ms=float(os.getenv("FAKE_LLM_LATENCY_P95_MS", "2500")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "80")),
+        error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        timeout_rate=float(os.getenv("FAKE_LLM_TIMEOUT_RATE", "0")),
+        timeout_seconds=float(os.getenv("FAKE_LLM_TIMEOUT_SECONDS", "30")),
+        seed=int(seed) if seed else None
+    )
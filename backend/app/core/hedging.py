@@ -0,0 +1,239 @@
+"""
+Hedged requests and failover across LLM adapters.
+
+HedgedLLMAdapter wraps a primary adapter and one or more backups (another
+model, provider or region). Each async call goes to the primary first; if
+it hasn't answered within the operation's hedge delay - the p95 of recent
+latencies, so only the slow tail is hedged - the same call is also sent to
+the next backup and whichever finishes first wins, the other is cancelled.
+A call that fails moves on to the next backup straight away.
+
+The hedge timer and the latency samples start when a call is granted its
+scheduler slot, not when it joins the quota queue: waiting for quota says
+nothing about a slow model, and a backup sent to the same queue wouldn't
+help. Backups are other models, and get_llm_scheduler() keeps a bucket per
+model (Groq rate-limits each model separately), so a hedge never spends
+the primary's quota. Section research (RAG) is fetched once and passed to
+every attempt, so hedging doesn't spend search quota twice.
+
+Streams can't be merged, so they only fail over, and only before the
+first event has been sent to the client.
+"""
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
+import os
+import time
+import asyncio
+import numpy as np
+from app.core.llm import LLMAdapter
+from app.core.scheduler import on_slot_granted
+
+
+class HedgedLLMAdapter(LLMAdapter):
+    def __init__(
+        self,
+        primary: LLMAdapter,
+        backups: List[LLMAdapter],
+        default_delay: float = 10.0,
+        min_delay: float = 1.0,
+        min_samples: int = 10
+    ):
+        self.adapters = [primary] + list(backups)
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def primary(self) -> LLMAdapter:
+        return self.adapters[0]
+
+    def hedge_delay(self, operation: str) -> float:
+        """p95 latency of recent successful calls, or the default until there are enough samples"""
+        samples = self._latencies.get(operation)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, float(np.percentile(samples, 95)))
+
+    def _count(self, operation: str, stat: str) -> None:
+        stats = self._stats.setdefault(operation, {"calls": 0, "hedged": 0, "failovers": 0, "backup_wins": 0, "errors": 0})
+        stats[stat] += 1
+
+    @staticmethod
+    async def _attempt(adapter: LLMAdapter, call: Callable[[LLMAdapter], Awaitable[Any]], granted: asyncio.Event, granted_at: List[float]) -> Any:
+        """Run one call, marking `granted` once it holds a scheduler slot (at once for unscheduled adapters)"""
+        def mark_granted() -> None:
+            if not granted_at:
+                granted_at.append(time.perf_counter())
+                granted.set()
+
+        # Runs inside the attempt's own task, so only this attempt's slot is reported
+        if adapter.schedules_calls:
+            on_slot_granted(mark_granted)
+        else:
+            mark_granted()
+        return await call(adapter)
+
+    async def _hedged(self, operation: str, call: Callable[[LLMAdapter], Awaitable[Any]]) -> Any:
+        self._count(operation, "calls")
+        delay = self.hedge_delay(operation)
+        pending: Dict[asyncio.Future, int] = {}
+        grants: Dict[asyncio.Future, Tuple[asyncio.Event, List[float]]] = {}
+        errors: List[Exception] = []
+        next_index = 0
+        newest: Optional[asyncio.Future] = None
+
+        def launch() -> None:
+            nonlocal next_index, newest
+            granted, granted_at = asyncio.Event(), []
+            newest = asyncio.ensure_future(self._attempt(self.adapters[next_index], call, granted, granted_at))
+            pending[newest] = next_index
+            grants[newest] = (granted, granted_at)
+            next_index += 1
+
+        launch()
+        try:
+            while pending:
+                can_hedge = next_index < len(self.adapters) and newest in pending
+                granted, granted_at = grants[newest]
+                if can_hedge and not granted.is_set():
+                    # Still queued for quota: the hedge timer hasn't started yet
+                    grant = asyncio.ensure_future(granted.wait())
+                    try:
+                        done, _ = await asyncio.wait(set(pending) | {grant}, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        grant.cancel()
+                    done.discard(grant)
+                else:
+                    timeout = max(0.0, granted_at[0] + delay - time.perf_counter()) if can_hedge else None
+                    done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if not done and can_hedge:
+                        print(f"[Hedge] {operation} slower than {delay:.1f}s - also sending to backup {next_index}")
+                        self._count(operation, "hedged")
+                        launch()
+                        continue
+
+                for task in done:
+                    index = pending.pop(task)
+                    if task.exception() is None:
+                        started = grants[task][1]
+                        # Calls answered without a slot (cache hits) say nothing about model latency
+                        if started:
+                            self._latencies.setdefault(operation, deque(maxlen=100)).append(time.perf_counter() - started[0])
+                        if index > 0:
+                            self._count(operation, "backup_wins")
+                        return self._annotate(task.result(), index, next_index)
+                    errors.append(task.exception())
+                    print(f"[Hedge] {operation} failed on adapter {index}: {task.exception()}")
+
+                if not pending and next_index < len(self.adapters):
+                    self._count(operation, "failovers")
+                    launch()
+
+            self._count(operation, "errors")
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _annotate(result: Any, winner: int, attempts: int) -> Any:
+        if isinstance(result, dict) and isinstance(result.get("model_meta"), dict):
+            result["model_meta"]["hedge"] = {"winner": winner, "attempts": attempts}
+        return result
+
+    async def _failover_stream(self, operation: str, stream: Callable[[LLMAdapter], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        self._count(operation, "calls")
+        for index, adapter in enumerate(self.adapters):
+            sent_any = False
+            try:
+                async for event in stream(adapter):
+                    sent_any = True
+                    yield event
+                return
+            except Exception as e:
+                # Once tokens have reached the client we can't switch mid-answer
+                if sent_any or index == len(self.adapters) - 1:
+                    self._count(operation, "errors")
+                    raise
+                print(f"[Hedge] {operation} stream failed on adapter {index}, failing over: {e}")
+                self._count(operation, "failovers")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            operation: dict(stats, hedge_delay_ms=int(self.hedge_delay(operation) * 1000))
+            for operation, stats in self._stats.items()
+        }
+
+    # Sync methods are only used outside the API - they go straight to the primary
+    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        return self.primary.generate_outline(topic, doc_type, existing_sections, use_cache)
+
+    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
+        return self.primary.generate_section(title, topic, word_count, outline_context, doc_type, section_position, use_rag)
+
+    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        return self.primary.refine_section(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary)
+
+    async def agenerate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        return await self._hedged("outline", lambda adapter: adapter.agenerate_outline(topic, doc_type, existing_sections, use_cache))
+
+    async def agenerate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        if rag is None and use_rag:
+            rag = await self.primary.aretrieve_rag_context(title, topic, doc_type)
+        return await self._hedged("section", lambda adapter: adapter.agenerate_section(title, topic, word_count, outline_context, doc_type, section_position, use_rag, rag=rag))
+
+    async def arefine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        return await self._hedged("refine", lambda adapter: adapter.arefine_section(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary))
+
+    async def arefine_selection(self, selected_text: str, instructions: str, context_before: str = "", context_after: str = "", doc_title: Optional[str] = None, section_title: Optional[str] = None, doc_type: str = "docx") -> Dict[str, Any]:
+        return await self._hedged("refine_selection", lambda adapter: adapter.arefine_selection(selected_text, instructions, context_before, context_after, doc_title, section_title, doc_type))
+
+    async def asummarize_history(self, previous_summary: Optional[str], entries: List[Dict[str, Any]], doc_type: str = "docx") -> str:
+        return await self._hedged("history_summary", lambda adapter: adapter.asummarize_history(previous_summary, entries, doc_type))
+
+    async def astream_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        if rag is None and use_rag:
+            rag = await self.primary.aretrieve_rag_context(title, topic, doc_type)
+        async for event in self._failover_stream("section_stream", lambda adapter: adapter.astream_section(title, topic, word_count, outline_context, doc_type, section_position, use_rag, rag=rag)):
+            yield event
+
+    async def astream_refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        async for event in self._failover_stream("refine_stream", lambda adapter: adapter.astream_refine_section(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary)):
+            yield event
+
+    async def aretrieve_rag_context(self, title: str, topic: str, doc_type: str = "docx") -> Tuple[str, Dict[str, Any]]:
+        return await self.primary.aretrieve_rag_context(title, topic, doc_type)
+
+    async def aclose(self) -> None:
+        for adapter in self.adapters:
+            await adapter.aclose()
+
+
+def create_hedged_adapter(primary: LLMAdapter) -> LLMAdapter:
+    """
+    Wrap the primary Groq adapter with backups from LLM_HEDGE_MODELS (comma
+    separated Groq model names). Each backup queues on its own model's
+    scheduler bucket, sized by LLM_RATE_LIMITS. Returns the primary unchanged
+    when no backups are configured.
+    """
+    from app.core.llm import GroqLLMAdapter
+
+    models = [m.strip() for m in os.getenv("LLM_HEDGE_MODELS", "").split(",") if m.strip()]
+    if not models:
+        return primary
+    return HedgedLLMAdapter(
+        primary,
+        [GroqLLMAdapter(model=model, use_routing=False) for model in models],
+        default_delay=float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "10")),
+        min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1"))
+    )
+
+
+def get_hedging_stats() -> Optional[Dict[str, Any]]:
+    from app.core import llm
+    adapter = llm._adapter_instance
+    return adapter.stats() if isinstance(adapter, HedgedLLMAdapter) else None
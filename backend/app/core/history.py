@@ -0,0 +1,72 @@
+"""
+Rolling compaction of refinement history.
+
+Section.refinement_history grows by one entry per refinement, but only the
+most recent entries fit in the refine prompt and the rest were silently
+dropped. Once a section has more than REFINE_HISTORY_MAX_ENTRIES
+refinements, all but the last REFINE_HISTORY_KEEP_ENTRIES are folded into
+Section.history_summary - a short "editor preferences" note - and removed
+from the stored history. The prompt then carries the summary plus a bounded
+number of raw entries, however many rounds the section has had.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import os
+
+
+def history_limits() -> Tuple[int, int]:
+    """(max entries before compaction, entries kept raw after it); max 0 disables compaction"""
+    max_entries = int(os.getenv("REFINE_HISTORY_MAX_ENTRIES", "8"))
+    keep = int(os.getenv("REFINE_HISTORY_KEEP_ENTRIES", "4"))
+    return max_entries, max(0, min(keep, max_entries))
+
+
+def entries_to_fold(history_length: int) -> int:
+    """How many of the oldest entries to fold into the summary now"""
+    max_entries, keep = history_limits()
+    if max_entries <= 0 or history_length <= max_entries:
+        return 0
+    return history_length - keep
+
+
+def _reaction(entry: Dict[str, Any]) -> str:
+    if entry.get("likes"):
+        return "liked"
+    return "disliked" if entry.get("dislikes") else "neutral"
+
+
+def describe_entries(entries: List[Dict[str, Any]]) -> str:
+    """One line per refinement: reaction, request and what changed"""
+    lines = []
+    for entry in entries:
+        line = f"- ({_reaction(entry)}) \"{entry.get('prompt', '')}\""
+        if entry.get("diff_summary"):
+            line += f" -> {entry['diff_summary']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def clip_summary(summary: str, max_chars: Optional[int] = None) -> str:
+    """Bound the summary (REFINE_HISTORY_SUMMARY_CHARS), keeping the most recent lines"""
+    if max_chars is None:
+        max_chars = int(os.getenv("REFINE_HISTORY_SUMMARY_CHARS", "800"))
+    summary = summary.strip()
+    if len(summary) <= max_chars:
+        return summary
+    clipped = summary[-max_chars:]
+    newline = clipped.find("\n")
+    return clipped[newline + 1:] if 0 <= newline < len(clipped) - 1 else clipped
+
+
+def fold_history(previous_summary: Optional[str], entries: List[Dict[str, Any]]) -> str:
+    """Rule-based summary (no LLM): the requests the user liked, disliked and made"""
+    by_reaction: Dict[str, List[str]] = {"liked": [], "disliked": [], "neutral": []}
+    for entry in entries:
+        by_reaction[_reaction(entry)].append(f"\"{entry.get('prompt', '')}\"")
+
+    lines = [previous_summary.strip()] if previous_summary else []
+    labels = {"liked": "Liked", "disliked": "Disliked", "neutral": "Also asked for"}
+    for reaction, prompts in by_reaction.items():
+        if prompts:
+            lines.append(f"{labels[reaction]}: {', '.join(prompts)}")
+    return clip_summary("\n".join(lines))
@@ -1,131 +1,83 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from functools import lru_cache
 import os
 import json
 import uuid
+import time
+import asyncio
+import httpx
+import groq
 from dotenv import load_dotenv
 
 # LangChain imports
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.globals import set_llm_cache
-from langchain_community.cache import SQLiteCache
+from langchain_core.runnables import RunnableLambda, RunnableSequence
 
 # Import Pydantic schemas for structured outputs
-from app.models import OutlineSchema, OutlineItemSchema, SectionContentSchema, RefinementOutputSchema
+from app.models import OutlineSchema, OutlineItemSchema, SectionContentSchema, RefinementOutputSchema, RefinementPatchSchema, SelectionRefinementSchema, HistorySummarySchema
+from app.core.streaming import extract_partial_field
+from app.core.cache import get_response_cache, get_semantic_outline_cache
+from app.core.prompt_budget import count_tokens, fit_blocks, get_prompt_token_limit
+from app.core.scheduler import get_llm_scheduler
+from app.core.structured_output import RepairingOutputParser
+from app.core.routing import ModelRouter, get_model_router
+from app.core.patching import apply_edits, number_blocks, split_blocks, use_patch_mode
+from app.core.history import clip_summary, describe_entries, fold_history
 
 load_dotenv()
 
-# Enable SQLite caching for faster responses on repeated queries
-set_llm_cache(SQLiteCache(database_path=".langchain_cache.db"))
-
-class LLMAdapter(ABC):
-    @abstractmethod
-    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        pass
-
-    @abstractmethod
-    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
-        pass
-
-    @abstractmethod
-    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None) -> Dict[str, Any]:
-        pass
-
-class MockLLMAdapter(LLMAdapter):
-    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        # Deterministic mock response
-        base_sections = [
-            {"id": "s1", "title": "Introduction", "word_count": 100},
-            {"id": "s2", "title": "Market Overview", "word_count": 200},
-            {"id": "s3", "title": "Key Trends", "word_count": 200},
-            {"id": "s4", "title": "Conclusion", "word_count": 100}
-        ]
-
-        # If existing sections provided, filter out duplicates and generate complementary ones
-        if existing_sections:
-            existing_lower = [s.lower() for s in existing_sections]
-            new_sections = [s for s in base_sections if s["title"].lower() not in existing_lower]
-            return new_sections
-
-        return base_sections
-
-    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
-        return {
-            "title": title,
-            "text": f"This is the generated content for section '{title}' regarding '{topic}'. It is a mock response.",
-            "bullets": ["Point 1", "Point 2", "Point 3"],
-            "word_count": 25
-        }
-
-    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None) -> Dict[str, Any]:
-        return {
-            "text": f"Refined version of: {current_text[:20]}... based on '{instructions}'",
-            "bullets": current_bullets or ["Refined Point 1", "Refined Point 2", "Refined Point 3"],
-            "diff_summary": f"Applied changes based on: {instructions}"
-        }
-
-class GroqLLMAdapter(LLMAdapter):
-    def __init__(self):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-
-        # Initialize LangChain's ChatGroq with Llama 3.3 70B
-        # This model offers excellent performance on Groq's free tier
-        self.llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            groq_api_key=api_key,
-            temperature=0.7,
-            max_retries=3  # Built-in retry logic
-        )
-
-        # Initialize RAG retriever (lazy loaded)
-        self._rag_retriever = None
-
-    def _get_rag_retriever(self):
-        """Lazy load RAG retriever"""
-        if self._rag_retriever is None:
-            from app.core.rag import get_rag_retriever
-            self._rag_retriever = get_rag_retriever()
-        return self._rag_retriever
-
-    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        # Set up Pydantic output parser
-        parser = PydanticOutputParser(pydantic_object=OutlineSchema)
-
-        # Document type specific instructions
-        doc_guidance = """
+# Document type specific instructions for outline generation
+OUTLINE_DOC_GUIDANCE = {
+    "pptx": """
 DOCUMENT TYPE: PowerPoint Presentation
 - Create slide-focused sections (each section = ONE slide)
 - Titles should be concise and presentation-friendly (max 8 words)
 - Recommend 6-10 sections for a complete presentation
 - Word counts MUST be very low (50-120 words per slide/section)
 - Focus on 3-5 key bullet points per slide
-- Keep content scannable and brief""" if doc_type == "pptx" else """
+- Keep content scannable and brief""",
+    "docx": """
 DOCUMENT TYPE: Word Document / Report
 - Create comprehensive report sections with logical flow
 - Titles should be descriptive and professional
 - Recommend 5-8 sections for a complete document
 - Word counts can be higher (100-400 words per section)
 - Focus on detailed explanations, analysis, and thorough coverage"""
+}
 
-        # Build existing sections context
-        existing_context = ""
-        if existing_sections:
-            sections_list = "\n".join(f"  - {section}" for section in existing_sections)
-            existing_context = f"""
-**EXISTING SECTIONS** (already created by user):
-{sections_list}
-
-⚠️ IMPORTANT: DO NOT duplicate these sections. Generate ADDITIONAL complementary sections."""
+# Style guidance for section generation, by document type
+SECTION_STYLE_GUIDANCE = {
+    "pptx": """STYLE FOR PRESENTATIONS:
+- Use bullet points (markdown format: - or *) for EVERY slide
+- Keep each bullet to 1-2 short sentences maximum
+- Focus on key takeaways, not long explanations
+- Max 120 words total per slide
+- Scannable, concise, impactful""",
+    "docx": """STYLE FOR DOCUMENTS:
+- Use paragraphs for narrative sections (Introduction, Background, Conclusion)
+- Use bullet points for comparisons, lists, features, advantages, steps
+- Professional, comprehensive tone
+- Detailed explanations with proper analysis"""
+}
 
-        user_instruction = f"Create additional professional sections for the topic: \"{topic}\" that complement the existing outline" if existing_sections else f"Create a professional outline for the topic: \"{topic}\""
+# Style guidance for refinement, by document type
+REFINE_STYLE_GUIDANCE = {
+    "pptx": """STYLE FOR PRESENTATIONS:
+- Maintain bullet point format (markdown: - or *)
+- Keep bullets short and scannable
+- Each bullet should be 1-2 sentences maximum""",
+    "docx": """STYLE FOR DOCUMENTS:
+- Maintain existing format unless user requests a change
+- Professional, comprehensive tone
+- Detailed and well-structured"""
+}
 
-        # Create LangChain prompt template
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert document structure architect. {format_instructions}
+# Outline generation prompt
+OUTLINE_PROMPT_MESSAGES = [
+    ("system", """You are an expert document structure architect. {format_instructions}
 
 {doc_guidance}
 
@@ -136,85 +88,12 @@ REQUIREMENTS:
 2. **Comprehensive Coverage**: Ensure all important aspects of the topic are covered
 3. **Section Structure**: Use sequential IDs (s1, s2, s3), clear titles, appropriate word counts
 4. **Quality Standards**: Professional language, clear titles, logical ordering"""),
-            ("user", "{user_instruction}")
-        ])
-
-        # Build the LangChain chain: prompt | llm | parser
-        chain = prompt_template | self.llm | parser
-
-        # Execute the chain
-        try:
-            result = chain.invoke({
-                "format_instructions": parser.get_format_instructions(),
-                "doc_guidance": doc_guidance,
-                "existing_context": existing_context,
-                "user_instruction": user_instruction
-            })
-
-            # Convert Pydantic models to dict
-            return [item.dict() for item in result.outline]
-        except Exception as e:
-            print(f"LangChain Error in generate_outline: {e}")
-            raise ValueError(f"Failed to generate outline: {str(e)}")
+    ("user", "{user_instruction}")
+]
 
-    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
-        # Set up Pydantic output parser
-        parser = PydanticOutputParser(pydantic_object=SectionContentSchema)
-
-        # RAG: Retrieve web context if enabled
-        rag_context = ""
-        rag_metadata = {}
-        if use_rag:
-            try:
-                retriever = self._get_rag_retriever()
-                rag_result = retriever.get_relevant_context(
-                    section_title=title,
-                    topic=topic,
-                    doc_type=doc_type,
-                    top_k=5
-                )
-                if rag_result.get("context"):
-                    rag_context = f"""
-
-**WEB RESEARCH CONTEXT** (Use this information to enhance your content with factual, up-to-date details):
-
-{rag_result['context']}
-
-IMPORTANT: Incorporate insights from the above web research naturally into your content. Do NOT copy verbatim - synthesize and integrate the information.
-"""
-                    rag_metadata = {
-                        "rag_enabled": True,
-                        "sources": rag_result.get("sources", []),
-                        "query": rag_result.get("query", ""),
-                        "chunks_used": rag_result.get("chunks_used", 0)
-                    }
-                    print(f"[RAG] Retrieved {rag_result.get('chunks_used', 0)} relevant chunks for '{title}'")
-            except Exception as e:
-                print(f"[RAG Warning] Failed to retrieve context: {e}")
-                rag_metadata = {"rag_enabled": False, "error": str(e)}
-
-        # Build outline context
-        outline_str = ""
-        if outline_context:
-            for idx, section_title in enumerate(outline_context, 1):
-                marker = " ← YOU ARE HERE" if idx == section_position else ""
-                outline_str += f"{idx}. {section_title}{marker}\n"
-
-        # Style guidance based on document type
-        style_guidance = """STYLE FOR PRESENTATIONS:
-- Use bullet points (markdown format: - or *) for EVERY slide
-- Keep each bullet to 1-2 short sentences maximum
-- Focus on key takeaways, not long explanations
-- Max 120 words total per slide
-- Scannable, concise, impactful""" if doc_type == "pptx" else """STYLE FOR DOCUMENTS:
-- Use paragraphs for narrative sections (Introduction, Background, Conclusion)
-- Use bullet points for comparisons, lists, features, advantages, steps
-- Professional, comprehensive tone
-- Detailed explanations with proper analysis"""
-
-        # Create LangChain prompt template
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert content writer. {format_instructions}
+# Section generation prompt
+SECTION_PROMPT_MESSAGES = [
+    ("system", """You are an expert content writer. {format_instructions}
 
 DOCUMENT CONTEXT:
 - Topic: {topic}
@@ -270,105 +149,12 @@ REQUIREMENTS:
 4. Provide {word_count} words (±10%)
 5. Include 3-5 summary bullets in the "bullets" field (these are separate from the main content)
 6. High quality, professional content"""),
-            ("user", "Generate content for the section '{title}' about '{topic}'. First determine if this section should use bullet points or paragraphs based on the title, then generate accordingly.")
-        ])
-
-        # Build the LangChain chain
-        chain = prompt_template | self.llm | parser
-
-        # Execute the chain
-        try:
-            result = chain.invoke({
-                "format_instructions": parser.get_format_instructions(),
-                "topic": topic,
-                "title": title,
-                "word_count": word_count,
-                "doc_type": doc_type.upper(),
-                "outline_str": outline_str,
-                "style_guidance": style_guidance,
-                "rag_context": rag_context
-            })
-
-            # Convert markdown to HTML for storage
-            import markdown2
-            result_dict = result.dict()
-            result_dict['text'] = markdown2.markdown(result_dict['text'])
-
-            # Add RAG metadata to response
-            if rag_metadata:
-                result_dict['rag_metadata'] = rag_metadata
-
-            return result_dict
-        except Exception as e:
-            print(f"LangChain Error in generate_section: {e}")
-            raise ValueError(f"Failed to generate section: {str(e)}")
-
-    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None) -> Dict[str, Any]:
-        # Set up Pydantic output parser
-        parser = PydanticOutputParser(pydantic_object=RefinementOutputSchema)
-
-        # Keep the original HTML/markdown content for the prompt
-        # Don't strip it - the LLM needs to see the formatting to understand structure
-        # We'll use current_text as-is
-
-        # Calculate current word count
-        import html2text
-        h2t = html2text.HTML2Text()
-        h2t.ignore_links = False
-        h2t.body_width = 0
-        plain_text = h2t.handle(current_text) if '<' in current_text else current_text
-        current_word_count = len(plain_text.split())
-
-        # Build outline context with position marker
-        outline_str = ""
-        if outline_context:
-            for idx, section_title_item in enumerate(outline_context, 1):
-                marker = " ← YOU ARE HERE" if idx == section_position else ""
-                outline_str += f"{idx}. {section_title_item}{marker}\n"
-
-        # Build history context (last 7 refinements) with more detail
-        history_str = ""
-        if history:
-            history_str = "PREVIOUS REFINEMENTS:\n"
-            for idx, h in enumerate(history[-7:], 1):
-                prompt_text = h.get('prompt', 'No prompt')
-                diff = h.get('diff_summary', '')
-                likes = len(h.get('likes', []))
-                dislikes = len(h.get('dislikes', []))
-                reaction = "✓" if likes > 0 else ("✗" if dislikes > 0 else "○")
-
-                history_str += f"{idx}. {reaction} Request: \"{prompt_text}\"\n"
-                if diff:
-                    history_str += f"   Result: {diff}\n"
-
-            history_str += "\nNOTE: ✓ = User liked, ✗ = User disliked, ○ = Neutral. Learn from past refinements.\n"
-
-        # Style guidance
-        style_guidance = """STYLE FOR PRESENTATIONS:
-- Maintain bullet point format (markdown: - or *)
-- Keep bullets short and scannable
-- Each bullet should be 1-2 sentences maximum""" if doc_type == "pptx" else """STYLE FOR DOCUMENTS:
-- Maintain existing format unless user requests a change
-- Professional, comprehensive tone
-- Detailed and well-structured"""
+    ("user", "Generate content for the section '{title}' about '{topic}'. First determine if this section should use bullet points or paragraphs based on the title, then generate accordingly.")
+]
 
-        # Determine word count instruction based on user request
-        word_count_instruction = ""
-        instructions_lower = instructions.lower()
-        if "expand" in instructions_lower or "longer" in instructions_lower or "add more" in instructions_lower:
-            suggested_target = int(current_word_count * 1.3)
-            word_count_instruction = f"Expand to approximately {suggested_target} words (+30%)"
-        elif "shorter" in instructions_lower or "condense" in instructions_lower or "reduce" in instructions_lower:
-            suggested_target = int(current_word_count * 0.7)
-            word_count_instruction = f"Reduce to approximately {suggested_target} words (-30%)"
-        elif target_word_count:
-            word_count_instruction = f"Adjust to target: {target_word_count} words"
-        else:
-            word_count_instruction = f"Maintain approximately {current_word_count} words"
-
-        # Create LangChain prompt template with XML structure
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert content editor. {format_instructions}
+# Refinement prompt (XML structure)
+REFINE_PROMPT_MESSAGES = [
+    ("system", """You are an expert content editor. {format_instructions}
 
 <document_context>
 Title: {doc_title}
@@ -440,7 +226,7 @@ REQUIREMENTS:
 4. Use markdown formatting (will be converted to HTML automatically)
 5. Update the "bullets" field (3-5 summary points - these are separate from main content)
 6. Provide brief diff_summary explaining what changed (1-2 sentences)"""),
-            ("user", """<user_instructions>
+    ("user", """<user_instructions>
 {instructions}
 </user_instructions>
 
@@ -453,63 +239,881 @@ REQUIREMENTS:
 </success_criteria>
 
 IMPORTANT: If the user asks for transitions, use the adjacent section context to create smooth connections. If they ask to expand/condense, follow the word count target above.""")
-        ])
+]
+
+# Patch-mode refinement (see app/core/patching.py): same context, but the content is
+# numbered blocks and the model returns block edits instead of the full text
+REFINE_PATCH_PROMPT_MESSAGES = [
+    ("system", REFINE_PROMPT_MESSAGES[0][1].split("**CRITICAL")[0] + """**EDIT MODE: RETURN ONLY THE CHANGES**
+
+The current content is split into {block_count} numbered blocks ([0], [1], ...), each a paragraph, heading or list.
+Do NOT rewrite the section. Return the smallest list of edits that carries out the user's instructions:
+- {{"op": "replace", "index": n, "text": "..."}} replaces block n
+- {{"op": "insert", "index": n, "text": "..."}} adds a new block before block n (index {block_count} appends at the end)
+- {{"op": "delete", "index": n}} removes block n
+
+RULES:
+1. **OBEY user's instructions EXACTLY - this is mandatory**
+2. Indices always refer to the ORIGINAL numbering shown above
+3. Blocks you don't edit are kept verbatim - never repeat unchanged blocks
+4. Block text is markdown without the [n] marker, in the same style as the surrounding blocks
+5. Update the "bullets" field (3-5 summary points) if the edits change the key points
+6. Provide brief diff_summary explaining what changed (1-2 sentences)"""),
+    REFINE_PROMPT_MESSAGES[1]
+]
+
+# Selection-scoped refinement: one passage plus a little surrounding text, no outline/history
+REFINE_SELECTION_PROMPT_MESSAGES = [
+    ("system", """You are an expert content editor. {format_instructions}
+
+You are editing ONE passage inside the section "{section_title}" of the {doc_type} "{doc_title}".
+The text before and after it is shown for context only - do not repeat or change it.
+
+<text_before>
+{context_before}
+</text_before>
+
+<selected_passage>
+{selected_text}
+</selected_passage>
+
+<text_after>
+{context_after}
+</text_after>
+
+{style_guidance}
+
+REQUIREMENTS:
+1. **OBEY user's instructions EXACTLY - this is mandatory**
+2. Rewrite ONLY the selected passage; it must still read naturally between the text before and after it
+3. Keep the passage's shape (a sentence stays a sentence, a bullet stays a single bullet) unless asked to change it
+4. Use markdown formatting (will be converted to HTML automatically)
+5. Provide brief diff_summary explaining what changed (1 sentence)"""),
+    ("user", """<user_instructions>
+{instructions}
+</user_instructions>""")
+]
+
+# Folds older refinements into the section's rolling "editor preferences" (see app/core/history.py)
+HISTORY_SUMMARY_PROMPT_MESSAGES = [
+    ("system", """You maintain a short "editor preferences" note for one section of a document. {format_instructions}
+
+<current_preferences>
+{previous_summary}
+</current_preferences>
+
+<older_refinements>
+{refinements}
+</older_refinements>
+
+Merge the older refinements into the preferences: what the user asks for repeatedly, which changes they liked
+and which they disliked (tone, length, format, level of detail). Drop one-off requests that say nothing about
+their taste. Write at most {max_words} words as short lines, most important first."""),
+    ("user", "Update the editor preferences.")
+]
+
+# operation -> (prompt messages, output schema, guidance variable, guidance by doc type)
+_PROMPT_SPECS = {
+    "outline": (OUTLINE_PROMPT_MESSAGES, OutlineSchema, "doc_guidance", OUTLINE_DOC_GUIDANCE),
+    "section": (SECTION_PROMPT_MESSAGES, SectionContentSchema, "style_guidance", SECTION_STYLE_GUIDANCE),
+    "refine": (REFINE_PROMPT_MESSAGES, RefinementOutputSchema, "style_guidance", REFINE_STYLE_GUIDANCE),
+    "refine_patch": (REFINE_PATCH_PROMPT_MESSAGES, RefinementPatchSchema, "style_guidance", REFINE_STYLE_GUIDANCE),
+    "refine_selection": (REFINE_SELECTION_PROMPT_MESSAGES, SelectionRefinementSchema, "style_guidance", REFINE_STYLE_GUIDANCE),
+    "history_summary": (HISTORY_SUMMARY_PROMPT_MESSAGES, HistorySummarySchema, None, None),
+}
+
+@lru_cache(maxsize=None)
+def _compile_prompt(operation: str, doc_type: str):
+    messages, schema, guidance_var, guidance = _PROMPT_SPECS[operation]
+    parser = PydanticOutputParser(pydantic_object=schema)
+    prompt_template = ChatPromptTemplate.from_messages(messages).partial(
+        format_instructions=parser.get_format_instructions(),
+        **({guidance_var: guidance[doc_type]} if guidance_var else {})
+    )
+    return prompt_template, parser
+
+def get_compiled_prompt(operation: str, doc_type: str = "docx"):
+    """
+    Get the (prompt_template, parser) pair for an operation ("outline", "section",
+    "refine", "refine_patch", "refine_selection", "history_summary").
+
+    Built once per (operation, doc_type): the format instructions (serialized JSON
+    schema) and doc-type guidance are bound as partials, so each call only fills
+    in its per-request variables.
+    """
+    return _compile_prompt(operation, "pptx" if doc_type == "pptx" else "docx")
+
+class LLMAdapter(ABC):
+    # Whether calls wait for a per-model scheduler slot (HedgedLLMAdapter times them from the grant)
+    schedules_calls = False
+
+    @abstractmethod
+    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        pass
+
+    # Async siblings used by the API layer so a slow LLM round-trip
+    # doesn't block the event loop for every other request on the worker.
+    @abstractmethod
+    async def agenerate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def agenerate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def arefine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        pass
+
+    async def astream_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream section generation as events:
+        {"type": "token", "delta": <markdown>} while the text is produced, then
+        {"type": "result", "data": <same dict as agenerate_section>}.
+
+        Adapters without native streaming just emit the final result.
+        """
+        result = await self.agenerate_section(title, topic, word_count, outline_context=outline_context, doc_type=doc_type, section_position=section_position, use_rag=use_rag, rag=rag)
+        yield {"type": "result", "data": result}
+
+    async def astream_refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream refinement as token events followed by a result event (see astream_section)"""
+        result = await self.arefine_section(current_text, history, instructions, current_bullets=current_bullets, doc_title=doc_title, outline_context=outline_context, doc_type=doc_type, section_title=section_title, section_position=section_position, total_sections=total_sections, target_word_count=target_word_count, previous_section_context=previous_section_context, next_section_context=next_section_context, history_summary=history_summary)
+        yield {"type": "result", "data": result}
+
+    async def arefine_selection(self, selected_text: str, instructions: str, context_before: str = "", context_after: str = "", doc_title: Optional[str] = None, section_title: Optional[str] = None, doc_type: str = "docx") -> Dict[str, Any]:
+        """
+        Rewrite one passage (HTML) of a section, given the plain text around it.
+        Returns {"text": <HTML of the passage>, "diff_summary", "model_meta"}.
+
+        Adapters without a dedicated prompt refine the passage as a tiny section.
+        """
+        result = await self.arefine_section(selected_text, [], instructions, doc_title=doc_title, doc_type=doc_type, section_title=section_title)
+        return {key: value for key, value in result.items() if key != "bullets"}
+
+    async def asummarize_history(self, previous_summary: Optional[str], entries: List[Dict[str, Any]], doc_type: str = "docx") -> str:
+        """Fold older refinement history entries into the rolling editor-preferences summary"""
+        return fold_history(previous_summary, entries)
+
+    async def aretrieve_rag_context(self, title: str, topic: str, doc_type: str = "docx") -> Tuple[str, Dict[str, Any]]:
+        """
+        Web research for a section as (prompt_block, rag_metadata), which
+        agenerate_section/astream_section accept as `rag` instead of fetching
+        it themselves. Adapters without RAG return ("", {}).
+        """
+        return "", {}
+
+    async def aclose(self) -> None:
+        """Release pooled connections (called once on application shutdown)"""
+        pass
+
+class MockLLMAdapter(LLMAdapter):
+    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        # Deterministic mock response
+        base_sections = [
+            {"id": "s1", "title": "Introduction", "word_count": 100},
+            {"id": "s2", "title": "Market Overview", "word_count": 200},
+            {"id": "s3", "title": "Key Trends", "word_count": 200},
+            {"id": "s4", "title": "Conclusion", "word_count": 100}
+        ]
+
+        # If existing sections provided, filter out duplicates and generate complementary ones
+        if existing_sections:
+            existing_lower = [s.lower() for s in existing_sections]
+            new_sections = [s for s in base_sections if s["title"].lower() not in existing_lower]
+            return new_sections
+
+        return base_sections
+
+    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
+        return {
+            "title": title,
+            "text": f"This is the generated content for section '{title}' regarding '{topic}'. It is a mock response.",
+            "bullets": ["Point 1", "Point 2", "Point 3"],
+            "word_count": 25
+        }
+
+    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "text": f"Refined version of: {current_text[:20]}... based on '{instructions}'",
+            "bullets": current_bullets or ["Refined Point 1", "Refined Point 2", "Refined Point 3"],
+            "diff_summary": f"Applied changes based on: {instructions}"
+        }
+
+    async def agenerate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        return self.generate_outline(topic, doc_type=doc_type, existing_sections=existing_sections, use_cache=use_cache)
+
+    async def agenerate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        return self.generate_section(title, topic, word_count, outline_context=outline_context, doc_type=doc_type, section_position=section_position, use_rag=use_rag)
+
+    async def astream_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        result = self.generate_section(title, topic, word_count, outline_context=outline_context, doc_type=doc_type, section_position=section_position, use_rag=use_rag)
+        for word in result["text"].split(" "):
+            yield {"type": "token", "delta": word + " "}
+        yield {"type": "result", "data": result}
+
+    async def arefine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        return self.refine_section(current_text, history, instructions, current_bullets=current_bullets, doc_title=doc_title, outline_context=outline_context, doc_type=doc_type, section_title=section_title, section_position=section_position, total_sections=total_sections, target_word_count=target_word_count, previous_section_context=previous_section_context, next_section_context=next_section_context, history_summary=history_summary)
+
+    async def astream_refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        result = self.refine_section(current_text, history, instructions, current_bullets=current_bullets, doc_title=doc_title, outline_context=outline_context, doc_type=doc_type, section_title=section_title, section_position=section_position, total_sections=total_sections, target_word_count=target_word_count, previous_section_context=previous_section_context, next_section_context=next_section_context, history_summary=history_summary)
+        for word in result["text"].split(" "):
+            yield {"type": "token", "delta": word + " "}
+        yield {"type": "result", "data": result}
+
+class GroqLLMAdapter(LLMAdapter):
+    schedules_calls = True
+
+    def __init__(self, model: Optional[str] = None, use_routing: bool = True):
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY not found in environment variables")
+
+        # Keep-alive connection pools shared by every request this adapter serves,
+        # so generate/refine calls skip the TLS handshake after the first one
+        self.http_client, self.http_async_client = _create_http_clients()
+
+        # Initialize LangChain's ChatGroq with Llama 3.3 70B (the "large" model)
+        # This model offers excellent performance on Groq's free tier
+        self.llm = ChatGroq(
+            model=model or os.getenv("LLM_MODEL", "llama-3.3-70b-versatile"),
+            groq_api_key=api_key,
+            temperature=0.7,
+            # Transient-error retries; rate limits are paced by the scheduler instead
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            http_client=self.http_client,
+            http_async_client=self.http_async_client
+        )
+
+        # Sends cheap operations to a smaller, faster model (a pinned-model adapter, e.g. a hedging backup, doesn't route)
+        self.router = get_model_router() if use_routing else ModelRouter(self.llm.model_name, self.llm.model_name, enabled=False)
+
+        # Initialize RAG retriever (lazy loaded)
+        self._rag_retriever = None
+
+        # Semantic outline cache (lazy loaded, shares the RAG embedding model)
+        self._outline_cache = None
+        self._outline_cache_unavailable = False
+
+    def _llm_for(self, operation: str, json_mode: bool = False, model: Optional[str] = None):
+        """
+        The chat model to use for an operation: `model` (if it differs from
+        self.llm's), with the bounded response cache attached when caching is
+        enabled for it (see get_response_cache).
+        A cache configured explicitly on self.llm is left alone.
+
+        json_mode asks Groq for a JSON object response (not supported while
+        streaming). If Groq rejects the model's output as invalid JSON (400),
+        the call is retried without it and the repairing parser takes over.
+        """
+        update = {}
+        if model and getattr(self.llm, "model_name", model) != model:
+            update["model_name"] = model
+        cache = get_response_cache(operation) if self.llm.cache is None else None
+        if cache is not None:
+            update["cache"] = cache
+        # Shallow copy: shares the underlying Groq client and connection pool
+        llm = self.llm.model_copy(update=update) if update else self.llm
+
+        if json_mode and _json_mode_enabled():
+            return llm.bind(response_format={"type": "json_object"}).with_fallbacks(
+                [llm], exceptions_to_handle=(groq.BadRequestError,)
+            )
+        return llm
+
+    @staticmethod
+    def _slot(model: str, estimated_tokens: int):
+        """Requests/tokens-per-minute pacing: a slot from the scheduler for this model's quota"""
+        return get_llm_scheduler(model).slot(estimated_tokens)
+
+    def _route(self, operation: str, doc_type: str, word_count: Optional[int] = None, instructions: Optional[str] = None) -> Dict[str, str]:
+        route = self.router.route(operation, doc_type, word_count, instructions)
+        print(f"[LLM Route] {operation} ({doc_type}, {word_count} words) -> {route['model']} [{route['route']}]")
+        return route
+
+    @staticmethod
+    def _model_meta(route: Dict[str, str], started: float) -> Dict[str, Any]:
+        """Routing decision and end-to-end LLM latency, stored with the result"""
+        meta = {
+            "provider": "groq",
+            "model": route["model"],
+            "route": route["route"],
+            "latency_ms": int((time.perf_counter() - started) * 1000)
+        }
+        if "refine_mode" in route:
+            meta["refine_mode"] = route["refine_mode"]
+        return meta
+
+    def _output_parser(self, operation: str, parser: PydanticOutputParser) -> RepairingOutputParser:
+        """Wrap the schema parser with local JSON repair and a single re-ask on self.llm (paced by its scheduler)"""
+        fix_llm = None
+        if os.getenv("LLM_PARSE_REASK", "true").lower() == "true":
+            fix_llm = self.llm.bind(response_format={"type": "json_object"}) if _json_mode_enabled() else self.llm
+        return RepairingOutputParser(parser=parser, operation=operation, fix_llm=fix_llm, scheduler=get_llm_scheduler(getattr(self.llm, "model_name", "default")))
+
+    async def aclose(self) -> None:
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+    @staticmethod
+    def _estimate_tokens(chain, inputs: Dict[str, Any], expected_output_words: int) -> int:
+        """Prompt tokens plus a rough completion size (JSON wrapping included), for the scheduler"""
+        return count_tokens(chain.first.format(**inputs)) + int(expected_output_words * 1.4) + 150
+
+    async def _astream_parsed(self, chain, inputs: Dict[str, Any], expected_output_words: int, model: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the raw model output (prompt | llm) and yield token events for the
+        partial "text" field, then {"type": "parsed", "result": ...} once the
+        chain's parser has run over the complete output.
+        """
+        raw_chain = RunnableSequence(*chain.steps[:-1])
+        raw_output = ""
+        emitted_text = ""
+        async with self._slot(model, self._estimate_tokens(chain, inputs, expected_output_words)):
+            async for chunk in raw_chain.astream(inputs):
+                raw_output += chunk.content
+                text = extract_partial_field(raw_output, "text")
+                if text and text.startswith(emitted_text) and len(text) > len(emitted_text):
+                    yield {"type": "token", "delta": text[len(emitted_text):]}
+                    emitted_text = text
+
+        yield {"type": "parsed", "result": await chain.last.aparse(raw_output)}
+
+    def _get_rag_retriever(self):
+        """Lazy load RAG retriever"""
+        if self._rag_retriever is None:
+            from app.core.rag import get_rag_retriever
+            self._rag_retriever = get_rag_retriever()
+        return self._rag_retriever
+
+    def _get_outline_cache(self):
+        """Lazy load the semantic outline cache; None if disabled or embeddings can't be loaded"""
+        if self._outline_cache is None and not self._outline_cache_unavailable:
+            try:
+                embeddings = self._get_rag_retriever().embeddings
+                self._outline_cache = get_semantic_outline_cache(embeddings.embed_query)
+            except Exception as e:
+                print(f"[Outline Cache Warning] Semantic cache unavailable: {e}")
+            self._outline_cache_unavailable = self._outline_cache is None
+        return self._outline_cache
+
+    def _outline_chain(self, topic: str, doc_type: str, existing_sections: Optional[List[str]], streaming: bool = False):
+        """Build the outline chain and its inputs (shared by the sync and async paths)"""
+        prompt_template, parser = get_compiled_prompt("outline", doc_type)
+
+        # Build existing sections context
+        existing_context = ""
+        if existing_sections:
+            sections_list = "\n".join(f"  - {section}" for section in existing_sections)
+            existing_context = f"""
+**EXISTING SECTIONS** (already created by user):
+{sections_list}
+
+⚠️ IMPORTANT: DO NOT duplicate these sections. Generate ADDITIONAL complementary sections."""
+
+        user_instruction = f"Create additional professional sections for the topic: \"{topic}\" that complement the existing outline" if existing_sections else f"Create a professional outline for the topic: \"{topic}\""
+
+        # Build the LangChain chain: prompt | llm | parser
+        route = self._route("outline", doc_type)
+        chain = prompt_template | self._llm_for("outline", json_mode=not streaming, model=route["model"]) | self._output_parser("outline", parser)
+
+        return chain, {
+            "existing_context": existing_context,
+            "user_instruction": user_instruction
+        }, route
+
+    def generate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        outline_cache = self._get_outline_cache() if use_cache else None
+        if outline_cache:
+            cached = outline_cache.lookup(topic, doc_type, existing_sections)
+            if cached is not None:
+                return cached
+
+        chain, inputs, route = self._outline_chain(topic, doc_type, existing_sections)
+
+        # Execute the chain
+        try:
+            result = chain.invoke(inputs)
+
+            # Convert Pydantic models to dict
+            outline = [item.dict() for item in result.outline]
+            if outline_cache:
+                outline_cache.update(topic, doc_type, existing_sections, outline)
+            return outline
+        except Exception as e:
+            print(f"LangChain Error in generate_outline: {e}")
+            raise ValueError(f"Failed to generate outline: {str(e)}")
+
+    async def agenerate_outline(self, topic: str, doc_type: str = "docx", existing_sections: Optional[List[str]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
+        # Embedding the topic is CPU-bound - keep it off the event loop
+        outline_cache = await asyncio.to_thread(self._get_outline_cache) if use_cache else None
+        if outline_cache:
+            cached = await asyncio.to_thread(outline_cache.lookup, topic, doc_type, existing_sections)
+            if cached is not None:
+                return cached
+
+        chain, inputs, route = self._outline_chain(topic, doc_type, existing_sections)
+
+        try:
+            async with self._slot(route["model"], self._estimate_tokens(chain, inputs, 300)):
+                result = await chain.ainvoke(inputs)
+            outline = [item.dict() for item in result.outline]
+            if outline_cache:
+                await asyncio.to_thread(outline_cache.update, topic, doc_type, existing_sections, outline)
+            return outline
+        except Exception as e:
+            print(f"LangChain Error in agenerate_outline: {e}")
+            raise ValueError(f"Failed to generate outline: {str(e)}")
+
+    def _retrieve_rag_context(self, title: str, topic: str, doc_type: str):
+        """RAG: Retrieve web context for a section. Returns (prompt_block, rag_metadata)"""
+        rag_context = ""
+        rag_metadata = {}
+        try:
+            retriever = self._get_rag_retriever()
+            rag_result = retriever.get_relevant_context(
+                section_title=title,
+                topic=topic,
+                doc_type=doc_type,
+                top_k=5
+            )
+            if rag_result.get("context"):
+                rag_context = f"""
+
+**WEB RESEARCH CONTEXT** (Use this information to enhance your content with factual, up-to-date details):
+
+{rag_result['context']}
+
+IMPORTANT: Incorporate insights from the above web research naturally into your content. Do NOT copy verbatim - synthesize and integrate the information.
+"""
+                rag_metadata = {
+                    "rag_enabled": True,
+                    "sources": rag_result.get("sources", []),
+                    "query": rag_result.get("query", ""),
+                    "chunks_used": rag_result.get("chunks_used", 0),
+                    # Per-page download status, bytes read and time spent
+                    "fetch": rag_result.get("fetch_stats", [])
+                }
+                print(f"[RAG] Retrieved {rag_result.get('chunks_used', 0)} relevant chunks for '{title}'")
+        except Exception as e:
+            print(f"[RAG Warning] Failed to retrieve context: {e}")
+            rag_metadata = {"rag_enabled": False, "error": str(e)}
+        return rag_context, rag_metadata
+
+    def _section_chain(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]], doc_type: str, section_position: int, rag_context: str, streaming: bool = False):
+        """Build the section chain and its inputs (shared by the sync and async paths)"""
+        prompt_template, parser = get_compiled_prompt("section", doc_type)
+
+        # Build outline context
+        outline_str = ""
+        if outline_context:
+            for idx, section_title in enumerate(outline_context, 1):
+                marker = " ← YOU ARE HERE" if idx == section_position else ""
+                outline_str += f"{idx}. {section_title}{marker}\n"
 
         # Build the LangChain chain
-        chain = prompt_template | self.llm | parser
+        route = self._route("section", doc_type, word_count)
+        chain = prompt_template | self._llm_for("section", json_mode=not streaming, model=route["model"]) | self._output_parser("section", parser)
+
+        return chain, {
+            "topic": topic,
+            "title": title,
+            "word_count": word_count,
+            "doc_type": doc_type.upper(),
+            "outline_str": outline_str,
+            "rag_context": rag_context
+        }, route
+
+    def _section_result(self, result: SectionContentSchema, rag_metadata: Dict[str, Any], model_meta: Dict[str, Any]) -> Dict[str, Any]:
+        # Convert markdown to HTML for storage
+        import markdown2
+        result_dict = result.dict()
+        result_dict['text'] = markdown2.markdown(result_dict['text'])
+
+        # Add RAG metadata to response
+        if rag_metadata:
+            result_dict['rag_metadata'] = rag_metadata
+
+        result_dict['model_meta'] = model_meta
+        return result_dict
+
+    def generate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False) -> Dict[str, Any]:
+        rag_context, rag_metadata = self._retrieve_rag_context(title, topic, doc_type) if use_rag else ("", {})
+        chain, inputs, route = self._section_chain(title, topic, word_count, outline_context, doc_type, section_position, rag_context)
+        started = time.perf_counter()
 
         # Execute the chain
         try:
-            # Convert HTML to markdown for better LLM understanding
-            h = html2text.HTML2Text()
-            h.ignore_links = False
-            h.body_width = 0  # Don't wrap lines
-
-            # Convert HTML to markdown (preserves structure)
-            if '<' in current_text:
-                markdown_text = h.handle(current_text)
-            else:
-                markdown_text = current_text
-
-            # Build adjacent sections context
+            result = chain.invoke(inputs)
+            return self._section_result(result, rag_metadata, self._model_meta(route, started))
+        except Exception as e:
+            print(f"LangChain Error in generate_section: {e}")
+            raise ValueError(f"Failed to generate section: {str(e)}")
+
+    async def aretrieve_rag_context(self, title: str, topic: str, doc_type: str = "docx") -> Tuple[str, Dict[str, Any]]:
+        # Web search, page fetching and embedding are blocking - keep them off the event loop
+        return await asyncio.to_thread(self._retrieve_rag_context, title, topic, doc_type)
+
+    async def agenerate_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        if rag is None:
+            rag = await self.aretrieve_rag_context(title, topic, doc_type) if use_rag else ("", {})
+        rag_context, rag_metadata = rag
+        chain, inputs, route = self._section_chain(title, topic, word_count, outline_context, doc_type, section_position, rag_context)
+        started = time.perf_counter()
+
+        try:
+            async with self._slot(route["model"], self._estimate_tokens(chain, inputs, word_count)):
+                result = await chain.ainvoke(inputs)
+            return self._section_result(result, rag_metadata, self._model_meta(route, started))
+        except Exception as e:
+            print(f"LangChain Error in agenerate_section: {e}")
+            raise ValueError(f"Failed to generate section: {str(e)}")
+
+    async def astream_section(self, title: str, topic: str, word_count: int, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_position: int = 0, use_rag: bool = False, rag: Optional[Tuple[str, Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        if rag is None:
+            rag = await self.aretrieve_rag_context(title, topic, doc_type) if use_rag else ("", {})
+        rag_context, rag_metadata = rag
+        chain, inputs, route = self._section_chain(title, topic, word_count, outline_context, doc_type, section_position, rag_context, streaming=True)
+        started = time.perf_counter()
+
+        try:
+            async for event in self._astream_parsed(chain, inputs, word_count, route["model"]):
+                if event["type"] == "parsed":
+                    result = event["result"]
+                else:
+                    yield event
+        except Exception as e:
+            print(f"LangChain Error in astream_section: {e}")
+            raise ValueError(f"Failed to generate section: {str(e)}")
+
+        yield {"type": "result", "data": self._section_result(result, rag_metadata, self._model_meta(route, started))}
+
+    def _refine_chain(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]], doc_title: Optional[str], outline_context: Optional[List[str]], doc_type: str, section_title: Optional[str], section_position: int, total_sections: int, target_word_count: Optional[int], previous_section_context: Optional[str], next_section_context: Optional[str], history_summary: Optional[str] = None, streaming: bool = False):
+        """Build the refinement chain and its inputs (shared by the sync and async paths)"""
+        prompt_template, parser = get_compiled_prompt("refine", doc_type)
+
+        # Convert HTML to markdown for better LLM understanding (preserves structure)
+        markdown_text = _html_to_markdown(current_text)
+
+        # Calculate current word count
+        current_word_count = len(markdown_text.split())
+
+        # Determine word count instruction based on user request
+        word_count_instruction = ""
+        instructions_lower = instructions.lower()
+        if "expand" in instructions_lower or "longer" in instructions_lower or "add more" in instructions_lower:
+            suggested_target = int(current_word_count * 1.3)
+            word_count_instruction = f"Expand to approximately {suggested_target} words (+30%)"
+        elif "shorter" in instructions_lower or "condense" in instructions_lower or "reduce" in instructions_lower:
+            suggested_target = int(current_word_count * 0.7)
+            word_count_instruction = f"Reduce to approximately {suggested_target} words (-30%)"
+        elif target_word_count:
+            word_count_instruction = f"Adjust to target: {target_word_count} words"
+        else:
+            word_count_instruction = f"Maintain approximately {current_word_count} words"
+
+        # Build the LangChain chain
+        route = self._route("refine", doc_type, current_word_count, instructions)
+        content = markdown_text
+        content_blocks = None
+
+        # Long section, local edit: ask for block edits and apply them here (streams need the full text)
+        if not streaming and use_patch_mode(current_word_count, instructions):
+            content_blocks = split_blocks(markdown_text)
+            prompt_template, parser = get_compiled_prompt("refine_patch", doc_type)
+            chain = (
+                prompt_template
+                | self._llm_for("refine", json_mode=True, model=route["model"])
+                | self._output_parser("refine_patch", parser)
+                | RunnableLambda(lambda patch: self._apply_patch(content_blocks, patch))
+            )
+            content = number_blocks(content_blocks)
+            route = dict(route, refine_mode="patch")
+        else:
+            chain = prompt_template | self._llm_for("refine", json_mode=not streaming, model=route["model"]) | self._output_parser("refine", parser)
+
+        inputs = {
+            "doc_title": doc_title or "Document",
+            "section_title": section_title or "Section",
+            "doc_type": doc_type.upper(),
+            "total_sections": total_sections,
+            "section_position": section_position,
+            "current_word_count": current_word_count,
+            "target_word_count": target_word_count or "Not specified",
+            "current_text": content,  # Full content in markdown format (numbered blocks in patch mode)
+            "current_bullets": "\n".join(f"• {b}" for b in (current_bullets or [])),
+            "word_count_instruction": word_count_instruction,
+            "instructions": instructions
+        }
+        if content_blocks is not None:
+            inputs["block_count"] = len(content_blocks)
+
+        # Optional context blocks, shrunk in this order until the prompt fits the budget
+        blocks = [
+            ("outline_str", self._outline_versions(outline_context, section_position)),
+            ("history_str", self._history_versions(history, history_summary)),
+            ("adjacent_context", self._adjacent_versions(previous_section_context, next_section_context))
+        ]
+        limit = get_prompt_token_limit("refine", 6000)
+        fixed_tokens = count_tokens(prompt_template.format(**inputs, **{name: "" for name, _ in blocks}))
+        block_texts, total_tokens, shrunk = fit_blocks(fixed_tokens, blocks, limit)
+        inputs.update(block_texts)
+
+        shrunk_note = f", shrunk: {', '.join(shrunk)}" if shrunk else ""
+        print(f"[Refine Prompt] {total_tokens} tokens (limit {limit}){shrunk_note}")
+        if total_tokens > limit:
+            print(f"[Refine Prompt Warning] Section content alone exceeds the {limit} token budget")
+
+        return chain, inputs, route
+
+    @staticmethod
+    def _outline_versions(outline_context: Optional[List[str]], section_position: int) -> List[str]:
+        """Outline block from full to minimal: all titles, nearby titles, current title only, nothing"""
+        if not outline_context:
+            return ["Outline not available"]
+
+        def render(indices):
+            lines = []
+            for idx in indices:
+                marker = " ← YOU ARE HERE" if idx == section_position else ""
+                lines.append(f"{idx}. {outline_context[idx - 1]}{marker}\n")
+            return "".join(lines)
+
+        total = len(outline_context)
+        versions = [render(range(1, total + 1))]
+        if 1 <= section_position <= total:
+            nearby = range(max(1, section_position - 2), min(total, section_position + 2) + 1)
+            versions.append(f"(showing sections near the current one of {total})\n" + render(nearby))
+            versions.append(render([section_position]))
+        versions.append("Outline not available")
+        return versions
+
+    @staticmethod
+    def _history_versions(history: List[Dict[str, Any]], history_summary: Optional[str] = None) -> List[str]:
+        """History block from the summary plus the last 7 refinements down to the summary alone (oldest dropped first)"""
+        summary = f"EDITOR PREFERENCES (from earlier refinements):\n{history_summary}\n\n" if history_summary else ""
+        if not history:
+            return [summary or "First refinement - no previous history"]
+
+        def render(entries):
+            history_str = "PREVIOUS REFINEMENTS:\n"
+            for idx, h in enumerate(entries, 1):
+                prompt_text = h.get('prompt', 'No prompt')
+                diff = h.get('diff_summary', '')
+                likes = len(h.get('likes', []))
+                dislikes = len(h.get('dislikes', []))
+                reaction = "✓" if likes > 0 else ("✗" if dislikes > 0 else "○")
+
+                history_str += f"{idx}. {reaction} Request: \"{prompt_text}\"\n"
+                if diff:
+                    history_str += f"   Result: {diff}\n"
+
+            history_str += "\nNOTE: ✓ = User liked, ✗ = User disliked, ○ = Neutral. Learn from past refinements.\n"
+            return history_str
+
+        recent = history[-7:]
+        versions = [summary + render(recent[start:]) for start in range(len(recent))]
+        versions.append(summary or "Earlier refinements omitted to fit the prompt budget")
+        return versions
+
+    @staticmethod
+    def _adjacent_versions(previous_section_context: Optional[str], next_section_context: Optional[str]) -> List[str]:
+        """Adjacent block from full to minimal: with key points, titles only, nothing"""
+        def render(previous, following):
             adjacent_context = ""
-            if previous_section_context:
-                adjacent_context += f"Previous Section:\n{previous_section_context}\n\n"
-            if next_section_context:
-                adjacent_context += f"Next Section:\n{next_section_context}"
-            if not adjacent_context:
-                adjacent_context = "N/A (first or last section, or context not available)"
-
-            result = chain.invoke({
-                "format_instructions": parser.get_format_instructions(),
-                "doc_title": doc_title or "Document",
-                "section_title": section_title or "Section",
-                "doc_type": doc_type.upper(),
-                "total_sections": total_sections,
-                "section_position": section_position,
-                "current_word_count": current_word_count,
-                "target_word_count": target_word_count or "Not specified",
-                "outline_str": outline_str or "Outline not available",
-                "adjacent_context": adjacent_context,
-                "current_text": markdown_text,  # Full content in markdown format
-                "current_bullets": "\n".join(f"• {b}" for b in (current_bullets or [])),
-                "history_str": history_str or "First refinement - no previous history",
-                "style_guidance": style_guidance,
-                "word_count_instruction": word_count_instruction,
-                "instructions": instructions
-            })
-
-            # Convert markdown to HTML for storage
-            import markdown2
-            result_dict = result.dict()
-            result_dict['text'] = markdown2.markdown(result_dict['text'])
-            return result_dict
+            if previous:
+                adjacent_context += f"Previous Section:\n{previous}\n\n"
+            if following:
+                adjacent_context += f"Next Section:\n{following}"
+            return adjacent_context or "N/A (first or last section, or context not available)"
+
+        # Context strings start with the title line ("Title: '...'"), details follow
+        def first_line(context):
+            return context.split("\n", 1)[0] if context else context
+
+        return [
+            render(previous_section_context, next_section_context),
+            render(first_line(previous_section_context), first_line(next_section_context)),
+            "N/A (omitted to fit the prompt budget)"
+        ]
+
+    @staticmethod
+    def _apply_patch(blocks: List[str], patch: RefinementPatchSchema) -> RefinementOutputSchema:
+        new_blocks = apply_edits(blocks, [edit.dict() for edit in patch.edits])
+        print(f"[Refine Patch] {len(patch.edits)} edits on {len(blocks)} blocks")
+        return RefinementOutputSchema(text="\n\n".join(new_blocks), bullets=patch.bullets, diff_summary=patch.diff_summary)
+
+    def _refine_result(self, result: RefinementOutputSchema, model_meta: Dict[str, Any]) -> Dict[str, Any]:
+        # Convert markdown to HTML for storage
+        import markdown2
+        result_dict = result.dict()
+        result_dict['text'] = markdown2.markdown(result_dict['text'])
+        result_dict['model_meta'] = model_meta
+        return result_dict
+
+    def refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        chain, inputs, route = self._refine_chain(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary)
+        started = time.perf_counter()
+
+        # Execute the chain
+        try:
+            result = chain.invoke(inputs)
+            return self._refine_result(result, self._model_meta(route, started))
         except Exception as e:
             print(f"LangChain Error in refine_section: {e}")
             raise ValueError(f"Failed to refine section: {str(e)}")
 
+    async def arefine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> Dict[str, Any]:
+        chain, inputs, route = self._refine_chain(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary)
+        started = time.perf_counter()
+
+        try:
+            # A patch is typically a paragraph or two, not the whole section
+            expected_words = inputs["current_word_count"] // 3 if route.get("refine_mode") == "patch" else int(inputs["current_word_count"] * 1.3)
+            async with self._slot(route["model"], self._estimate_tokens(chain, inputs, expected_words)):
+                result = await chain.ainvoke(inputs)
+            return self._refine_result(result, self._model_meta(route, started))
+        except Exception as e:
+            print(f"LangChain Error in arefine_section: {e}")
+            raise ValueError(f"Failed to refine section: {str(e)}")
+
+    async def astream_refine_section(self, current_text: str, history: List[Dict[str, Any]], instructions: str, current_bullets: Optional[List[str]] = None, doc_title: Optional[str] = None, outline_context: Optional[List[str]] = None, doc_type: str = "docx", section_title: Optional[str] = None, section_position: int = 0, total_sections: int = 0, target_word_count: Optional[int] = None, previous_section_context: Optional[str] = None, next_section_context: Optional[str] = None, history_summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        chain, inputs, route = self._refine_chain(current_text, history, instructions, current_bullets, doc_title, outline_context, doc_type, section_title, section_position, total_sections, target_word_count, previous_section_context, next_section_context, history_summary, streaming=True)
+        started = time.perf_counter()
+
+        try:
+            async for event in self._astream_parsed(chain, inputs, int(inputs["current_word_count"] * 1.3), route["model"]):
+                if event["type"] == "parsed":
+                    result = event["result"]
+                else:
+                    yield event
+        except Exception as e:
+            print(f"LangChain Error in astream_refine_section: {e}")
+            raise ValueError(f"Failed to refine section: {str(e)}")
+
+        yield {"type": "result", "data": self._refine_result(result, self._model_meta(route, started))}
+
+    async def asummarize_history(self, previous_summary: Optional[str], entries: List[Dict[str, Any]], doc_type: str = "docx") -> str:
+        prompt_template, parser = get_compiled_prompt("history_summary", doc_type)
+        route = self._route("history_summary", doc_type)
+        chain = prompt_template | self._llm_for("history_summary", json_mode=True, model=route["model"]) | self._output_parser("history_summary", parser)
+        inputs = {
+            "previous_summary": previous_summary or "None yet",
+            "refinements": describe_entries(entries),
+            "max_words": 80
+        }
+
+        try:
+            async with self._slot(route["model"], self._estimate_tokens(chain, inputs, 80)):
+                result = await chain.ainvoke(inputs)
+            return clip_summary(result.summary)
+        except Exception as e:
+            # Compaction must never lose the history it replaces
+            print(f"[History Summary Warning] Falling back to rule-based summary: {e}")
+            return fold_history(previous_summary, entries)
+
+    def _selection_chain(self, selected_text: str, instructions: str, context_before: str, context_after: str, doc_title: Optional[str], section_title: Optional[str], doc_type: str):
+        """Build the selection refinement chain and its inputs - the passage only, no outline or history"""
+        prompt_template, parser = get_compiled_prompt("refine_selection", doc_type)
+        selected_markdown = _html_to_markdown(selected_text).strip()
+
+        route = self._route("refine", doc_type, len(selected_markdown.split()), instructions)
+        chain = prompt_template | self._llm_for("refine", json_mode=True, model=route["model"]) | self._output_parser("refine_selection", parser)
+        inputs = {
+            "doc_title": doc_title or "Document",
+            "section_title": section_title or "Section",
+            "doc_type": doc_type.upper(),
+            "context_before": context_before or "(start of section)",
+            "context_after": context_after or "(end of section)",
+            "selected_text": selected_markdown,
+            "instructions": instructions
+        }
+        return chain, inputs, route
+
+    @staticmethod
+    def _selection_result(result: SelectionRefinementSchema, selected_markdown: str, model_meta: Dict[str, Any]) -> Dict[str, Any]:
+        import markdown2
+        text = result.text.strip()
+        # A bullet's text is selected without its list marker - don't nest a new list inside it
+        if "\n" not in text and text.startswith(("- ", "* ")) and not selected_markdown.startswith(("- ", "* ")):
+            text = text[2:]
+        return {"text": markdown2.markdown(text), "diff_summary": result.diff_summary, "model_meta": model_meta}
+
+    async def arefine_selection(self, selected_text: str, instructions: str, context_before: str = "", context_after: str = "", doc_title: Optional[str] = None, section_title: Optional[str] = None, doc_type: str = "docx") -> Dict[str, Any]:
+        chain, inputs, route = self._selection_chain(selected_text, instructions, context_before, context_after, doc_title, section_title, doc_type)
+        started = time.perf_counter()
+
+        try:
+            async with self._slot(route["model"], self._estimate_tokens(chain, inputs, int(len(inputs["selected_text"].split()) * 1.3))):
+                result = await chain.ainvoke(inputs)
+            return self._selection_result(result, inputs["selected_text"], self._model_meta(route, started))
+        except Exception as e:
+            print(f"LangChain Error in arefine_selection: {e}")
+            raise ValueError(f"Failed to refine selection: {str(e)}")
+
+def _html_to_markdown(html: str) -> str:
+    import html2text
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.body_width = 0  # Don't wrap lines
+    return h.handle(html) if '<' in html else html
+
+def _json_mode_enabled() -> bool:
+    return os.getenv("LLM_JSON_MODE", "true").lower() == "true"
+
+def _create_http_clients():
+    """Create the sync/async HTTP clients used for LLM calls, sized from LLM_HTTP_* env vars"""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+    )
+    timeout = httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT", "60")), connect=10.0)
+
+    http2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    if http2:
+        try:
+            import h2  # noqa: F401 - HTTP/2 support is optional (httpx[http2])
+        except ImportError:
+            print("[LLM] h2 not installed - falling back to HTTP/1.1 keep-alive")
+            http2 = False
+
+    return (
+        httpx.Client(http2=http2, limits=limits, timeout=timeout),
+        httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+    )
+
+# Singleton instance
+_adapter_instance = None
+
 def get_llm_adapter() -> LLMAdapter:
-    provider = os.getenv("LLM_PROVIDER", "mock").lower()
-    if provider == "groq":
-        return GroqLLMAdapter()
-    return MockLLMAdapter()
+    """Get or create the process-wide LLM adapter (reuses its client, connection pool and RAG retriever)"""
+    global _adapter_instance
+    if _adapter_instance is None:
+        provider = os.getenv("LLM_PROVIDER", "mock").lower()
+        if provider == "groq":
+            # Hedged across backup models when LLM_HEDGE_MODELS is set
+            from app.core.hedging import create_hedged_adapter
+            _adapter_instance = create_hedged_adapter(GroqLLMAdapter())
+        elif provider == "fake":
+            # Mock content with simulated latency (see app/core/fake_llm.py)
+            from app.core.fake_llm import create_fake_adapter
+            _adapter_instance = create_fake_adapter()
+        else:
+            _adapter_instance = MockLLMAdapter()
+    return _adapter_instance
+
+async def close_llm_adapter() -> None:
+    """Close the shared adapter's connection pools; the next get_llm_adapter() builds a fresh one"""
+    global _adapter_instance
+    if _adapter_instance is not None:
+        await _adapter_instance.aclose()
+        _adapter_instance = None
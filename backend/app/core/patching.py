@@ -0,0 +1,72 @@
+"""
+Patch-mode refinement.
+
+Re-emitting a 400-word section to fix one paragraph costs ~550 output
+tokens; most of the latency of a refinement is that generation. In patch
+mode the normalized markdown is split into blocks (paragraphs, headings,
+lists), the model sees them numbered and returns only paragraph-level
+edits - replace / insert / delete by block index - which are applied here.
+Output size then scales with the edit, not with the section.
+"""
+
+from typing import Any, Dict, List
+import os
+import re
+
+_BLOCK_SPLIT_RE = re.compile(r"\n\s*\n")
+_INDEX_MARKER_RE = re.compile(r"^\s*\[\d+\]\s*")
+
+# Instructions that touch the whole section are cheaper to answer in full
+_WHOLE_SECTION_KEYWORDS = (
+    "expand", "longer", "add more", "shorter", "condense", "reduce", "summarize",
+    "bullet", "list", "points", "paragraphs", "format", "rewrite", "restructure",
+    "reorganize", "translate", "entire", "whole", "overall", "throughout"
+)
+
+
+def split_blocks(markdown_text: str) -> List[str]:
+    """Split markdown into blank-line separated blocks"""
+    return [block.strip() for block in _BLOCK_SPLIT_RE.split(markdown_text) if block.strip()]
+
+
+def number_blocks(blocks: List[str]) -> str:
+    return "\n\n".join(f"[{idx}] {block}" for idx, block in enumerate(blocks))
+
+
+def apply_edits(blocks: List[str], edits: List[Dict[str, Any]]) -> List[str]:
+    """
+    Apply edits addressed by ORIGINAL block index: replace/delete block i,
+    insert before block i (len(blocks) appends). Edits on blocks that don't
+    exist are skipped with a warning rather than failing the refinement.
+    """
+    replaced: Dict[int, str] = {}
+    deleted = set()
+    inserted: Dict[int, List[str]] = {}
+
+    for edit in edits:
+        op, idx = edit.get("op"), edit.get("index")
+        text = _INDEX_MARKER_RE.sub("", edit.get("text") or "").strip()
+        if op == "insert":
+            inserted.setdefault(min(max(idx, 0), len(blocks)), []).append(text)
+        elif not isinstance(idx, int) or not 0 <= idx < len(blocks):
+            print(f"[Refine Patch Warning] Skipping {op} on missing block {idx} (of {len(blocks)})")
+        elif op == "replace":
+            replaced[idx] = text
+        elif op == "delete":
+            deleted.add(idx)
+
+    result = []
+    for idx in range(len(blocks) + 1):
+        result.extend(inserted.get(idx, []))
+        if idx < len(blocks) and idx not in deleted:
+            result.append(replaced.get(idx, blocks[idx]))
+    return [block for block in result if block]
+
+
+def use_patch_mode(current_word_count: int, instructions: str) -> bool:
+    """Patch long sections for local edits; REFINE_PATCH_MIN_WORDS=0 turns patch mode off"""
+    min_words = int(os.getenv("REFINE_PATCH_MIN_WORDS", "250"))
+    if min_words <= 0 or current_word_count < min_words:
+        return False
+    instructions_lower = instructions.lower()
+    return not any(keyword in instructions_lower for keyword in _WHOLE_SECTION_KEYWORDS)
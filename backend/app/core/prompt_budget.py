@@ -0,0 +1,75 @@
+"""
+Token counting and budgeted prompt assembly.
+
+Long documents can push the refinement prompt past Groq's tokens-per-minute
+limits. The assembler lets each optional prompt block (outline, history,
+adjacent sections) offer progressively smaller versions of itself and
+steps blocks down, in priority order, until the prompt fits the budget.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+import os
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tokenizer once per process; None if tiktoken or its BPE file isn't available"""
+    try:
+        import tiktoken
+        # cl100k_base is close enough to the Llama 3 tokenizer for budgeting
+        return tiktoken.get_encoding(os.getenv("PROMPT_TOKENIZER", "cl100k_base"))
+    except Exception as e:
+        print(f"[Tokens] tiktoken unavailable, estimating ~4 chars/token: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the cached tokenizer (character estimate as fallback)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def fit_blocks(fixed_tokens: int, blocks: List[Tuple[str, List[str]]], limit: int) -> Tuple[Dict[str, str], int, List[str]]:
+    """
+    Choose a version of each optional block so the prompt fits `limit` tokens.
+
+    Args:
+        fixed_tokens: Tokens used by everything that is never shrunk
+        blocks: (name, versions) in shrink priority order; versions go from
+            fullest to smallest. The first block is shrunk all the way down
+            before the next one is touched.
+        limit: Token budget for the whole prompt
+
+    Returns:
+        (chosen text per block, total token count, names of blocks that were shrunk)
+    """
+    chosen = [0] * len(blocks)
+    sizes = [[None] * len(versions) for _, versions in blocks]
+
+    def size(block_idx: int) -> int:
+        version_idx = chosen[block_idx]
+        if sizes[block_idx][version_idx] is None:
+            sizes[block_idx][version_idx] = count_tokens(blocks[block_idx][1][version_idx])
+        return sizes[block_idx][version_idx]
+
+    total = fixed_tokens + sum(size(i) for i in range(len(blocks)))
+    for i, (_, versions) in enumerate(blocks):
+        while total > limit and chosen[i] < len(versions) - 1:
+            total -= size(i)
+            chosen[i] += 1
+            total += size(i)
+
+    texts = {name: versions[chosen[i]] for i, (name, versions) in enumerate(blocks)}
+    shrunk = [name for i, (name, _) in enumerate(blocks) if chosen[i] > 0]
+    return texts, total, shrunk
+
+
+def get_prompt_token_limit(operation: str, default: int) -> int:
+    """Per-operation prompt budget from e.g. REFINE_PROMPT_TOKEN_LIMIT"""
+    value: Optional[str] = os.getenv(f"{operation.upper()}_PROMPT_TOKEN_LIMIT")
+    return int(value) if value else default
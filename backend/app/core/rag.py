@@ -6,10 +6,19 @@ with up-to-date, domain-specific information.
 """
 
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
 import os
+import codecs
+import time
+import threading
+import httpx
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.core.cache import PageCache, get_page_cache, get_search_cache
+from app.core.embedding_cache import CachedEmbeddings, get_embedding_cache
 
 # Use correct non-deprecated imports
 try:
@@ -23,13 +32,219 @@ try:
 except ImportError:
     # Fallback for older versions
     from langchain_community.utilities import GoogleSearchAPIWrapper
-import requests
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+class PageFetcher:
+    """
+    Fetches search result pages concurrently over one pooled keep-alive client.
+
+    At most `per_host` requests run against the same host at a time, and
+    fetch_all() returns whatever pages arrived within its deadline - slow
+    pages are dropped instead of holding up the whole retrieval. Bodies are
+    streamed: PDFs and other binaries are skipped from their Content-Type,
+    and reading stops at max_bytes or once max_chars of text are extracted.
+
+    With a PageCache, fresh pages are served from disk without a request and
+    stale ones are revalidated with a conditional GET.
+    """
+
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        per_host: int = 2,
+        timeout: float = 5.0,
+        deadline: float = 8.0,
+        max_bytes: int = 512 * 1024,
+        max_chars: int = 5000,
+        transport: Optional[httpx.BaseTransport] = None,
+        cache: Optional[PageCache] = None
+    ):
+        self.cache = cache
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.deadline = deadline
+        self.per_host = per_host
+        self.client = httpx.Client(
+            headers={'User-Agent': self.USER_AGENT},
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_workers, max_keepalive_connections=max_workers),
+            transport=transport
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-fetch")
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def fetch(self, url: str, timeout: Optional[float] = None) -> str:
+        """Fetch one page and return its extracted text ("" on any failure)"""
+        return self.fetch_page(url, timeout)["text"]
+
+    def fetch_page(self, url: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Stream one page: skip non-text Content-Types before reading the body,
+        stop after max_bytes or once max_chars of text have been extracted.
+        Returns {"url", "text", "status", "bytes", "ms"}; status is "cached"
+        or "revalidated" when the page cache answered.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        page = {"url": url, "text": "", "status": "ok", "bytes": 0}
+
+        cached = self.cache.lookup(url) if self.cache else None
+        if cached and cached["fresh"]:
+            return dict(page, text=cached["text"], status="cached", ms=int((time.perf_counter() - started) * 1000))
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        slot = self._host_slot(url)
+        if not slot.acquire(timeout=timeout):
+            print(f"Error fetching {url}: no free connection to host within {timeout}s")
+            return dict(page, status="error", ms=int((time.perf_counter() - started) * 1000))
+        try:
+            with self.client.stream("GET", url, timeout=timeout, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    self.cache.revalidated(url)
+                    page.update(text=cached["text"], status="revalidated")
+                    return page
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_type and content_type not in TEXT_CONTENT_TYPES:
+                    print(f"[RAG] Skipping {url[:50]}... ({content_type})")
+                    page["status"] = "skipped"
+                else:
+                    extractor = TextExtractor(self.max_chars)
+                    decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+                    for chunk in response.iter_bytes():
+                        page["bytes"] += len(chunk)
+                        extractor.feed(decoder.decode(chunk))
+                        if extractor.full or page["bytes"] >= self.max_bytes:
+                            # Leaving the block closes the response without reading the rest
+                            page["status"] = "truncated"
+                            break
+                    page["text"] = extractor.text()
+                if self.cache:
+                    self.cache.store(
+                        url, page["text"], page["status"],
+                        etag=response.headers.get("etag"),
+                        last_modified=response.headers.get("last-modified")
+                    )
+        except Exception as e:
+            print(f"Error fetching {url}: {e}")
+            page["status"] = "error"
+        finally:
+            slot.release()
+            page["ms"] = int((time.perf_counter() - started) * 1000)
+        return page
+
+    def fetch_all(self, urls: List[str], deadline: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch pages concurrently; {url: fetch_page() result}. Pages that
+        haven't arrived by the deadline come back empty with status "deadline".
+        """
+        deadline = self.deadline if deadline is None else deadline
+        started = time.perf_counter()
+        futures = {self._pool.submit(self.fetch_page, url, min(self.timeout, deadline)): url for url in dict.fromkeys(urls)}
+        done, pending = wait(futures, timeout=deadline)
+
+        pages = {futures[future]: future.result() for future in done}
+        for future in pending:
+            # Not started yet: drop it; already running: its own timeout ends it
+            future.cancel()
+            url = futures[future]
+            print(f"[RAG] Deadline {deadline}s passed before {url[:50]}... arrived - skipping it")
+            pages[url] = {"url": url, "text": "", "status": "deadline", "bytes": 0, "ms": int(deadline * 1000)}
+
+        fetched = sum(1 for page in pages.values() if page["text"])
+        cached = sum(1 for page in pages.values() if page["status"] in ("cached", "revalidated"))
+        total_bytes = sum(page["bytes"] for page in pages.values())
+        print(f"[RAG] Fetched {fetched}/{len(futures)} pages ({cached} from cache, {total_bytes} bytes) in {time.perf_counter() - started:.2f}s")
+        return pages
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
+
+
+TEXT_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+
+
+class TextExtractor(HTMLParser):
+    """
+    Incremental HTML-to-text: feed() chunks as they arrive; text inside
+    scripts, styles and page chrome (nav, header, footer) is dropped. `full`
+    turns true once max_chars of text have been collected.
+    """
+
+    SKIP_TAGS = {"script", "style", "nav", "footer", "header", "noscript", "svg"}
+
+    def __init__(self, max_chars: int = 5000):
+        super().__init__()
+        self.max_chars = max_chars
+        self._skip_depth = 0
+        self._lines: List[str] = []
+        self._chars = 0
+
+    @property
+    def full(self) -> bool:
+        return self._chars >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.full:
+            return
+        for line in data.splitlines():
+            line = line.strip()
+            if line:
+                self._lines.append(line)
+                self._chars += len(line) + 1
+
+    def text(self) -> str:
+        self.close()
+        return "\n".join(self._lines)[:self.max_chars]
+
+
+def extract_text(html: str, max_chars: int = 5000) -> str:
+    """Readable text of an HTML page, without scripts, styles and page chrome"""
+    extractor = TextExtractor(max_chars)
+    extractor.feed(html)
+    return extractor.text()
+
+
+def create_page_fetcher() -> PageFetcher:
+    """PageFetcher sized from RAG_FETCH_* env vars"""
+    return PageFetcher(
+        max_workers=int(os.getenv("RAG_FETCH_MAX_CONNECTIONS", "8")),
+        per_host=int(os.getenv("RAG_FETCH_PER_HOST", "2")),
+        timeout=float(os.getenv("RAG_FETCH_TIMEOUT_SECONDS", "5")),
+        deadline=float(os.getenv("RAG_FETCH_DEADLINE_SECONDS", "8")),
+        max_bytes=int(float(os.getenv("RAG_FETCH_MAX_KB", "512")) * 1024),
+        cache=get_page_cache()
+    )
+
+
 class WebSearchRetriever:
     """
     Retrieves and processes web search results for RAG.
@@ -39,10 +254,15 @@ class WebSearchRetriever:
     def __init__(self):
         """Initialize web search retriever with embeddings"""
         # Use lightweight HuggingFace embeddings (no API key needed)
+        model_name = "sentence-transformers/all-MiniLM-L6-v2"
         self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            model_name=model_name,
             model_kwargs={'device': 'cpu'}
         )
+        # Only chunks not embedded before reach the model
+        embedding_cache = get_embedding_cache(model_name)
+        if embedding_cache is not None:
+            self.embeddings = CachedEmbeddings(self.embeddings, embedding_cache)
 
         # Text splitter for chunking web content
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -51,6 +271,10 @@ class WebSearchRetriever:
             length_function=len,
         )
 
+        # Pooled, concurrent page downloads for search results
+        self.fetcher = create_page_fetcher()
+        self.search_cache = get_search_cache()
+
         # Initialize Google Search (requires GOOGLE_API_KEY and GOOGLE_CSE_ID)
         google_api_key = os.getenv("GOOGLE_API_KEY")
         google_cse_id = os.getenv("GOOGLE_CSE_ID")
@@ -121,36 +345,39 @@ class WebSearchRetriever:
         Returns:
             Extracted text content
         """
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=timeout)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
-
-            # Get text
-            text = soup.get_text(separator='\n', strip=True)
+        return self.fetcher.fetch(url, timeout)
 
-            # Clean up whitespace
-            lines = [line.strip() for line in text.splitlines() if line.strip()]
-            text = '\n'.join(lines)
-
-            return text[:5000]  # Limit to 5000 chars per page
-
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
-            return ""
+    def search_results(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Google results for a query, from the search cache when possible.
+        The normalized query is only the cache key; Google gets the query as
+        written. Once the daily quota is used up, expired cache entries are
+        served and uncached queries are not sent at all.
+        """
+        cache = self.search_cache
+        results = cache.lookup(query, num_results)
+        if results is not None:
+            print(f"[RAG] Search cache hit for: {query}")
+            return results
+
+        if cache.quota_exhausted():
+            results = cache.lookup(query, num_results, allow_stale=True)
+            if results is not None:
+                print(f"[RAG] Daily search quota ({cache.daily_quota}) used up - serving expired results for: {query}")
+                return results
+            print(f"[RAG] Daily search quota ({cache.daily_quota}) used up - skipping search for: {query}")
+            return []
+
+        cache.record_api_call()
+        results = self.search.results(query, num_results=num_results)
+        cache.update(query, num_results, results)
+        return results
 
     def search_and_retrieve(
         self,
         query: str,
-        num_results: int = 5
+        num_results: int = 5,
+        fetch_stats: Optional[List[Dict[str, Any]]] = None
     ) -> List[Document]:
         """
         Perform web search and retrieve content from top results.
@@ -158,6 +385,7 @@ class WebSearchRetriever:
         Args:
             query: Search query string
             num_results: Number of search results to fetch
+            fetch_stats: If given, per-page download stats (url, status, bytes, ms) are appended to it
 
         Returns:
             List of Document objects with retrieved content
@@ -179,7 +407,7 @@ class WebSearchRetriever:
             print(f"[RAG] Searching Google for: {query}")
 
             # Perform Google search
-            search_results = self.search.results(query, num_results=num_results)
+            search_results = self.search_results(query, num_results=num_results)
             print(f"[RAG] Google returned {len(search_results) if search_results else 0} results")
 
             if not search_results:
@@ -191,6 +419,9 @@ class WebSearchRetriever:
                     )
                 ]
 
+            # Fetch all result pages at once; pages missing the deadline come back empty
+            pages = self.fetcher.fetch_all([result.get('link', '') for result in search_results if result.get('link')])
+
             for idx, result in enumerate(search_results, 1):
                 url = result.get('link', '')
                 title = result.get('title', 'Untitled')
@@ -198,8 +429,10 @@ class WebSearchRetriever:
 
                 print(f"[RAG] Processing result {idx}: {title[:50]}...")
 
-                # Fetch full page content
-                content = self.fetch_web_content(url)
+                page = pages.get(url, {})
+                content = page.get("text", "")
+                if fetch_stats is not None and page:
+                    fetch_stats.append({key: page[key] for key in ("url", "status", "bytes", "ms")})
 
                 if content:
                     documents.append(Document(
@@ -253,13 +486,15 @@ class WebSearchRetriever:
         search_query = self.formulate_search_query(section_title, topic, doc_type)
 
         # Step 2: Search and retrieve documents
-        documents = self.search_and_retrieve(search_query, num_results=5)
+        fetch_stats: List[Dict[str, Any]] = []
+        documents = self.search_and_retrieve(search_query, num_results=5, fetch_stats=fetch_stats)
 
         if not documents:
             return {
                 "context": "",
                 "sources": [],
                 "query": search_query,
+                "fetch_stats": fetch_stats,
                 "chunks_used": 0
             }
 
@@ -271,6 +506,7 @@ class WebSearchRetriever:
                 "context": "",
                 "sources": [],
                 "query": search_query,
+                "fetch_stats": fetch_stats,
                 "chunks_used": 0
             }
 
@@ -301,6 +537,7 @@ class WebSearchRetriever:
                 "context": context,
                 "sources": sources,
                 "query": search_query,
+                "fetch_stats": fetch_stats,
                 "chunks_used": len(relevant_chunks)
             }
 
@@ -310,6 +547,7 @@ class WebSearchRetriever:
                 "context": "",
                 "sources": [],
                 "query": search_query,
+                "fetch_stats": fetch_stats,
                 "chunks_used": 0
             }
 
@@ -324,3 +562,11 @@ def get_rag_retriever() -> WebSearchRetriever:
     if _retriever_instance is None:
         _retriever_instance = WebSearchRetriever()
     return _retriever_instance
+
+
+def close_rag_retriever() -> None:
+    """Close the shared retriever's page fetcher (HTTP client and thread pool); the next get_rag_retriever() builds a fresh one"""
+    global _retriever_instance
+    if _retriever_instance is not None:
+        _retriever_instance.fetcher.close()
+        _retriever_instance = None
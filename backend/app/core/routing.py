@@ -0,0 +1,81 @@
+"""
+Per-operation model routing.
+
+Short, formulaic work (outline JSON, 50-120 word slides, light edits of a
+slide) doesn't need the 70B model; a small model answers it several times
+faster. Rules are checked in order and the first match picks the model;
+anything unmatched - long docx sections, bigger refinements - goes to the
+large model.
+
+A rule is a dict with "model" ("fast", "large" or an explicit model name)
+and optional conditions: "operation", "doc_type", "max_words" (target
+length of the output) and "max_instruction_words" (refinement request
+length, a rough proxy for how involved the edit is). LLM_ROUTING_RULES
+replaces the defaults with a JSON list of such rules.
+"""
+
+from typing import Any, Dict, List, Optional
+import os
+import json
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"name": "outline", "operation": "outline", "model": "fast"},
+    {"name": "history-summary", "operation": "history_summary", "model": "fast"},
+    {"name": "short-slide", "operation": "section", "doc_type": "pptx", "max_words": 150, "model": "fast"},
+    {"name": "short-section", "operation": "section", "max_words": 120, "model": "fast"},
+    {"name": "simple-slide-refine", "operation": "refine", "doc_type": "pptx", "max_words": 150, "max_instruction_words": 15, "model": "fast"},
+]
+
+
+class ModelRouter:
+    def __init__(self, large_model: str, fast_model: str, rules: Optional[List[Dict[str, Any]]] = None, enabled: bool = True):
+        self.large_model = large_model
+        self.fast_model = fast_model
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.enabled = enabled
+
+    def _resolve(self, model: str) -> str:
+        return {"fast": self.fast_model, "large": self.large_model}.get(model, model)
+
+    @staticmethod
+    def _matches(rule: Dict[str, Any], operation: str, doc_type: str, word_count: Optional[int], instructions: Optional[str]) -> bool:
+        if rule.get("operation") not in (None, operation):
+            return False
+        if rule.get("doc_type") not in (None, doc_type):
+            return False
+        if "max_words" in rule and (word_count is None or word_count > rule["max_words"]):
+            return False
+        if "max_instruction_words" in rule and len((instructions or "").split()) > rule["max_instruction_words"]:
+            return False
+        return True
+
+    def route(self, operation: str, doc_type: str = "docx", word_count: Optional[int] = None, instructions: Optional[str] = None) -> Dict[str, str]:
+        """Pick the model for one call: {"model": ..., "route": rule name or "default"}"""
+        if self.enabled:
+            for idx, rule in enumerate(self.rules):
+                if self._matches(rule, operation, doc_type, word_count, instructions):
+                    return {"model": self._resolve(rule["model"]), "route": rule.get("name", f"rule-{idx}")}
+        return {"model": self.large_model, "route": "default"}
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Router configured from LLM_MODEL, LLM_FAST_MODEL, LLM_ROUTING and LLM_ROUTING_RULES"""
+    global _router
+    if _router is None:
+        rules = None
+        rules_json = os.getenv("LLM_ROUTING_RULES")
+        if rules_json:
+            try:
+                rules = json.loads(rules_json)
+            except ValueError as e:
+                print(f"[Routing Warning] Ignoring invalid LLM_ROUTING_RULES: {e}")
+        _router = ModelRouter(
+            large_model=os.getenv("LLM_MODEL", "llama-3.3-70b-versatile"),
+            fast_model=os.getenv("LLM_FAST_MODEL", "llama-3.1-8b-instant"),
+            rules=rules,
+            enabled=os.getenv("LLM_ROUTING", "true").lower() == "true"
+        )
+    return _router
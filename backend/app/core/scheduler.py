@@ -0,0 +1,240 @@
+"""
+Quota-aware scheduling for LLM calls.
+
+Groq enforces requests-per-minute and tokens-per-minute limits per API key
+and model. Rather than firing every call and letting the client retry on
+429, each call first takes a slot from its model's LLMScheduler (see
+get_llm_scheduler), which keeps two token buckets
+(requests and estimated tokens) and releases queued calls only when both
+have room. Queued calls are ordered by priority (interactive before bulk),
+then by deadline, so a user's refine jumps ahead of a running generate-all.
+
+Priority and deadline travel in context variables, so endpoints set them
+once (see llm_request_context) without threading them through every
+adapter method; asyncio tasks inherit them from the code that created them.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import os
+import time
+import heapq
+import asyncio
+import itertools
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+# Deadline used when the caller doesn't set one (seconds from enqueue)
+DEFAULT_TIMEOUTS = {PRIORITY_INTERACTIVE: 30.0, PRIORITY_BULK: 300.0}
+
+_request_priority: ContextVar[int] = ContextVar("llm_request_priority", default=PRIORITY_INTERACTIVE)
+_request_deadline: ContextVar[Optional[float]] = ContextVar("llm_request_deadline", default=None)
+_slot_granted: ContextVar[Optional[Callable[[], None]]] = ContextVar("llm_slot_granted", default=None)
+
+
+@contextmanager
+def llm_request_context(priority: int, timeout: Optional[float] = None) -> Iterator[None]:
+    """
+    Run LLM calls made inside this block (and tasks created in it) at the given
+    priority, optionally with a deadline `timeout` seconds from now.
+    """
+    priority_token = _request_priority.set(priority)
+    deadline_token = _request_deadline.set(time.monotonic() + timeout if timeout is not None else None)
+    try:
+        yield
+    finally:
+        _request_priority.reset(priority_token)
+        _request_deadline.reset(deadline_token)
+
+
+def on_slot_granted(callback: Callable[[], None]) -> None:
+    """
+    Call `callback` whenever an LLM call made later in the current task is
+    granted its slot - lets HedgedLLMAdapter time calls from the grant
+    rather than from when they joined the quota queue.
+    """
+    _slot_granted.set(callback)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; a rate <= 0 means unlimited"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+    def available(self) -> Optional[float]:
+        if self.unlimited:
+            return None
+        self._refill()
+        return round(self.level, 1)
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls within requests/tokens-per-minute limits.
+
+    Waiters sit in a heap keyed by (priority, deadline, arrival); the head is
+    released as soon as both buckets can cover it, otherwise a timer re-checks
+    when enough capacity will have refilled. Strict head-of-line ordering means
+    bulk work never overtakes a queued interactive call.
+    """
+
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 12000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight = 0
+        self._stats = {
+            name: {"granted": 0, "late": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    async def acquire(self, estimated_tokens: int, priority: Optional[int] = None, deadline: Optional[float] = None) -> float:
+        """Wait for quota for one request of `estimated_tokens`; returns seconds waited"""
+        priority = _request_priority.get() if priority is None else priority
+        deadline = deadline or _request_deadline.get() or time.monotonic() + DEFAULT_TIMEOUTS.get(priority, 60.0)
+
+        enqueued = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, deadline, next(self._sequence), estimated_tokens, waiter))
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Drop the cancelled entry now rather than leaving it to block the head
+            self._queue = [entry for entry in self._queue if entry[-1] is not waiter]
+            heapq.heapify(self._queue)
+            self._dispatch()
+            raise
+
+        waited = time.monotonic() - enqueued
+        stats = self._stats[PRIORITY_NAMES.get(priority, "bulk")]
+        stats["granted"] += 1
+        stats["wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+        if time.monotonic() > deadline:
+            stats["late"] += 1
+        return waited
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        """`async with scheduler.slot(tokens):` around one LLM call"""
+        await self.acquire(estimated_tokens)
+        granted = _slot_granted.get()
+        if granted is not None:
+            granted()
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    def _dispatch(self) -> None:
+        """Release waiters from the head of the queue while both buckets allow"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            _, _, _, estimated_tokens, waiter = self._queue[0]
+            if waiter.done():
+                heapq.heappop(self._queue)
+                continue
+
+            wait = max(self.requests.time_until(1), self.tokens.time_until(estimated_tokens))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, in-flight calls, remaining quota and wait times per priority"""
+        waiting = [entry for entry in self._queue if not entry[-1].done()]
+        by_priority = {}
+        for name, stats in self._stats.items():
+            granted = stats["granted"]
+            by_priority[name] = {
+                "granted": granted,
+                "late": stats["late"],
+                "queued": sum(1 for entry in waiting if PRIORITY_NAMES.get(entry[0], "bulk") == name),
+                "avg_wait_ms": round(stats["wait_seconds"] / granted * 1000, 1) if granted else 0.0,
+                "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 1)
+            }
+        return {
+            "queue_depth": len(waiting),
+            "in_flight": self._in_flight,
+            "requests_available": self.requests.available(),
+            "tokens_available": self.tokens.available(),
+            "priorities": by_priority
+        }
+
+
+# Per-model schedulers: Groq's limits apply to each model separately
+_schedulers: Dict[str, LLMScheduler] = {}
+
+
+def model_rate_limits(model: str) -> Tuple[float, float]:
+    """
+    (requests, tokens) per minute for a model. LLM_RATE_LIMITS lists per-model
+    overrides as "model=rpm/tpm,..." (default: Groq's free tier for
+    llama-3.1-8b-instant); other models use LLM_RATE_LIMIT_RPM / LLM_RATE_LIMIT_TPM
+    (Groq's free tier for llama-3.3-70b). 0 disables a limit.
+    """
+    for entry in os.getenv("LLM_RATE_LIMITS", "llama-3.1-8b-instant=30/6000").split(","):
+        name, _, limits = entry.strip().partition("=")
+        if name == model and "/" in limits:
+            rpm, tpm = limits.split("/", 1)
+            return float(rpm), float(tpm)
+    return float(os.getenv("LLM_RATE_LIMIT_RPM", "30")), float(os.getenv("LLM_RATE_LIMIT_TPM", "12000"))
+
+
+def get_llm_scheduler(model: str = "default") -> LLMScheduler:
+    """
+    Process-wide scheduler for one model, sized by model_rate_limits().
+    With several uvicorn workers, divide the limits by the worker count.
+    """
+    if model not in _schedulers:
+        requests_per_minute, tokens_per_minute = model_rate_limits(model)
+        _schedulers[model] = LLMScheduler(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+    return _schedulers[model]
+
+
+def get_llm_scheduler_stats() -> Optional[Dict[str, Dict[str, Any]]]:
+    """Stats per model, for every scheduler created so far"""
+    return {model: scheduler.stats() for model, scheduler in _schedulers.items()} or None
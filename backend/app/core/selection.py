@@ -0,0 +1,121 @@
+"""
+Selection-scoped refinement helpers.
+
+A micro-edit ("reword this sentence", "punch up this bullet") only needs the
+selected span and a little surrounding text, not the whole section plus
+outline and history. These helpers resolve a selection - a block index or
+a character range of the section HTML - to a span, extract a plain-text
+context window around it, and splice the refined HTML back in.
+"""
+
+from typing import List, Optional, Tuple
+from html.parser import HTMLParser
+import os
+import re
+
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_BLOCK_START_RE = re.compile(r"\s*<(p|h[1-6]|ul|ol|li|blockquote|pre|table|div)\b", re.IGNORECASE)
+_SINGLE_PARAGRAPH_RE = re.compile(r"^\s*<p>(.*?)</p>\s*$", re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class _BlockScanner(HTMLParser):
+    """Collects the inner ranges of top-level elements (list items for top-level lists)"""
+
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=False)
+        self._line_starts = [0] + [m.end() for m in re.finditer("\n", html)]
+        self._stack: List[Tuple[str, int]] = []
+        self.ranges: List[Tuple[int, int]] = []
+        self.balanced = True
+
+    @property
+    def unclosed(self) -> bool:
+        return bool(self._stack)
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in _VOID_TAGS:
+            self._stack.append((tag, self._offset() + len(self.get_starttag_text())))
+
+    def handle_endtag(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            self.balanced = False
+            return
+        while self._stack:
+            open_tag, inner_start = self._stack.pop()
+            if open_tag == tag:
+                break
+            self.balanced = False
+
+        if not self._stack and tag not in ("ul", "ol"):
+            self.ranges.append((inner_start, self._offset()))
+        elif len(self._stack) == 1 and tag == "li" and self._stack[0][0] in ("ul", "ol"):
+            self.ranges.append((inner_start, self._offset()))
+
+
+def _scan(html: str) -> _BlockScanner:
+    scanner = _BlockScanner(html)
+    scanner.feed(html)
+    scanner.close()
+    return scanner
+
+
+def block_ranges(html: str) -> List[Tuple[int, int]]:
+    """(start, end) of each block's inner HTML: paragraphs, headings, and items of top-level lists"""
+    ranges = sorted(_scan(html).ranges)
+    if not ranges and html.strip():
+        return [(0, len(html))]  # plain text content
+    return ranges
+
+
+def _inside_tag(html: str, pos: int) -> bool:
+    return html.rfind("<", 0, pos) > html.rfind(">", 0, pos)
+
+
+def resolve_selection(html: str, block_index: Optional[int] = None, start: Optional[int] = None, end: Optional[int] = None) -> Tuple[int, int]:
+    """The (start, end) span a selection refers to; ValueError if it is invalid"""
+    if block_index is not None:
+        ranges = block_ranges(html)
+        if block_index >= len(ranges):
+            raise ValueError(f"Block {block_index} does not exist (section has {len(ranges)} blocks)")
+        return ranges[block_index]
+
+    if start is None or end is None:
+        raise ValueError("Selection needs a block_index or both start and end")
+    if not 0 <= start < end <= len(html):
+        raise ValueError(f"Selection {start}-{end} is outside the section content ({len(html)} characters)")
+    if _inside_tag(html, start) or _inside_tag(html, end):
+        raise ValueError("Selection must not start or end inside an HTML tag")
+    scanner = _scan(html[start:end])
+    if not scanner.balanced or scanner.unclosed:
+        raise ValueError("Selection must not cut across HTML elements")
+    return start, end
+
+
+def _plain_text(html: str) -> str:
+    return re.sub(r"\s+", " ", _TAG_RE.sub(" ", html)).strip()
+
+
+def context_window(html: str, start: int, end: int, chars: Optional[int] = None) -> Tuple[str, str]:
+    """Plain text immediately before and after the span (REFINE_SELECTION_CONTEXT_CHARS each)"""
+    if chars is None:
+        chars = int(os.getenv("REFINE_SELECTION_CONTEXT_CHARS", "300"))
+    before = _plain_text(html[:start])
+    after = _plain_text(html[end:])
+    return before[-chars:] if chars else "", after[:chars] if chars else ""
+
+
+def splice(html: str, start: int, end: int, replacement_html: str) -> str:
+    """
+    Replace html[start:end] with the refined HTML. A span inside a block gets
+    inline HTML: the single <p> markdown rendering adds is unwrapped.
+    """
+    if not _BLOCK_START_RE.match(html[start:end]):
+        match = _SINGLE_PARAGRAPH_RE.match(replacement_html)
+        if match:
+            replacement_html = match.group(1)
+    return html[:start] + replacement_html.strip() + html[end:]
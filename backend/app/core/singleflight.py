@@ -0,0 +1,73 @@
+"""
+In-process single-flight deduplication.
+
+Double-clicks and frontend retries can send the same /generate or
+/suggest-outline call twice before the first one finishes. SingleFlight
+runs one of them and lets concurrent duplicates (same key) await and share
+its result, so the LLM is called once and only one write hits the outline.
+Keys are only held while the call is in flight - nothing is cached.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import json
+import asyncio
+import hashlib
+
+
+def input_hash(*parts: Any) -> str:
+    """Stable hash of request inputs for use in a single-flight key"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, operation: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() unless an identical call is already in flight, in which case
+        wait for and return that call's result (or exception).
+        """
+        stats = self._stats.setdefault(operation, {"calls": 0, "coalesced": 0})
+        stats["calls"] += 1
+
+        full_key = (operation, key)
+        task = self._in_flight.get(full_key)
+        if task is not None:
+            stats["coalesced"] += 1
+            print(f"[SingleFlight] Joining in-flight {operation} call {key}")
+        else:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[full_key] = task
+
+            def release(done: asyncio.Future) -> None:
+                if self._in_flight.get(full_key) is done:
+                    del self._in_flight[full_key]
+            task.add_done_callback(release)
+
+        # shield: a caller disconnecting must not cancel the call others are waiting on
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "operations": {
+                operation: dict(stats, coalesce_rate=round(stats["coalesced"] / stats["calls"], 3) if stats["calls"] else 0.0)
+                for operation, stats in self._stats.items()
+            }
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+
+def get_single_flight_stats() -> Optional[Dict[str, Any]]:
+    return _single_flight.stats() if _single_flight is not None else None
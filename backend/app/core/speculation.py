@@ -0,0 +1,146 @@
+"""
+Speculative pre-generation of queued sections.
+
+Right after an outline is saved, the first few queued sections are
+generated in the background at bulk priority. Results are kept in memory
+(never written to Firestore) keyed by section and a hash of the exact
+generation inputs; when the user then asks for one of those sections,
+/generate returns the speculative result instead of calling the LLM.
+
+Any outline edit or reorder cancels the project's speculation - changed
+titles or positions would make the results stale anyway, and the input
+hash guards against anything that slips through. Results nobody claims
+within SPECULATIVE_RESULT_TTL_SECONDS are dropped (and counted as
+discarded) by a timer, so they don't sit in memory until the next start().
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import time
+import asyncio
+from app.core.scheduler import llm_request_context, PRIORITY_BULK
+from app.core.singleflight import input_hash
+
+
+class SpeculativeGenerator:
+    def __init__(self, ttl_seconds: float = 1800):
+        self.ttl_seconds = ttl_seconds
+        # project_id -> section_id -> {"key", "task", "created_at", "expiry"}
+        self._entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._stats = {
+            "started": 0, "completed": 0, "failed": 0, "cancelled": 0,
+            "hits": 0, "stale": 0, "discarded": 0, "words_generated": 0
+        }
+
+    def start(self, project_id: str, adapter, jobs: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Begin generating each (section_id, agenerate_section kwargs) job in the background"""
+        self._prune()
+        self.cancel_project(project_id)
+        if not jobs:
+            return
+
+        loop = asyncio.get_running_loop()
+        entries = self._entries.setdefault(project_id, {})
+        for section_id, kwargs in jobs:
+            task = asyncio.ensure_future(self._generate(adapter, kwargs))
+            # Mark failures as retrieved; a failed speculation just falls back to normal generation
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            entry = {"key": input_hash(kwargs), "task": task, "created_at": time.time()}
+            entry["expiry"] = loop.call_later(self.ttl_seconds, self._expire, project_id, section_id, entry)
+            entries[section_id] = entry
+            self._stats["started"] += 1
+        print(f"[Speculation] Pre-generating {len(jobs)} sections for project {project_id}")
+
+    async def _generate(self, adapter, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with llm_request_context(PRIORITY_BULK):
+                result = await adapter.agenerate_section(**kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        self._stats["completed"] += 1
+        self._stats["words_generated"] += len(result.get("text", "").split())
+        return result
+
+    async def take(self, project_id: str, section_id: str, kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Claim the speculative result for a section if one was started with the
+        same inputs (waiting for it if still running); None means generate normally.
+        """
+        self._prune()
+        entry = self._entries.get(project_id, {}).pop(section_id, None)
+        if entry is None:
+            return None
+
+        entry["expiry"].cancel()
+        task = entry["task"]
+        if entry["key"] != input_hash(kwargs):
+            self._stats["stale"] += 1
+            task.cancel()
+            return None
+
+        try:
+            # shield: a client disconnecting while we wait shouldn't throw the work away
+            result = await asyncio.shield(task)
+        except Exception:
+            return None
+        self._stats["hits"] += 1
+        return result
+
+    def cancel_project(self, project_id: str) -> None:
+        """Drop all speculation for a project (outline changed or project deleted)"""
+        for entry in self._entries.pop(project_id, {}).values():
+            self._discard(entry)
+
+    def _discard(self, entry: Dict[str, Any]) -> None:
+        entry["expiry"].cancel()
+        task = entry["task"]
+        if task.done():
+            # Finished but never used - counts against the spend
+            self._stats["discarded"] += 1
+        else:
+            self._stats["cancelled"] += 1
+            task.cancel()
+
+    def _expire(self, project_id: str, section_id: str, entry: Dict[str, Any]) -> None:
+        """TTL timer: drop the entry unless it was claimed or replaced meanwhile"""
+        entries = self._entries.get(project_id, {})
+        if entries.get(section_id) is entry:
+            self._discard(entries.pop(section_id))
+            if not entries:
+                del self._entries[project_id]
+
+    def _prune(self) -> None:
+        # Backstop for timers that didn't run (e.g. their event loop has stopped)
+        cutoff = time.time() - self.ttl_seconds
+        for project_id in list(self._entries):
+            entries = self._entries[project_id]
+            for section_id in [sid for sid, e in entries.items() if e["created_at"] <= cutoff]:
+                self._discard(entries.pop(section_id))
+            if not entries:
+                del self._entries[project_id]
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        stats = dict(self._stats)
+        stats["pending"] = sum(len(entries) for entries in self._entries.values())
+        stats["hit_rate"] = round(stats["hits"] / stats["started"], 3) if stats["started"] else 0.0
+        return stats
+
+
+_speculator: Optional[SpeculativeGenerator] = None
+
+
+def get_speculator() -> SpeculativeGenerator:
+    global _speculator
+    if _speculator is None:
+        _speculator = SpeculativeGenerator(
+            ttl_seconds=float(os.getenv("SPECULATIVE_RESULT_TTL_SECONDS", "1800"))
+        )
+    return _speculator
+
+
+def get_speculation_stats() -> Optional[Dict[str, Any]]:
+    return _speculator.stats() if _speculator is not None else None
@@ -0,0 +1,74 @@
+"""
+Helpers for streaming LLM output to the browser as Server-Sent Events.
+"""
+
+from typing import Any, Dict, Optional
+import json
+import markdown2
+from langchain_core.utils.json import parse_json_markdown
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Serialize one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def extract_partial_field(raw_output: str, field: str) -> Optional[str]:
+    """
+    Pull a string field out of a partially streamed JSON response.
+
+    Returns None while the field hasn't started yet (or the partial JSON
+    can't be parsed at this point of the stream).
+    """
+    try:
+        partial = parse_json_markdown(raw_output)
+    except Exception:
+        return None
+    value = partial.get(field) if isinstance(partial, dict) else None
+    return value if isinstance(value, str) else None
+
+
+class IncrementalMarkdownRenderer:
+    """
+    Renders a growing markdown string to HTML.
+
+    Blocks that are already closed by a blank line are rendered once and
+    kept; only the block still being written is re-rendered on each update.
+    """
+
+    def __init__(self):
+        self._closed_markdown = ""
+        self._closed_html = ""
+
+    def _close_blocks(self, markdown_text: str) -> str:
+        """Render the blocks closed since the last call; returns their HTML"""
+        if not markdown_text.startswith(self._closed_markdown):
+            # Text was rewritten rather than appended - start over
+            self._closed_markdown = ""
+            self._closed_html = ""
+
+        cut = markdown_text.rfind("\n\n") + 2
+        if cut <= max(len(self._closed_markdown), 1):
+            return ""
+        closed_html = markdown2.markdown(markdown_text[len(self._closed_markdown):cut])
+        self._closed_html += closed_html
+        self._closed_markdown = markdown_text[:cut]
+        return closed_html
+
+    def _tail_html(self, markdown_text: str) -> str:
+        tail = markdown_text[len(self._closed_markdown):]
+        return markdown2.markdown(tail) if tail.strip() else ""
+
+    def render(self, markdown_text: str) -> str:
+        self._close_blocks(markdown_text)
+        return self._closed_html + self._tail_html(markdown_text)
+
+    def update(self, markdown_text: str) -> Dict[str, str]:
+        """
+        Token event fields for appended text: "closed_html" holds the blocks
+        closed since the last update (the client appends it), "tail_html" the
+        block still being written (replaces the previous tail). Each event
+        stays the size of one block instead of the whole section.
+        """
+        closed_html = self._close_blocks(markdown_text)
+        return {"closed_html": closed_html, "tail_html": self._tail_html(markdown_text)}
@@ -0,0 +1,254 @@
+"""
+Tolerant structured-output parsing.
+
+Every chain ends in a PydanticOutputParser, which raises on the slightest
+malformation (code fences, trailing prose, unescaped quotes inside HTML,
+raw newlines in strings, truncated output). RepairingOutputParser wraps it:
+
+1. parse the output as-is;
+2. run a local repair pass (strip fences, cut trailing prose, escape stray
+   quotes/newlines, drop trailing commas, close unbalanced brackets) and
+   parse again;
+3. only then re-ask the LLM to fix its own output, once.
+
+Outcomes are counted per operation so parse-failure rates show up in /metrics.
+"""
+
+from typing import Any, Dict, Optional
+import re
+import json
+import threading
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser, PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from app.core.prompt_budget import count_tokens
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+
+FIX_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You repair malformed JSON. Reply with ONLY the corrected JSON object - no explanations, no code fences."),
+    ("human", """The following output was supposed to match these format instructions:
+{format_instructions}
+
+Output:
+{output}
+
+Parser error: {error}
+
+Return the corrected JSON object, keeping all of the original content.""")
+])
+
+
+def _strip_fences(text: str) -> str:
+    match = _FENCE_RE.search(text)
+    if match:
+        return match.group(1)
+    # Unterminated fence (truncated output)
+    return re.sub(r"^\s*```(?:json|JSON)?", "", text)
+
+
+def _next_significant(text: str, start: int) -> Optional[str]:
+    for ch in text[start:]:
+        if not ch.isspace():
+            return ch
+    return None
+
+
+def _drop_trailing_comma(out: list) -> None:
+    idx = len(out) - 1
+    while idx >= 0 and out[idx].isspace():
+        idx -= 1
+    if idx >= 0 and out[idx] == ",":
+        del out[idx]
+
+
+def _balance(text: str) -> str:
+    """
+    Re-serialize the first JSON object in `text` character by character:
+    a quote inside a string that isn't followed by , } ] or : is treated as
+    content and escaped, raw newlines in strings are escaped, trailing commas
+    before a closing bracket are dropped (only outside strings), anything
+    after the top-level object is dropped and unclosed strings/brackets are
+    closed.
+    """
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                if _next_significant(text, i + 1) in (None, ",", "}", "]", ":"):
+                    in_string = False
+                else:
+                    out.append('\\"')
+                    continue
+            elif ch == "\n":
+                out.append("\\n")
+                continue
+            out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                continue  # stray closer
+            _drop_trailing_comma(out)
+            stack.pop()
+            if not stack:
+                out.append(ch)
+                return "".join(out)
+        out.append(ch)
+
+    # Truncated output: close whatever is still open
+    if escaped:
+        out.pop()
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip().rstrip(",")
+    if repaired.endswith(":"):
+        repaired += " null"
+    return repaired + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """Best-effort decode of almost-JSON LLM output; None if it can't be salvaged"""
+    text = _strip_fences(text)
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+
+    for candidate in (text, _balance(text)):
+        try:
+            # strict=False accepts raw control characters inside strings
+            return json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+# Per-operation outcome counters: parsed first try, repaired locally, fixed by re-ask, failed
+_parse_stats: Dict[str, Dict[str, int]] = {}
+_parse_stats_lock = threading.Lock()
+
+
+def _record(operation: str, outcome: str) -> None:
+    with _parse_stats_lock:
+        stats = _parse_stats.setdefault(operation, {"parsed": 0, "repaired": 0, "reasked": 0, "failed": 0})
+        stats[outcome] += 1
+
+
+def get_parse_stats() -> Dict[str, Dict[str, Any]]:
+    with _parse_stats_lock:
+        result = {}
+        for operation, stats in _parse_stats.items():
+            total = sum(stats.values())
+            result[operation] = dict(
+                stats,
+                first_try_failure_rate=round((total - stats["parsed"]) / total, 3) if total else 0.0,
+                failure_rate=round(stats["failed"] / total, 3) if total else 0.0
+            )
+        return result
+
+
+class RepairingOutputParser(BaseOutputParser[Any]):
+    """PydanticOutputParser with a local JSON repair pass and an optional single LLM re-ask"""
+
+    parser: PydanticOutputParser
+    operation: str
+    # Chat model used to re-ask for valid JSON; None disables the re-ask
+    fix_llm: Optional[Any] = None
+    # LLMScheduler for fix_llm's quota; the async re-ask waits for a slot like any other call
+    scheduler: Optional[Any] = None
+
+    @property
+    def _type(self) -> str:
+        return "repairing_output_parser"
+
+    def get_format_instructions(self) -> str:
+        return self.parser.get_format_instructions()
+
+    def _parse_with_repair(self, text: str):
+        """(result, repaired?) - raises the original parser error if the text can't be salvaged"""
+        try:
+            return self.parser.parse(text), False
+        except OutputParserException as e:
+            repaired = repair_json(text)
+            if repaired is None:
+                raise
+            try:
+                return self.parser.parse(json.dumps(repaired)), True
+            except OutputParserException:
+                raise e
+
+    def _parse_locally(self, text: str) -> Any:
+        result, repaired = self._parse_with_repair(text)
+        if repaired:
+            print(f"[Structured Output] Repaired malformed {self.operation} JSON locally")
+        _record(self.operation, "repaired" if repaired else "parsed")
+        return result
+
+    def _fix_messages(self, text: str, error: Exception):
+        return FIX_PROMPT.format_messages(
+            format_instructions=self.parser.get_format_instructions(),
+            output=text,
+            error=str(error)
+        )
+
+    def _parse_fixed(self, fixed_output: str) -> Any:
+        try:
+            result, _ = self._parse_with_repair(fixed_output)
+        except OutputParserException:
+            _record(self.operation, "failed")
+            raise
+        _record(self.operation, "reasked")
+        return result
+
+    def parse(self, text: str) -> Any:
+        try:
+            return self._parse_locally(text)
+        except OutputParserException as e:
+            if self.fix_llm is None:
+                _record(self.operation, "failed")
+                raise
+            print(f"[Structured Output] Re-asking LLM to fix {self.operation} JSON: {e}")
+            try:
+                fixed = self.fix_llm.invoke(self._fix_messages(text, e))
+            except Exception:
+                _record(self.operation, "failed")
+                raise e
+            return self._parse_fixed(fixed.content)
+
+    async def aparse_result(self, result, *, partial: bool = False) -> Any:
+        # The base class would run the sync parse (and its re-ask) in a thread
+        return await self.aparse(result[0].text)
+
+    async def aparse(self, text: str) -> Any:
+        try:
+            return self._parse_locally(text)
+        except OutputParserException as e:
+            if self.fix_llm is None:
+                _record(self.operation, "failed")
+                raise
+            print(f"[Structured Output] Re-asking LLM to fix {self.operation} JSON: {e}")
+            messages = self._fix_messages(text, e)
+            try:
+                if self.scheduler is None:
+                    fixed = await self.fix_llm.ainvoke(messages)
+                else:
+                    estimated_tokens = count_tokens(" ".join(m.content for m in messages)) + count_tokens(text) + 150
+                    async with self.scheduler.slot(estimated_tokens):
+                        fixed = await self.fix_llm.ainvoke(messages)
+            except Exception:
+                _record(self.operation, "failed")
+                raise e
+            return self._parse_fixed(fixed.content)
@@ -9,6 +9,8 @@ class Refinement(BaseModel):
     raw_response: Optional[str] = None
     parsed_text: Optional[str] = None
     diff_summary: Optional[str] = None
+    model_meta: Optional[Dict[str, Any]] = None  # Model, routing rule and latency of the LLM call
+    selection: Optional[Dict[str, int]] = None  # Refined span (start/end in the previous content) for selection refinements
     created_at: datetime
     likes: List[str] = []
     dislikes: List[str] = []
@@ -29,6 +31,8 @@ class Section(BaseModel):
     refinement_history: List[Refinement] = []
     comments: List[Comment] = []
     version: int = 1
+    history_summary: Optional[str] = None  # Rolling "editor preferences" folded from older refinements
+    history_summarized: int = 0  # Number of refinements folded into history_summary
 
 class GenerationHistoryItem(BaseModel):
     timestamp: datetime
@@ -66,16 +70,58 @@ class Project(ProjectBase):
 class SuggestOutlineRequest(BaseModel):
     topic: str
     existing_sections: Optional[List[str]] = []  # Titles of existing sections for context
+    use_cache: Optional[bool] = True  # Set False to skip the semantic outline cache
+    speculative_sections: Optional[int] = Field(None, ge=0, le=10)  # Pre-generate the first N queued sections (default: SPECULATIVE_GENERATION_SECTIONS)
 
 class GenerateContentRequest(BaseModel):
     section_id: str
     prompt_override: Optional[str] = None
     use_rag: Optional[bool] = False  # Enable web search RAG
 
+class GenerateAllRequest(BaseModel):
+    section_ids: Optional[List[str]] = None  # Defaults to every queued section
+    use_rag: Optional[bool] = False
+    max_concurrency: Optional[int] = Field(None, ge=1, le=16)  # Defaults to GENERATE_ALL_CONCURRENCY
+
+class SectionGenerationResult(BaseModel):
+    section_id: str
+    status: str  # done, failed
+    error: Optional[str] = None
+    duration_ms: int = 0
+
+class GenerateAllResponse(BaseModel):
+    sections: List[Section]
+    results: List[SectionGenerationResult]
+
+class RefineSelection(BaseModel):
+    """Part of a section to refine: a block (paragraph, heading or list item) or a character range of the section HTML"""
+    block_index: Optional[int] = Field(None, ge=0)
+    start: Optional[int] = Field(None, ge=0)
+    end: Optional[int] = Field(None, ge=0)
+
 class RefineRequest(BaseModel):
     prompt: str
     user_id: str
     target_word_count: Optional[int] = None  # Optional explicit word count target
+    selection: Optional[RefineSelection] = None  # Refine only this span (micro-edit)
+
+class RefineBatchRequest(BaseModel):
+    prompt: str  # Applied to every section, e.g. "use a more formal tone"
+    user_id: str
+    section_ids: Optional[List[str]] = None  # Defaults to every section with content
+    target_word_count: Optional[int] = None
+    max_concurrency: Optional[int] = Field(None, ge=1, le=16)  # Defaults to REFINE_BATCH_CONCURRENCY
+
+class SectionRefinementResult(BaseModel):
+    section_id: str
+    status: str  # done, failed
+    refinement_id: Optional[str] = None
+    error: Optional[str] = None
+    duration_ms: int = 0
+
+class RefineBatchResponse(BaseModel):
+    sections: List[Section]
+    results: List[SectionRefinementResult]
 
 class CommentRequest(BaseModel):
     text: str
@@ -129,6 +175,27 @@ class RefinementOutputSchema(BaseModel):
     bullets: List[str] = Field(description="Updated bullet points")
     diff_summary: str = Field(description="Summary of changes made during refinement")
 
+class SelectionRefinementSchema(BaseModel):
+    """Schema for selection-scoped refinement response"""
+    text: str = Field(description="The rewritten passage only, in Markdown format")
+    diff_summary: str = Field(description="Summary of changes made to the passage")
+
+class HistorySummarySchema(BaseModel):
+    """Schema for the rolling refinement history summary"""
+    summary: str = Field(description="Short editor-preferences summary")
+
+class BlockEditSchema(BaseModel):
+    """A single paragraph-level edit in a patch-mode refinement"""
+    op: str = Field(description='"replace", "insert" or "delete"')
+    index: int = Field(description="Number of the block the edit applies to; insert adds the new block before it")
+    text: Optional[str] = Field(None, description="New block content in Markdown (replace/insert only)")
+
+class RefinementPatchSchema(BaseModel):
+    """Schema for patch-mode refinement response: edits instead of the full text"""
+    edits: List[BlockEditSchema] = Field(description="Edits to apply, indices refer to the original block numbers")
+    bullets: List[str] = Field(description="Updated bullet points")
+    diff_summary: str = Field(description="Summary of changes made during refinement")
+
 class UserRegistration(BaseModel):
     email: str
     password: str
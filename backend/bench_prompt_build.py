@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-call prompt-build overhead before and after precompiling.
+
+"Before" rebuilds the ChatPromptTemplate, PydanticOutputParser and format
+instructions on every call (the old behaviour); "after" uses the cached
+get_compiled_prompt(). Both format the same messages, so the difference is
+pure prompt/parser construction cost. No API key or network needed.
+
+Usage: python bench_prompt_build.py [iterations]
+"""
+
+import sys
+import time
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import PydanticOutputParser
+from app.core.llm import _PROMPT_SPECS, get_compiled_prompt
+
+
+def build_uncached(operation: str, doc_type: str):
+    messages, schema, guidance_var, guidance = _PROMPT_SPECS[operation]
+    parser = PydanticOutputParser(pydantic_object=schema)
+    prompt_template = ChatPromptTemplate.from_messages(messages)
+    bound = {"format_instructions": parser.get_format_instructions()}
+    if guidance_var is not None:
+        bound[guidance_var] = guidance[doc_type]
+    return prompt_template, bound
+
+
+def build_cached(operation: str, doc_type: str):
+    prompt_template, parser = get_compiled_prompt(operation, doc_type)
+    return prompt_template, {}
+
+
+def time_per_call(build, operation: str, doc_type: str, iterations: int) -> float:
+    prompt_template, _ = get_compiled_prompt(operation, doc_type)
+    variables = {v: "x" for v in prompt_template.input_variables}
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        template, bound = build(operation, doc_type)
+        template.format_messages(**variables, **bound)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print("=" * 60)
+    print(f"Prompt build + format, {iterations} iterations (µs per call)")
+    print("=" * 60)
+    print(f"{'operation':<18}{'doc_type':<10}{'before':>12}{'after':>12}{'speedup':>10}")
+
+    for operation in _PROMPT_SPECS:
+        for doc_type in ("docx", "pptx"):
+            before = time_per_call(build_uncached, operation, doc_type, iterations)
+            after = time_per_call(build_cached, operation, doc_type, iterations)
+            print(f"{operation:<18}{doc_type:<10}{before:>12.1f}{after:>12.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: drives the real FastAPI app in-process with concurrent
+generate / refine / export traffic.
+
+The LLM is FakeLLMAdapter (realistic latency, no API key) and Firestore is
+an in-memory stand-in whose calls block for --db-latency-ms, like the real
+synchronous Firestore client does inside our async handlers. Everything
+runs on one event loop, so anything that blocks it shows up directly as
+event-loop lag and tail latency.
+
+Reports p50/p95/p99 per endpoint, throughput, event-loop lag and lost
+updates (sections whose successful /generate result was overwritten by a
+concurrent write to the same project).
+
+Usage: python loadtest.py [--requests 200] [--concurrency 20] [--max-p99-ms N]
+                         [--max-loop-lag-ms N] [--max-lost-updates N]
+"""
+
+from typing import Any, Dict, List, Optional
+import sys
+import copy
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import numpy as np
+import httpx
+
+
+class _Snapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+
+class _DocumentRef:
+    def __init__(self, store: "InMemoryFirestore", collection: str, doc_id: str):
+        self._store = store
+        self._key = (collection, doc_id)
+        self.id = doc_id
+
+    def get(self) -> _Snapshot:
+        return _Snapshot(self.id, self._store._call("reads", lambda docs: docs.get(self._key)))
+
+    def set(self, data: Dict[str, Any]) -> None:
+        self._store._call("writes", lambda docs: docs.__setitem__(self._key, copy.deepcopy(data)))
+
+    def update(self, data: Dict[str, Any]) -> None:
+        def apply(docs):
+            if self._key not in docs:
+                raise KeyError(f"No document to update: {self._key}")
+            docs[self._key].update(copy.deepcopy(data))
+        self._store._call("writes", apply)
+
+    def delete(self) -> None:
+        self._store._call("writes", lambda docs: docs.pop(self._key, None))
+
+
+class _Query:
+    def __init__(self, store: "InMemoryFirestore", collection: str, filters: List[tuple]):
+        self._store = store
+        self._collection = collection
+        self._filters = filters
+
+    def where(self, field: str, op: str, value: Any) -> "_Query":
+        assert op == "==", "only equality filters are supported"
+        return _Query(self._store, self._collection, self._filters + [(field, value)])
+
+    def stream(self):
+        def matching(docs):
+            return [
+                (doc_id, copy.deepcopy(data)) for (collection, doc_id), data in docs.items()
+                if collection == self._collection and all(data.get(f) == v for f, v in self._filters)
+            ]
+        return [_Snapshot(doc_id, data) for doc_id, data in self._store._call("reads", matching)]
+
+
+class _CollectionRef(_Query):
+    def __init__(self, store: "InMemoryFirestore", collection: str):
+        super().__init__(store, collection, [])
+
+    def document(self, doc_id: str) -> _DocumentRef:
+        return _DocumentRef(self._store, self._collection, doc_id)
+
+
+class InMemoryFirestore:
+    """The subset of the Firestore client the endpoints use, with blocking per-call latency"""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self._docs: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"reads": 0, "writes": 0}
+
+    def _call(self, kind: str, fn):
+        if self.latency:
+            time.sleep(self.latency)  # deliberately blocking, like the sync Firestore client
+        with self._lock:
+            self.stats[kind] += 1
+            return fn(self._docs)
+
+    def collection(self, name: str) -> _CollectionRef:
+        return _CollectionRef(self, name)
+
+
+def _seed(db: InMemoryFirestore, projects: int, sections: int) -> List[Dict[str, Any]]:
+    from datetime import datetime
+    seeded = []
+    for p in range(projects):
+        project_id = f"load-{p}"
+        outline = [{
+            "id": f"s{s}",
+            "title": f"Section {s}",
+            "word_count": 120,
+            "content": f"<p>Existing content for section {s}.</p>",
+            "bullets": ["a", "b", "c"],
+            "status": "done"
+        } for s in range(sections)]
+        db.collection("projects").document(project_id).set({
+            "id": project_id,
+            "owner_uid": "test_user_id",
+            "title": f"Load test project {p}",
+            "doc_type": "pptx" if p % 2 else "docx",
+            "outline": outline,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        })
+        seeded.append({"id": project_id, "sections": [s["id"] for s in outline]})
+    return seeded
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    """How late the event loop wakes us up - time it spent blocked on something else"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(p50 * 1000, 1), "p95_ms": round(p95 * 1000, 1), "p99_ms": round(p99 * 1000, 1), "max_ms": round(max(values) * 1000, 1)}
+
+
+async def run_load(
+    requests: int = 200,
+    concurrency: int = 20,
+    projects: int = 5,
+    sections: int = 6,
+    mix: Optional[Dict[str, int]] = None,
+    llm_latency_ms: float = 200,
+    llm_latency_p95_ms: float = 600,
+    tokens_per_second: float = 0,
+    error_rate: float = 0.0,
+    db_latency_ms: float = 5,
+    seed: int = 42
+) -> Dict[str, Any]:
+    """Run one load test against an in-process app and return the report"""
+    from main import app
+    from app.api import endpoints
+    from app.core import llm
+    from app.core.fake_llm import FakeLLMAdapter
+
+    mix = mix or {"generate": 5, "refine": 3, "export": 2}
+    rng = random.Random(seed)
+    db = InMemoryFirestore(latency_ms=db_latency_ms)
+    seeded = _seed(db, projects, sections)
+
+    original_get_db, original_adapter = endpoints.get_db, llm._adapter_instance
+    endpoints.get_db = lambda: db
+    llm._adapter_instance = FakeLLMAdapter(
+        latency_ms=llm_latency_ms, latency_p95_ms=llm_latency_p95_ms,
+        tokens_per_second=tokens_per_second, error_rate=error_rate, seed=seed
+    )
+
+    latencies: Dict[str, List[float]] = {op: [] for op in mix}
+    errors: Dict[str, int] = {op: 0 for op in mix}
+    generated: Dict[tuple, str] = {}
+    loop_lag: List[float] = []
+    operations = [op for op, weight in mix.items() for _ in range(weight)]
+    remaining = requests
+
+    async def one_request(client: httpx.AsyncClient) -> None:
+        op = rng.choice(operations)
+        project = rng.choice(seeded)
+        section_id = rng.choice(project["sections"])
+        started = time.perf_counter()
+        if op == "generate":
+            response = await client.post(f"/projects/{project['id']}/generate", json={"section_id": section_id})
+        elif op == "refine":
+            response = await client.post(
+                f"/projects/{project['id']}/units/{section_id}/refine",
+                json={"prompt": "make it more concise", "user_id": "test_user_id"}
+            )
+        else:
+            response = await client.get(f"/projects/{project['id']}/export", params={"format": rng.choice(["docx", "pptx"])})
+        latencies[op].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors[op] += 1
+        elif op == "generate":
+            generated[(project["id"], section_id)] = response.json()["content"]
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await one_request(client)
+
+    stop = asyncio.Event()
+    monitor = asyncio.ensure_future(_monitor_loop_lag(loop_lag, stop))
+    transport = httpx.ASGITransport(app=app)
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", headers={"Authorization": "Bearer mock_token"}, timeout=120) as client:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        endpoints.get_db, llm._adapter_instance = original_get_db, original_adapter
+
+    # A successful /generate whose section no longer shows as done was overwritten
+    # by a concurrent read-modify-write of the same project's outline
+    lost_updates = 0
+    for (project_id, section_id), content in generated.items():
+        stored = db.collection("projects").document(project_id).get().to_dict()
+        section = next(s for s in stored["outline"] if s["id"] == section_id)
+        if section["status"] != "done":
+            lost_updates += 1
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "errors": sum(errors.values()),
+        "endpoints": {op: dict(_percentiles(values), count=len(values), errors=errors[op]) for op, values in latencies.items()},
+        "overall": _percentiles([v for values in latencies.values() for v in values]),
+        "event_loop_lag": _percentiles(loop_lag),
+        "lost_updates": lost_updates,
+        "db": dict(db.stats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="median fake LLM latency")
+    parser.add_argument("--llm-latency-p95-ms", type=float, default=600)
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="0 = no per-token generation time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="injected LLM error rate")
+    parser.add_argument("--db-latency-ms", type=float, default=5, help="blocking latency per Firestore call")
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 if overall p99 exceeds this")
+    parser.add_argument("--max-loop-lag-ms", type=float, help="exit 1 if p99 event-loop lag exceeds this")
+    parser.add_argument("--max-lost-updates", type=int, help="exit 1 if more /generate results than this were overwritten")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(
+        requests=args.requests, concurrency=args.concurrency, projects=args.projects, sections=args.sections,
+        llm_latency_ms=args.llm_latency_ms, llm_latency_p95_ms=args.llm_latency_p95_ms,
+        tokens_per_second=args.tokens_per_second, error_rate=args.error_rate, db_latency_ms=args.db_latency_ms
+    ))
+
+    print("=" * 72)
+    print(f"{report['requests']} requests, concurrency {report['concurrency']}: "
+          f"{report['throughput_rps']} req/s over {report['elapsed_s']}s, {report['errors']} errors")
+    print("=" * 72)
+    print(f"{'endpoint':<12}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in list(report["endpoints"].items()) + [("overall", dict(report["overall"], count=report["requests"], errors=report["errors"]))]:
+        print(f"{name:<12}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    lag = report["event_loop_lag"]
+    print(f"\nEvent-loop lag: p50 {lag['p50_ms']}ms, p99 {lag['p99_ms']}ms, max {lag['max_ms']}ms")
+    print(f"Lost updates: {report['lost_updates']}   DB calls: {json.dumps(report['db'])}")
+
+    failed = []
+    if args.max_p99_ms is not None and report["overall"]["p99_ms"] > args.max_p99_ms:
+        failed.append(f"p99 {report['overall']['p99_ms']}ms > {args.max_p99_ms}ms")
+    if args.max_loop_lag_ms is not None and lag["p99_ms"] > args.max_loop_lag_ms:
+        failed.append(f"event-loop lag p99 {lag['p99_ms']}ms > {args.max_loop_lag_ms}ms")
+    if args.max_lost_updates is not None and report["lost_updates"] > args.max_lost_updates:
+        failed.append(f"{report['lost_updates']} lost updates > {args.max_lost_updates}")
+    if failed:
+        print("\nFAILED: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
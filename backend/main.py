@@ -1,8 +1,11 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import endpoints
+from app.core.llm import close_llm_adapter
 from dotenv import load_dotenv
 import os
+import sys
 import logging
 
 # Configure logging with signature
@@ -14,7 +17,18 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-app = FastAPI(title="AI Doc Builder API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Drain the shared LLM adapter's keep-alive connection pool on shutdown
+    await close_llm_adapter()
+    # RAG is imported on first use (optional dependencies); close its page fetcher if it was
+    rag = sys.modules.get("app.core.rag")
+    if rag is not None:
+        rag.close_rag_retriever()
+
+
+app = FastAPI(title="AI Doc Builder API", lifespan=lifespan)
 
 logger.info("AI Doc Builder API starting - Created by SAMBIT PRADHAN 22BCB0139")
 
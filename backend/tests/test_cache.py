@@ -0,0 +1,130 @@
+import time
+from langchain_core.outputs import ChatGeneration
+from langchain_core.messages import AIMessage
+from app.core.cache import BoundedSQLiteCache, PageCache, SearchResultCache, SemanticOutlineCache, normalize_search_query
+
+def generations(text):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+def test_lookup_hit_and_miss(tmp_path):
+    cache = BoundedSQLiteCache(database_path=str(tmp_path / "cache.db"))
+    assert cache.lookup("prompt", "llm") is None
+
+    cache.update("prompt", "llm", generations("hello"))
+    assert cache.lookup("prompt", "llm")[0].message.content == "hello"
+    assert cache.lookup("prompt", "other-llm") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 1
+
+def test_lru_eviction_by_entry_count(tmp_path):
+    cache = BoundedSQLiteCache(database_path=str(tmp_path / "cache.db"), max_entries=2)
+    cache.update("a", "llm", generations("a"))
+    time.sleep(0.01)
+    cache.update("b", "llm", generations("b"))
+    time.sleep(0.01)
+    cache.lookup("a", "llm")  # "a" becomes most recently used
+    time.sleep(0.01)
+    cache.update("c", "llm", generations("c"))
+
+    assert cache.lookup("b", "llm") is None
+    assert cache.lookup("a", "llm") is not None
+    assert cache.lookup("c", "llm") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry(tmp_path):
+    cache = BoundedSQLiteCache(database_path=str(tmp_path / "cache.db"), ttl_seconds=0.01)
+    cache.update("prompt", "llm", generations("hello"))
+    time.sleep(0.02)
+    assert cache.lookup("prompt", "llm") is None
+    assert cache.stats()["expired"] == 1
+
+def test_shared_file_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    BoundedSQLiteCache(database_path=path, name="outline").update("prompt", "llm", generations("hello"))
+    assert BoundedSQLiteCache(database_path=path, name="section").lookup("prompt", "llm") is not None
+
+def fake_embed(text):
+    # Bag-of-words over a tiny vocabulary: word order doesn't matter
+    vocab = ["climate", "change", "impacts", "ev", "market"]
+    words = text.lower().split()
+    return [float(words.count(w)) for w in vocab]
+
+def test_semantic_outline_cache_matches_similar_topics():
+    cache = SemanticOutlineCache(fake_embed, threshold=0.9)
+    outline = [{"id": "s1", "title": "Introduction", "word_count": 100}]
+    cache.update("Climate change impacts", "docx", None, outline)
+
+    assert cache.lookup("Impacts of climate change", "docx") == outline
+    assert cache.lookup("EV market", "docx") is None
+    # doc_type and existing sections must match exactly
+    assert cache.lookup("Impacts of climate change", "pptx") is None
+    assert cache.lookup("Impacts of climate change", "docx", ["Introduction"]) is None
+    assert cache.stats()["hits"] == 1
+
+def test_semantic_outline_cache_ttl():
+    cache = SemanticOutlineCache(fake_embed, ttl_seconds=0.01)
+    cache.update("Climate change impacts", "docx", None, [{"id": "s1", "title": "Intro", "word_count": 100}])
+    time.sleep(0.02)
+    assert cache.lookup("Climate change impacts", "docx") is None
+
+def test_page_cache_fresh_stale_and_revalidated(tmp_path):
+    cache = PageCache(database_path=str(tmp_path / "pages.db"), ttl_seconds=0.05)
+    assert cache.lookup("https://a.example/") is None
+    cache.store("https://a.example/", "Hello " * 1000, etag='"v1"')
+    cache.store("https://b.example/", "No validators")
+    assert cache.stats()["bytes"] < len("Hello " * 1000)  # stored compressed
+
+    assert cache.lookup("https://a.example/")["fresh"] is True
+    time.sleep(0.06)
+    stale = cache.lookup("https://a.example/")
+    assert stale["fresh"] is False and stale["etag"] == '"v1"'
+    # Nothing to revalidate with: a stale page without validators is a miss
+    assert cache.lookup("https://b.example/") is None
+
+    cache.revalidated("https://a.example/")
+    assert cache.lookup("https://a.example/")["fresh"] is True
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale"], stats["revalidated"], stats["misses"]) == (2, 1, 1, 2)
+
+def test_page_cache_lru_eviction(tmp_path):
+    cache = PageCache(database_path=str(tmp_path / "pages.db"), max_entries=2)
+    cache.store("https://a.example/", "a")
+    time.sleep(0.01)
+    cache.store("https://b.example/", "b")
+    time.sleep(0.01)
+    cache.lookup("https://a.example/")
+    time.sleep(0.01)
+    cache.store("https://c.example/", "c")
+
+    assert cache.lookup("https://b.example/") is None
+    assert cache.lookup("https://a.example/")["text"] == "a"
+    assert cache.stats()["evictions"] == 1
+
+def test_search_cache_normalizes_queries_and_counts_quota(tmp_path):
+    assert normalize_search_query("  Renewable  ENERGY Policy c++ ") == "renewable energy policy c++"
+    # Search operators are part of the key
+    assert normalize_search_query('"Solar Panels" -Roof site:Example.com') == '"solar panels" -roof site:example.com'
+    assert normalize_search_query("solar OR wind") != normalize_search_query("solar or wind")
+    assert normalize_search_query('"solar panels"') != normalize_search_query("solar panels")
+
+    cache = SearchResultCache(database_path=str(tmp_path / "search.db"), ttl_seconds=0.05, daily_quota=2)
+    results = [{"link": "https://a.example/", "title": "A"}]
+    assert cache.lookup("Renewable energy", 5) is None
+    cache.record_api_call()
+    cache.update("Renewable energy", 5, results)
+
+    assert cache.lookup("renewable   ENERGY", 5) == results
+    assert cache.lookup("renewable energy", 3) is None  # different result count
+    time.sleep(0.06)
+    assert cache.lookup("renewable energy", 5) is None
+    assert cache.lookup("renewable energy", 5, allow_stale=True) == results
+
+    assert not cache.quota_exhausted()
+    cache.record_api_call()
+    assert cache.quota_exhausted()
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_served"], stats["expired"]) == (1, 1, 1)
+    assert (stats["api_calls_today"], stats["quota_remaining"]) == (2, 0)
@@ -0,0 +1,57 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [0.0, 0.0, float(len(text))]
+
+def test_only_new_chunks_are_embedded(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), "test-model"))
+
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    assert model.embedded == ["alpha", "beta"]
+    assert first[0] == first[2] == [5.0, 1.0, 0.5]
+
+    assert embeddings.embed_documents(["beta", "gamma"]) == [first[1], [5.0, 1.0, 0.5]]
+    assert model.embedded == ["alpha", "beta", "gamma"]
+    # Queries have their own key space
+    assert embeddings.embed_query("alpha") == [0.0, 0.0, 5.0]
+    assert model.embedded[-1] == "alpha"
+
+    stats = embeddings.cache.stats()
+    assert (stats["rows"], stats["dtype"]) == (4, "float16")
+    assert stats["bytes"] == 4 * 3 * 2
+
+def test_cache_is_shared_through_the_files(tmp_path):
+    writer = EmbeddingCache(str(tmp_path), "test-model", dtype="float32")
+    reader = EmbeddingCache(str(tmp_path), "test-model", dtype="float32")
+    assert reader.lookup([reader.key("alpha")]) == {}
+
+    writer.store([writer.key("alpha"), writer.key("beta")], [[1.0, 2.0], [3.0, 4.0]])
+    found = reader.lookup([reader.key("beta"), reader.key("gamma")])
+    assert list(found) == [reader.key("beta")]
+    assert isinstance(found[reader.key("beta")], np.memmap)
+    assert found[reader.key("beta")].tolist() == [3.0, 4.0]
+    # Another model never sees these vectors
+    assert EmbeddingCache(str(tmp_path), "other-model", dtype="float32").lookup([writer.key("alpha")]) == {}
+
+def test_cache_starts_over_when_full(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", dtype="float32", max_bytes=3 * 2 * 4)
+    cache.store([cache.key(f"t{i}") for i in range(3)], [[float(i), 0.0] for i in range(3)])
+    cache.store([cache.key("t3")], [[3.0, 0.0]])
+
+    stats = cache.stats()
+    assert (stats["rows"], stats["resets"]) == (1, 1)
+    assert cache.lookup([cache.key("t3")])[cache.key("t3")].tolist() == [3.0, 0.0]
+    assert cache.lookup([cache.key("t0")]) == {}
+    assert len(list(tmp_path.glob("*.vec"))) == 1
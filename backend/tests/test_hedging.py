@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from app.core.llm import MockLLMAdapter
+from app.core.hedging import HedgedLLMAdapter
+from app.core.scheduler import LLMScheduler
+
+class LatencyAdapter(MockLLMAdapter):
+    """Local stand-in that answers after `delay` seconds, or fails"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+        self.rag_fetches = 0
+        self.rag = None
+
+    async def aretrieve_rag_context(self, title, topic, doc_type="docx"):
+        self.rag_fetches += 1
+        return "context", {"sources": [self.name]}
+
+    async def agenerate_section(self, title, topic, word_count, outline_context=None, doc_type="docx", section_position=0, use_rag=False, rag=None):
+        self.calls += 1
+        self.rag = rag
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise ValueError(f"{self.name} unavailable")
+        return {"text": self.name, "bullets": [], "model_meta": {"model": self.name}}
+
+    async def astream_section(self, title, topic, word_count, outline_context=None, doc_type="docx", section_position=0, use_rag=False, rag=None):
+        if self.fail:
+            raise ValueError(f"{self.name} unavailable")
+        yield {"type": "result", "data": {"text": self.name}}
+
+def test_fast_primary_is_not_hedged():
+    primary, backup = LatencyAdapter("primary", 0.01), LatencyAdapter("backup")
+    adapter = HedgedLLMAdapter(primary, [backup], default_delay=0.2)
+    result = asyncio.run(adapter.agenerate_section("Intro", "EV", 100))
+    assert result["text"] == "primary"
+    assert backup.calls == 0
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    primary, backup = LatencyAdapter("primary", 1.0), LatencyAdapter("backup", 0.01)
+    adapter = HedgedLLMAdapter(primary, [backup], default_delay=0.05)
+
+    async def run():
+        result = await adapter.agenerate_section("Intro", "EV", 100)
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(run())
+    assert result["text"] == "backup"
+    assert result["model_meta"]["hedge"] == {"winner": 1, "attempts": 2}
+    assert primary.cancelled == 1
+    assert adapter.stats()["section"]["hedged"] == 1
+    assert adapter.stats()["section"]["backup_wins"] == 1
+
+class QueuedAdapter(LatencyAdapter):
+    """Waits for a slot on `scheduler` like GroqLLMAdapter, then answers after `delay`"""
+    schedules_calls = True
+
+    def __init__(self, name, scheduler, delay=0.0):
+        super().__init__(name, delay)
+        self.scheduler = scheduler
+
+    async def agenerate_section(self, *args, **kwargs):
+        async with self.scheduler.slot(10):
+            return await super().agenerate_section(*args, **kwargs)
+
+def test_quota_wait_is_not_hedged_or_sampled():
+    scheduler = LLMScheduler(requests_per_minute=300, tokens_per_minute=0)
+    scheduler.requests.level = 0  # next slot in 0.2s
+    primary, backup = QueuedAdapter("primary", scheduler, 0.01), LatencyAdapter("backup")
+    adapter = HedgedLLMAdapter(primary, [backup], default_delay=0.05)
+
+    assert asyncio.run(adapter.agenerate_section("Intro", "EV", 100))["text"] == "primary"
+    assert backup.calls == 0
+    assert adapter._latencies["section"][0] < 0.1
+
+def test_rag_context_is_fetched_once_and_shared():
+    primary, backup = LatencyAdapter("primary", fail=True), LatencyAdapter("backup")
+    adapter = HedgedLLMAdapter(primary, [backup], default_delay=10)
+    asyncio.run(adapter.agenerate_section("Intro", "EV", 100, use_rag=True))
+    assert (primary.rag_fetches, backup.rag_fetches) == (1, 0)
+    assert backup.rag == primary.rag == ("context", {"sources": ["primary"]})
+
+def test_error_fails_over_immediately():
+    primary, backup = LatencyAdapter("primary", fail=True), LatencyAdapter("backup")
+    adapter = HedgedLLMAdapter(primary, [backup], default_delay=10)
+    assert asyncio.run(adapter.agenerate_section("Intro", "EV", 100))["text"] == "backup"
+    assert adapter.stats()["section"]["failovers"] == 1
+
+    both_down = HedgedLLMAdapter(LatencyAdapter("a", fail=True), [LatencyAdapter("b", fail=True)])
+    with pytest.raises(ValueError, match="b unavailable"):
+        asyncio.run(both_down.agenerate_section("Intro", "EV", 100))
+
+def test_hedge_delay_tracks_p95():
+    adapter = HedgedLLMAdapter(LatencyAdapter("primary"), [LatencyAdapter("backup")], default_delay=10, min_delay=0.5, min_samples=10)
+    assert adapter.hedge_delay("section") == 10
+    adapter._latencies["section"] = [1.0] * 19 + [5.0]
+    assert adapter.hedge_delay("section") == pytest.approx(1.2)
+
+def test_stream_fails_over_before_first_event():
+    adapter = HedgedLLMAdapter(LatencyAdapter("primary", fail=True), [LatencyAdapter("backup")])
+
+    async def collect():
+        return [event async for event in adapter.astream_section("Intro", "EV", 100)]
+
+    assert asyncio.run(collect())[-1]["data"]["text"] == "backup"
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from app.core.llm import GroqLLMAdapter, MockLLMAdapter, get_llm_adapter, close_llm_adapter, get_compiled_prompt
+from app.core.streaming import IncrementalMarkdownRenderer
+from app.core.prompt_budget import count_tokens, fit_blocks
+from app.core import cache as cache_module
+from app.core import scheduler as scheduler_module
+from app.core.routing import ModelRouter
+from app.core.patching import apply_edits, split_blocks
+from app.core.selection import block_ranges, resolve_selection, splice
+
+@pytest.fixture
+def groq_adapter(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "dummy")
+    # Don't load the sentence-transformers model in unit tests
+    monkeypatch.setenv("OUTLINE_SEMANTIC_CACHE", "false")
+    # Fresh, unlimited per-model schedulers: quota pacing is covered in test_scheduler.py
+    monkeypatch.setenv("LLM_RATE_LIMITS", "")
+    monkeypatch.setenv("LLM_RATE_LIMIT_RPM", "0")
+    monkeypatch.setenv("LLM_RATE_LIMIT_TPM", "0")
+    monkeypatch.setattr(scheduler_module, "_schedulers", {})
+    return GroqLLMAdapter()
+
+def fake_llm(*responses):
+    # cache=False keeps the fake responses out of the shared LLM cache
+    return FakeListChatModel(responses=[json.dumps(r) for r in responses], cache=False)
+
+def test_mock_async_matches_sync():
+    adapter = MockLLMAdapter()
+    assert asyncio.run(adapter.agenerate_outline("EV Market")) == adapter.generate_outline("EV Market")
+    assert asyncio.run(adapter.agenerate_section("Intro", "EV", 100)) == adapter.generate_section("Intro", "EV", 100)
+    refined = asyncio.run(adapter.arefine_section("Some text", [], "shorter"))
+    assert refined["diff_summary"] == "Applied changes based on: shorter"
+
+def test_groq_agenerate_section(groq_adapter):
+    groq_adapter.llm = fake_llm({
+        "title": "Intro",
+        "text": "Hello **world**",
+        "bullets": ["a", "b", "c"],
+        "word_count": 2
+    })
+    result = asyncio.run(groq_adapter.agenerate_section("Intro", "EV", 100))
+    assert result["text"] == "<p>Hello <strong>world</strong></p>\n"
+    assert result["bullets"] == ["a", "b", "c"]
+
+def test_groq_arefine_section_wraps_errors(groq_adapter):
+    groq_adapter.llm = FakeListChatModel(responses=["not json"], cache=False)
+    with pytest.raises(ValueError, match="Failed to refine section"):
+        asyncio.run(groq_adapter.arefine_section("<p>Text</p>", [], "shorter"))
+
+def test_groq_astream_section(groq_adapter):
+    groq_adapter.llm = fake_llm({
+        "title": "Intro",
+        "text": "First paragraph.\n\nSecond paragraph.",
+        "bullets": ["a"],
+        "word_count": 4
+    })
+
+    async def collect():
+        return [event async for event in groq_adapter.astream_section("Intro", "EV", 100)]
+
+    events = asyncio.run(collect())
+    deltas = "".join(e["delta"] for e in events if e["type"] == "token")
+    assert deltas == "First paragraph.\n\nSecond paragraph."
+    assert events[-1]["type"] == "result"
+    assert events[-1]["data"]["text"] == "<p>First paragraph.</p>\n\n<p>Second paragraph.</p>\n"
+
+def test_incremental_markdown_renderer():
+    renderer = IncrementalMarkdownRenderer()
+    assert renderer.render("Hello **wor") == "<p>Hello **wor</p>\n"
+    assert renderer.render("Hello **world**\n\n- a") == "<p>Hello <strong>world</strong></p>\n<ul>\n<li>a</li>\n</ul>\n"
+
+    renderer = IncrementalMarkdownRenderer()
+    assert renderer.update("Hello **wor") == {"closed_html": "", "tail_html": "<p>Hello **wor</p>\n"}
+    assert renderer.update("Hello **world**\n\n- a") == {"closed_html": "<p>Hello <strong>world</strong></p>\n", "tail_html": "<ul>\n<li>a</li>\n</ul>\n"}
+    # Closed blocks are sent once
+    assert renderer.update("Hello **world**\n\n- a\n- b")["closed_html"] == ""
+
+def test_get_llm_adapter_is_shared(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "dummy")
+    monkeypatch.setenv("LLM_PROVIDER", "groq")
+    asyncio.run(close_llm_adapter())
+
+    adapter = get_llm_adapter()
+    assert get_llm_adapter() is adapter
+    assert adapter.llm.http_async_client is adapter.http_async_client
+
+    asyncio.run(close_llm_adapter())
+    assert adapter.http_async_client.is_closed
+    assert get_llm_adapter() is not adapter
+    asyncio.run(close_llm_adapter())
+
+def test_compiled_prompt_is_reused():
+    prompt_template, parser = get_compiled_prompt("section", "pptx")
+    assert get_compiled_prompt("section", "pptx")[0] is prompt_template
+    assert get_compiled_prompt("section", "docx")[0] is not prompt_template
+    # Format instructions and doc-type guidance are pre-bound
+    assert "format_instructions" not in prompt_template.input_variables
+    assert "style_guidance" not in prompt_template.input_variables
+
+def test_groq_outline_uses_response_cache(groq_adapter, monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache_module, "_response_caches", {})
+    outline = {"outline": [{"id": "s1", "title": "Intro", "word_count": 100}]}
+    groq_adapter.llm = FakeListChatModel(responses=[json.dumps(outline), "not json"])
+
+    first = asyncio.run(groq_adapter.agenerate_outline("EV Market"))
+    second = asyncio.run(groq_adapter.agenerate_outline("EV Market"))
+    assert first == second == [{"id": "s1", "title": "Intro", "word_count": 100}]
+    assert cache_module.get_response_cache_stats()["outline"]["hits"] == 1
+
+def test_fit_blocks_shrinks_in_priority_order():
+    blocks = [
+        ("outline", ["o" * 400, "o" * 40, ""]),
+        ("history", ["h" * 400, "h" * 40, ""]),
+    ]
+    # Everything fits: nothing shrunk
+    texts, total, shrunk = fit_blocks(0, blocks, 1000)
+    assert shrunk == [] and texts["outline"] == "o" * 400
+
+    # Outline is reduced all the way before history is touched
+    texts, total, shrunk = fit_blocks(0, blocks, count_tokens("h" * 400) + 5)
+    assert texts["outline"] == "" and texts["history"] == "h" * 400
+    assert shrunk == ["outline"]
+
+def test_groq_refine_prompt_fits_token_limit(groq_adapter, monkeypatch):
+    history = [{"prompt": f"request {i}", "diff_summary": "changed things " * 20} for i in range(7)]
+    kwargs = dict(
+        current_text="<p>Short section.</p>", history=history, instructions="fix tone",
+        current_bullets=None, doc_title="Doc", outline_context=[f"Section title number {i}" for i in range(40)],
+        doc_type="docx", section_title="Section title number 9", section_position=10, total_sections=40,
+        target_word_count=None, previous_section_context="Title: 'Prev'\nKey points: a, b, c", next_section_context="Title: 'Next'"
+    )
+    chain, inputs, _ = groq_adapter._refine_chain(**kwargs)
+    full_tokens = count_tokens(chain.first.format(**inputs))
+    assert "40. Section title number 39" in inputs["outline_str"]
+
+    monkeypatch.setenv("REFINE_PROMPT_TOKEN_LIMIT", str(full_tokens - 200))
+    chain, inputs, _ = groq_adapter._refine_chain(**kwargs)
+    assert count_tokens(chain.first.format(**inputs)) <= full_tokens - 200
+    assert "10. Section title number 9 ← YOU ARE HERE" in inputs["outline_str"]
+    assert "40. Section title number 39" not in inputs["outline_str"]
+
+def test_groq_section_repairs_malformed_json(groq_adapter):
+    # Unescaped quotes in inline HTML plus a trailing comma
+    raw = '```json\n{"title": "Intro", "text": "Hi <b class="x">there</b>", "bullets": ["a",], "word_count": 2}\n```'
+    groq_adapter.llm = FakeListChatModel(responses=[raw], cache=False)
+    result = asyncio.run(groq_adapter.agenerate_section("Intro", "EV", 100))
+    assert result["bullets"] == ["a"]
+    assert 'class="x"' in result["text"]
+
+def test_model_router_rules():
+    router = ModelRouter(large_model="big", fast_model="small")
+    assert router.route("outline", "docx") == {"model": "small", "route": "outline"}
+    assert router.route("section", "pptx", 100)["model"] == "small"
+    assert router.route("section", "docx", 300) == {"model": "big", "route": "default"}
+    assert router.route("refine", "pptx", 80, "make it punchier")["model"] == "small"
+    assert router.route("refine", "pptx", 80, "restructure this slide into a side by side comparison of the three main market segments with supporting figures for each")["model"] == "big"
+    assert ModelRouter("big", "small", enabled=False).route("outline", "docx")["model"] == "big"
+
+def test_groq_section_records_route_in_model_meta(groq_adapter):
+    groq_adapter.router = ModelRouter(large_model="big", fast_model="small")
+    groq_adapter.llm = fake_llm({"title": "Slide", "text": "Hi", "bullets": [], "word_count": 1})
+    result = asyncio.run(groq_adapter.agenerate_section("Slide", "EV", 80, doc_type="pptx"))
+    assert result["model_meta"]["model"] == "small"
+    assert result["model_meta"]["route"] == "short-slide"
+    assert result["model_meta"]["latency_ms"] >= 0
+
+def test_apply_edits_uses_original_indices():
+    blocks = split_blocks("# Title\n\nFirst.\n\n\nSecond.\n\n- a\n- b")
+    assert blocks == ["# Title", "First.", "Second.", "- a\n- b"]
+    edits = [
+        {"op": "replace", "index": 1, "text": "[1] First, reworded."},
+        {"op": "delete", "index": 2},
+        {"op": "insert", "index": 2, "text": "Inserted."},
+        {"op": "insert", "index": 99, "text": "Appended."},
+        {"op": "replace", "index": 7, "text": "ignored"}
+    ]
+    assert apply_edits(blocks, edits) == ["# Title", "First, reworded.", "Inserted.", "- a\n- b", "Appended."]
+
+def test_groq_refine_patch_mode(groq_adapter, monkeypatch):
+    monkeypatch.setenv("REFINE_PATCH_MIN_WORDS", "20")
+    paragraphs = [f"<p>Paragraph {i} " + "word " * 10 + "</p>" for i in range(4)]
+    groq_adapter.llm = fake_llm({
+        "edits": [{"op": "replace", "index": 1, "text": "A *friendlier* second paragraph."}],
+        "bullets": ["a"],
+        "diff_summary": "Softened paragraph 2"
+    })
+    result = asyncio.run(groq_adapter.arefine_section("".join(paragraphs), [], "fix the second paragraph's tone"))
+    assert result["model_meta"]["refine_mode"] == "patch"
+    assert "<p>A <em>friendlier</em> second paragraph.</p>" in result["text"]
+    assert "Paragraph 0" in result["text"] and "Paragraph 3" in result["text"] and "Paragraph 1" not in result["text"]
+
+    # Whole-section instructions still get a full rewrite
+    chain, inputs, route = groq_adapter._refine_chain("".join(paragraphs), [], "make it shorter", None, None, None, "docx", None, 0, 0, None, None, None)
+    assert "refine_mode" not in route and "[0]" not in inputs["current_text"]
+
+def test_selection_resolve_and_splice():
+    html = "<h2>Title</h2>\n<p>First <b>bold</b> one. Second one.</p>\n<ul>\n<li>A</li>\n<li>B</li>\n</ul>\n"
+    assert [html[a:b] for a, b in block_ranges(html)] == ["Title", "First <b>bold</b> one. Second one.", "A", "B"]
+    start = html.index("Second")
+    assert resolve_selection(html, start=start, end=start + 11) == (start, start + 11)
+    with pytest.raises(ValueError):
+        resolve_selection(html, start=html.index("bold"), end=start)  # cuts through </b>
+    assert splice(html, start, start + 11, "<p>Third <em>one</em>.</p>\n").count("<p>") == 1
+    assert "Third <em>one</em>." in splice(html, start, start + 11, "<p>Third <em>one</em>.</p>\n")
+
+def test_groq_arefine_selection_sends_only_the_span(groq_adapter):
+    groq_adapter.llm = fake_llm({"text": "- Shorter bullet", "diff_summary": "Tightened"})
+    chain, inputs, _ = groq_adapter._selection_chain("A <b>long</b> bullet", "tighten", "before", "after", "Doc", "Intro", "docx")
+    assert inputs["selected_text"] == "A **long** bullet"
+    assert "outline_str" not in inputs
+    result = asyncio.run(groq_adapter.arefine_selection("A <b>long</b> bullet", "tighten", "before", "after"))
+    assert result["text"] == "<p>Shorter bullet</p>\n"
+    assert result["diff_summary"] == "Tightened"
+
+def test_history_summary_replaces_dropped_entries(groq_adapter):
+    versions = groq_adapter._history_versions([{"prompt": "recent"}], "Prefers short sentences")
+    assert all(v.startswith("EDITOR PREFERENCES") for v in versions)
+    assert "recent" in versions[0] and "recent" not in versions[-1]
+
+    groq_adapter.llm = fake_llm({"summary": "Likes a formal tone"})
+    entries = [{"prompt": "more formal", "likes": ["u"]}]
+    assert asyncio.run(groq_adapter.asummarize_history(None, entries)) == "Likes a formal tone"
+    groq_adapter.llm = FakeListChatModel(responses=["not json"], cache=False)
+    assert asyncio.run(groq_adapter.asummarize_history("Old", entries)) == 'Old\nLiked: "more formal"'
+
+def test_prompt_build_benchmark_covers_every_spec():
+    # bench_prompt_build.py iterates all specs; some (history_summary) have no doc-type guidance
+    from app.core.llm import _PROMPT_SPECS
+    import bench_prompt_build
+    for operation in _PROMPT_SPECS:
+        for doc_type in ("docx", "pptx"):
+            assert bench_prompt_build.time_per_call(bench_prompt_build.build_uncached, operation, doc_type, 1) > 0
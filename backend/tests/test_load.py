@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+from app.core.fake_llm import FakeLLMAdapter
+from loadtest import InMemoryFirestore, run_load
+
+def test_fake_latency_distribution():
+    adapter = FakeLLMAdapter(latency_ms=100, latency_p95_ms=400, seed=1)
+    samples = sorted(adapter.sample_latency() for _ in range(2000))
+    assert 0.08 < samples[1000] < 0.12
+    assert 0.3 < samples[1900] < 0.5
+
+def test_fake_injected_errors():
+    adapter = FakeLLMAdapter(latency_ms=0, error_rate=1.0, seed=1)
+    with pytest.raises(ValueError, match="simulated provider error"):
+        asyncio.run(adapter.agenerate_section("Intro", "Topic", 50))
+
+def test_fake_section_meta_and_length():
+    adapter = FakeLLMAdapter(latency_ms=0, tokens_per_second=0, seed=1)
+    result = asyncio.run(adapter.agenerate_section("Intro", "Topic", 80))
+    assert result["word_count"] >= 80
+    assert result["model_meta"]["provider"] == "fake"
+
+def test_in_memory_firestore():
+    db = InMemoryFirestore()
+    ref = db.collection("projects").document("p1")
+    ref.set({"owner_uid": "u", "title": "a"})
+    ref.update({"title": "b"})
+    assert ref.get().to_dict() == {"owner_uid": "u", "title": "b"}
+    assert [d.id for d in db.collection("projects").where("owner_uid", "==", "u").stream()] == ["p1"]
+    ref.delete()
+    assert not ref.get().exists
+
+def test_run_load_small():
+    report = asyncio.run(run_load(requests=20, concurrency=4, projects=2, sections=3, llm_latency_ms=5, llm_latency_p95_ms=10, db_latency_ms=0))
+    assert report["requests"] == 20
+    assert report["errors"] == 0
+    assert set(report["endpoints"]) == {"generate", "refine", "export"}
+    assert report["overall"]["p99_ms"] >= report["overall"]["p50_ms"]
@@ -2,6 +2,7 @@ from fastapi.testclient import TestClient
 from main import app
 from unittest.mock import patch, MagicMock
 import pytest
+import asyncio
 
 client = TestClient(app)
 
@@ -29,6 +30,12 @@ def test_create_project_unauthorized():
     response = client.post("/projects", json={"title": "Test", "doc_type": "docx"})
     assert response.status_code == 403 # HTTPBearer returns 403 if no header or 401 if invalid
 
+def test_metrics_requires_auth():
+    assert client.get("/metrics").status_code in (401, 403)
+    response = client.get("/metrics", headers={"Authorization": "Bearer mock_token"})
+    assert response.status_code == 200
+    assert "llm_scheduler" in response.json()
+
 def test_create_project_authorized(mock_firestore):
     # We can use the "mock_token" backdoor we added in auth.py for simple testing
     # or mock the verify_id_token call.
@@ -125,3 +132,234 @@ def test_generate_content(mock_firestore):
     
     # Verify DB update called (twice: once for generating, once for done)
     assert mock_doc_ref.update.call_count >= 2
+
+def test_generate_all(mock_firestore):
+    headers = {"Authorization": "Bearer mock_token"}
+
+    mock_db = mock_firestore
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [
+            {"id": "s1", "title": "Intro", "word_count": 100, "status": "queued"},
+            {"id": "s2", "title": "Body", "word_count": 200, "status": "done", "content": "Existing"},
+            {"id": "s3", "title": "Conclusion", "word_count": 100, "status": "queued"}
+        ]
+    }
+
+    mock_db.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    response = client.post("/projects/p1/generate-all", json={"max_concurrency": 2}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [s["id"] for s in data["sections"]] == ["s1", "s3"]
+    assert all(r["status"] == "done" for r in data["results"])
+
+    # All results are persisted in a single write
+    mock_doc_ref.update.assert_called_once()
+    saved = mock_doc_ref.update.call_args[0][0]
+    assert saved["outline"][1]["content"] == "Existing"
+    assert len(saved["generation_history"]) == 2
+
+def test_generate_content_stream(mock_firestore):
+    headers = {"Authorization": "Bearer mock_token"}
+
+    mock_db = mock_firestore
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [{"id": "s1", "title": "Intro", "word_count": 100, "status": "queued"}]
+    }
+
+    mock_db.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    response = client.post("/projects/p1/generate/stream", json={"section_id": "s1"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [frame.split("\n")[0] for frame in response.text.strip().split("\n\n")]
+    assert events[0] == "event: token"
+    assert events[-1] == "event: done"
+    assert "generated content" in response.text.strip().split("\n\n")[-1]
+    assert mock_doc_ref.update.call_count == 2
+
+def test_generate_content_stream_disconnect_requeues_section(mock_firestore):
+    from app.api.endpoints import generate_content_stream
+    from app.models import GenerateContentRequest
+
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [{"id": "s1", "title": "Intro", "word_count": 100, "status": "queued"}]
+    }
+    mock_firestore.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    async def read_one_event():
+        response = await generate_content_stream("p1", GenerateContentRequest(section_id="s1"), current_user={"uid": "test_user_id"})
+        first = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()  # what Starlette does when the client goes away
+        return first
+
+    first = asyncio.run(read_one_event())
+    assert first.startswith("event: token")
+    # Token events carry the new markdown and its HTML block by block, never the whole section
+    assert '"tail_html"' in first and '"html"' not in first
+    assert mock_doc_ref.update.call_args[0][0]["outline"][0]["status"] == "queued"
+
+def test_refine_unit_stream(mock_firestore):
+    headers = {"Authorization": "Bearer mock_token"}
+
+    mock_db = mock_firestore
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [{"id": "s1", "title": "Intro", "word_count": 100, "status": "done", "content": "Original content"}]
+    }
+
+    mock_db.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    response = client.post("/projects/p1/units/s1/refine/stream", json={"prompt": "Make it better", "user_id": "test_user_id"}, headers=headers)
+    assert response.status_code == 200
+
+    frames = response.text.strip().split("\n\n")
+    events = [frame.split("\n")[0] for frame in frames]
+    assert events[0] == "event: token"
+    assert events[-2:] == ["event: summary", "event: done"]
+    assert "Applied changes based on: Make it better" in frames[-2]
+
+    saved = mock_doc_ref.update.call_args[0][0]
+    assert saved["outline"][0]["version"] == 2
+    assert saved["outline"][0]["refinement_history"][0]["prompt"] == "Make it better"
+
+def test_refine_unit_stream_disconnect_saves_nothing(mock_firestore):
+    from app.api.endpoints import refine_unit_stream
+    from app.models import RefineRequest
+
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [{"id": "s1", "title": "Intro", "word_count": 100, "status": "done", "content": "Original content"}]
+    }
+    mock_firestore.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    async def read_one_event():
+        request = RefineRequest(prompt="Make it better", user_id="test_user_id")
+        response = await refine_unit_stream("p1", "s1", request, current_user={"uid": "test_user_id"})
+        first = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        return first
+
+    first = asyncio.run(read_one_event())
+    assert first.startswith("event: token")
+    assert '"tail_html"' in first and '"html"' not in first
+    mock_doc_ref.update.assert_not_called()
+
+def test_refine_unit_selection(mock_firestore):
+    headers = {"Authorization": "Bearer mock_token"}
+
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [{"id": "s1", "title": "Intro", "word_count": 100, "status": "done", "content": "<p>Keep this.</p>\n<ul>\n<li>One</li>\n<li>Two</li>\n</ul>\n"}]
+    }
+    mock_firestore.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    payload = {"prompt": "punchier", "user_id": "test_user_id", "selection": {"block_index": 2}}
+    response = client.post("/projects/p1/units/s1/refine", json=payload, headers=headers)
+    assert response.status_code == 200
+    content = response.json()["content"]
+    assert content.startswith("<p>Keep this.</p>\n<ul>\n<li>One</li>\n<li>Refined version of: Two")
+    assert content.endswith("</li>\n</ul>\n")
+    assert response.json()["refinement_history"][0]["selection"] == {"start": 40, "end": 43}
+
+    payload["selection"] = {"block_index": 9}
+    assert client.post("/projects/p1/units/s1/refine", json=payload, headers=headers).status_code == 400
+
+def test_refine_unit_compacts_history(mock_firestore, monkeypatch):
+    monkeypatch.setenv("REFINE_HISTORY_MAX_ENTRIES", "3")
+    monkeypatch.setenv("REFINE_HISTORY_KEEP_ENTRIES", "1")
+    headers = {"Authorization": "Bearer mock_token"}
+    history = [
+        {"id": f"r{i}", "user_id": "test_user_id", "prompt": f"request {i}", "created_at": "2024-01-01T00:00:00",
+         "likes": ["test_user_id"] if i == 0 else [], "dislikes": []}
+        for i in range(4)
+    ]
+
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [{"id": "s1", "title": "Intro", "word_count": 100, "status": "done", "content": "<p>Text</p>", "refinement_history": history}]
+    }
+    mock_firestore.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    response = client.post("/projects/p1/units/s1/refine", json={"prompt": "request 4", "user_id": "test_user_id"}, headers=headers)
+    assert response.status_code == 200
+    section = response.json()
+    assert [h["prompt"] for h in section["refinement_history"]] == ["request 3", "request 4"]
+    assert section["history_summarized"] == 3
+    assert 'Liked: "request 0"' in section["history_summary"]
+    assert '"request 2"' in section["history_summary"]
+
+def test_refine_batch(mock_firestore):
+    headers = {"Authorization": "Bearer mock_token"}
+
+    mock_doc_ref = MagicMock()
+    mock_doc = MagicMock()
+    mock_doc.exists = True
+    mock_doc.to_dict.return_value = {
+        "owner_uid": "test_user_id",
+        "title": "My Doc",
+        "outline": [
+            {"id": "s1", "title": "Intro", "word_count": 100, "status": "done", "content": "<p>Intro text</p>"},
+            {"id": "s2", "title": "Body", "word_count": 100, "status": "queued"},
+            {"id": "s3", "title": "End", "word_count": 100, "status": "done", "content": "<p>End text</p>"}
+        ]
+    }
+    mock_firestore.collection.return_value.document.return_value = mock_doc_ref
+    mock_doc_ref.get.return_value = mock_doc
+
+    payload = {"prompt": "More formal", "user_id": "test_user_id", "max_concurrency": 2}
+    response = client.post("/projects/p1/refine-batch", json=payload, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["section_id"] for r in data["results"]] == ["s1", "s3"]
+    assert all(r["status"] == "done" and r["refinement_id"] for r in data["results"])
+
+    # One write for the whole batch, with a Refinement on each refined section
+    assert mock_doc_ref.update.call_count == 1
+    saved = mock_doc_ref.update.call_args[0][0]["outline"]
+    assert [len(s["refinement_history"]) for s in saved] == [1, 0, 1]
+    assert saved[0]["refinement_history"][0]["prompt"] == "More formal"
+
+    payload["section_ids"] = ["s2"]
+    data = client.post("/projects/p1/refine-batch", json=payload, headers=headers).json()
+    assert data["results"][0]["status"] == "failed"
+    assert mock_doc_ref.update.call_count == 1
@@ -0,0 +1,142 @@
+import time
+import threading
+import httpx
+import pytest
+
+# app.core.rag imports the Google Search wrapper at module level
+pytest.importorskip("langchain_google_community")
+from app.core.cache import PageCache, SearchResultCache
+from app.core import rag
+from app.core.rag import PageFetcher, WebSearchRetriever, extract_text
+
+def slow_transport(delays, active=None):
+    """Mock transport answering each path after its delay, tracking concurrent requests per host"""
+    lock = threading.Lock()
+
+    def handler(request):
+        host = request.url.host
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            active["max:" + host] = max(active.get("max:" + host, 0), active[host])
+        try:
+            time.sleep(delays.get(request.url.path, 0))
+        finally:
+            with lock:
+                active[host] -= 1
+        return httpx.Response(200, html=f"<html><body><script>x()</script><p>Page {request.url.path}</p></body></html>")
+
+    return httpx.MockTransport(handler)
+
+def test_fetch_all_is_concurrent():
+    urls = [f"https://site{i}.example/p{i}" for i in range(5)]
+    fetcher = PageFetcher(transport=slow_transport({f"/p{i}": 0.3 for i in range(5)}, {}))
+    started = time.perf_counter()
+    pages = fetcher.fetch_all(urls)
+    assert time.perf_counter() - started < 1.0
+    assert pages[urls[2]]["text"] == "Page /p2"
+
+def test_fetch_all_returns_partial_results_at_deadline():
+    urls = ["https://a.example/fast", "https://b.example/slow"]
+    fetcher = PageFetcher(deadline=0.3, transport=slow_transport({"/slow": 1.0}, {}))
+    started = time.perf_counter()
+    pages = fetcher.fetch_all(urls)
+    assert time.perf_counter() - started < 0.8
+    assert pages["https://a.example/fast"]["text"] == "Page /fast"
+    assert pages["https://b.example/slow"]["status"] == "deadline"
+
+def test_fetch_limits_connections_per_host():
+    active = {}
+    fetcher = PageFetcher(per_host=2, transport=slow_transport({f"/p{i}": 0.1 for i in range(6)}, active))
+    pages = fetcher.fetch_all([f"https://same.example/p{i}" for i in range(6)])
+    assert all(page["text"] for page in pages.values())
+    assert active["max:same.example"] == 2
+
+def test_fetch_page_skips_binaries_and_caps_bytes():
+    big_page = b"<html><body>" + b"".join(b"<p>line %d</p>" % i for i in range(100000)) + b"</body></html>"
+
+    def handler(request):
+        if request.url.path == "/doc.pdf":
+            return httpx.Response(200, headers={"content-type": "application/pdf"}, content=b"%PDF" * 100000)
+        chunks = (big_page[i:i + 8192] for i in range(0, len(big_page), 8192))
+        return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, content=chunks)
+
+    fetcher = PageFetcher(max_bytes=64 * 1024, max_chars=100000, transport=httpx.MockTransport(handler))
+    pdf = fetcher.fetch_page("https://a.example/doc.pdf")
+    assert pdf["status"] == "skipped" and pdf["text"] == "" and pdf["bytes"] == 0
+
+    page = fetcher.fetch_page("https://a.example/big")
+    assert page["status"] == "truncated"
+    assert page["bytes"] < len(big_page)
+    assert page["text"].startswith("line 0\nline 1")
+
+def test_fetch_page_serves_cached_pages_and_revalidates(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(dict(request.headers))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"etag": '"v1"'}, html="<p>Cached page</p>")
+
+    cache = PageCache(database_path=str(tmp_path / "pages.db"), ttl_seconds=0.1)
+    fetcher = PageFetcher(transport=httpx.MockTransport(handler), cache=cache)
+    assert fetcher.fetch_page("https://a.example/")["status"] == "ok"
+
+    page = fetcher.fetch_page("https://a.example/")
+    assert (page["status"], page["text"], page["bytes"]) == ("cached", "Cached page", 0)
+    assert len(requests) == 1  # no network on a fresh hit
+
+    time.sleep(0.15)
+    page = fetcher.fetch_page("https://a.example/")
+    assert (page["status"], page["text"]) == ("revalidated", "Cached page")
+    assert requests[-1]["if-none-match"] == '"v1"'
+    assert fetcher.fetch_page("https://a.example/")["status"] == "cached"
+
+def test_extract_text_drops_scripts_and_chrome():
+    html = "<html><head><style>p{}</style></head><body><nav>Menu</nav><p>Hello</p><script>x()</script><p>World</p></body></html>"
+    assert extract_text(html) == "Hello\nWorld"
+
+class CountingSearch:
+    def __init__(self):
+        self.queries = []
+
+    def results(self, query, num_results):
+        self.queries.append(query)
+        return [{"link": f"https://example.com/{len(self.queries)}", "title": query}]
+
+def test_search_results_are_cached_until_quota_runs_out(tmp_path):
+    retriever = WebSearchRetriever.__new__(WebSearchRetriever)  # skips loading embeddings
+    retriever.search = CountingSearch()
+    retriever.search_cache = SearchResultCache(database_path=str(tmp_path / "search.db"), ttl_seconds=0.05, daily_quota=2)
+
+    first = retriever.search_results("Solar  Power Costs", 5)
+    assert retriever.search_results("solar power costs", 5) == first
+    assert retriever.search.queries == ["Solar  Power Costs"]  # sent as written, cached normalized
+
+    retriever.search_results("wind power", 5)
+    time.sleep(0.06)
+    # Quota used up: the expired entry is served and new queries aren't sent
+    assert retriever.search_results("solar power costs", 5) == first
+    assert retriever.search_results("tidal power", 5) == []
+    assert len(retriever.search.queries) == 2
+
+def test_search_api_calls_are_counted_with_caching_off(tmp_path):
+    retriever = WebSearchRetriever.__new__(WebSearchRetriever)
+    retriever.search = CountingSearch()
+    retriever.search_cache = SearchResultCache(database_path=str(tmp_path / "search.db"), ttl_seconds=0, daily_quota=5)
+
+    retriever.search_results("solar power", 5)
+    retriever.search_results("solar power", 5)
+    assert retriever.search.queries == ["solar power", "solar power"]
+    assert retriever.search_cache.stats()["api_calls_today"] == 2
+
+def test_close_rag_retriever_releases_the_fetcher(monkeypatch):
+    retriever = WebSearchRetriever.__new__(WebSearchRetriever)
+    retriever.fetcher = PageFetcher(transport=slow_transport({}, {}))
+    monkeypatch.setattr(rag, "_retriever_instance", retriever)
+
+    rag.close_rag_retriever()
+    assert retriever.fetcher.client.is_closed
+    with pytest.raises(RuntimeError):
+        retriever.fetcher._pool.submit(print)
+    assert rag._retriever_instance is None
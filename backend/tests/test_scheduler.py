@@ -0,0 +1,84 @@
+import asyncio
+import time
+import pytest
+from app.core.scheduler import LLMScheduler, get_llm_scheduler, llm_request_context, model_rate_limits, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+def drained_scheduler(**kwargs):
+    scheduler = LLMScheduler(**kwargs)
+    scheduler.requests.level = 0
+    scheduler.tokens.level = 0
+    return scheduler
+
+def test_interactive_jumps_ahead_of_bulk():
+    # 6000 RPM: one request slot every 10ms
+    scheduler = drained_scheduler(requests_per_minute=6000, tokens_per_minute=0)
+    order = []
+
+    async def call(name, priority):
+        await scheduler.acquire(1, priority=priority)
+        order.append(name)
+
+    async def run():
+        bulk = [asyncio.create_task(call(f"bulk{i}", PRIORITY_BULK)) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call("refine", PRIORITY_INTERACTIVE))
+        await asyncio.gather(*bulk, interactive)
+
+    asyncio.run(run())
+    assert order[0] == "refine"
+    assert order[1:] == ["bulk0", "bulk1", "bulk2"]
+
+def test_same_priority_ordered_by_deadline():
+    scheduler = drained_scheduler(requests_per_minute=6000, tokens_per_minute=0)
+    order = []
+
+    async def call(name, timeout):
+        with llm_request_context(PRIORITY_BULK, timeout=timeout):
+            await scheduler.acquire(1)
+        order.append(name)
+
+    async def run():
+        await asyncio.gather(call("late", 100), call("soon", 5), call("middle", 50))
+
+    asyncio.run(run())
+    assert order == ["soon", "middle", "late"]
+
+def test_token_bucket_paces_requests():
+    # 6000 TPM = 100 tokens/second
+    scheduler = drained_scheduler(requests_per_minute=0, tokens_per_minute=6000)
+
+    async def run():
+        started = time.monotonic()
+        await scheduler.acquire(20)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) == pytest.approx(0.2, abs=0.1)
+    stats = scheduler.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["priorities"]["interactive"]["granted"] == 1
+    assert stats["requests_available"] is None
+
+def test_cancelled_waiter_does_not_block_queue():
+    scheduler = drained_scheduler(requests_per_minute=0, tokens_per_minute=6000)
+
+    async def run():
+        big = asyncio.create_task(scheduler.acquire(5000))
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queue_depth"] == 1
+        big.cancel()
+        await asyncio.sleep(0)
+        await asyncio.wait_for(scheduler.acquire(1), timeout=1)
+        return scheduler.stats()["queue_depth"]
+
+    assert asyncio.run(run()) == 0
+
+def test_each_model_has_its_own_quota(monkeypatch):
+    monkeypatch.setenv("LLM_RATE_LIMITS", "small-model=60/6000")
+    monkeypatch.setenv("LLM_RATE_LIMIT_TPM", "12000")
+    assert model_rate_limits("small-model") == (60.0, 6000.0)
+    assert model_rate_limits("large-model") == (30.0, 12000.0)
+
+    large, small = get_llm_scheduler("test-large-model"), get_llm_scheduler("test-small-model")
+    assert large is get_llm_scheduler("test-large-model") and large is not small
+    large.tokens.level = 0
+    assert small.tokens.time_until(100) == 0.0
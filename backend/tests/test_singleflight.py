@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from app.core.singleflight import SingleFlight, input_hash
+
+def test_concurrent_duplicates_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"text": "done"}
+
+    async def run():
+        key = ("p1", "s1", input_hash({"section_id": "s1"}))
+        results = await asyncio.gather(*(flight.do("generate", key, generate) for _ in range(3)))
+        # Once finished, the key is released and a new call runs again
+        await flight.do("generate", key, generate)
+        return results
+
+    results = asyncio.run(run())
+    assert results == [{"text": "done"}] * 3
+    assert len(calls) == 2
+    stats = flight.stats()
+    assert stats["in_flight"] == 0
+    assert stats["operations"]["generate"] == {"calls": 4, "coalesced": 2, "coalesce_rate": 0.5}
+
+def test_different_inputs_are_not_coalesced():
+    flight = SingleFlight()
+
+    async def run():
+        async def echo(value):
+            await asyncio.sleep(0.01)
+            return value
+        return await asyncio.gather(
+            flight.do("outline", ("p1", input_hash({"topic": "EV"})), lambda: echo("EV")),
+            flight.do("outline", ("p1", input_hash({"topic": "AI"})), lambda: echo("AI"))
+        )
+
+    assert asyncio.run(run()) == ["EV", "AI"]
+
+def test_errors_propagate_to_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("LLM down")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("outline", "k", fail) for _ in range(2)), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert all(isinstance(e, ValueError) for e in errors)
@@ -0,0 +1,67 @@
+import asyncio
+from app.core.llm import MockLLMAdapter
+from app.core.speculation import SpeculativeGenerator
+
+KWARGS = {"title": "Intro", "topic": "EV", "word_count": 100, "outline_context": ["Intro", "Market"],
+          "doc_type": "docx", "section_position": 1, "use_rag": False}
+
+class CountingAdapter(MockLLMAdapter):
+    def __init__(self):
+        self.calls = 0
+
+    async def agenerate_section(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"text": f"<p>{kwargs['title']} text</p>", "bullets": []}
+
+def test_matching_request_takes_speculative_result():
+    speculator = SpeculativeGenerator()
+    adapter = CountingAdapter()
+
+    async def run():
+        speculator.start("p1", adapter, [("s1", KWARGS)])
+        # Still running: take() waits for it rather than generating again
+        result = await speculator.take("p1", "s1", dict(KWARGS))
+        # Claimed once - a second request generates normally
+        again = await speculator.take("p1", "s1", dict(KWARGS))
+        return result, again
+
+    result, again = asyncio.run(run())
+    assert result["text"] == "<p>Intro text</p>"
+    assert again is None
+    assert adapter.calls == 1
+    stats = speculator.stats()
+    assert stats["hits"] == 1 and stats["hit_rate"] == 1.0 and stats["words_generated"] == 2
+
+def test_changed_inputs_and_outline_edits_discard_speculation():
+    speculator = SpeculativeGenerator()
+    adapter = CountingAdapter()
+
+    async def run():
+        speculator.start("p1", adapter, [("s1", KWARGS), ("s2", dict(KWARGS, title="Market", section_position=2))])
+        # Section moved since speculation started - result is stale
+        stale = await speculator.take("p1", "s1", dict(KWARGS, section_position=2))
+        speculator.cancel_project("p1")
+        await asyncio.sleep(0.02)
+        return stale
+
+    assert asyncio.run(run()) is None
+    stats = speculator.stats()
+    assert stats["stale"] == 1 and stats["cancelled"] == 1
+    assert stats["hits"] == 0 and stats["pending"] == 0
+
+def test_unclaimed_results_expire_and_count_as_discarded():
+    speculator = SpeculativeGenerator(ttl_seconds=0.05)
+    adapter = CountingAdapter()
+
+    async def run():
+        speculator.start("p1", adapter, [("s1", KWARGS)])
+        # No further start(): the TTL timer alone drops the finished result
+        await asyncio.sleep(0.1)
+        pending = sum(len(entries) for entries in speculator._entries.values())
+        return pending, await speculator.take("p1", "s1", dict(KWARGS))
+
+    assert asyncio.run(run()) == (0, None)
+    stats = speculator.stats()
+    assert stats["discarded"] == 1 and stats["pending"] == 0
+    assert stats["hits"] == 0 and stats["stale"] == 0
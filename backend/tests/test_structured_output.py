@@ -0,0 +1,61 @@
+import asyncio
+import json
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import PydanticOutputParser
+from app.models import SectionContentSchema
+from app.core.structured_output import RepairingOutputParser, repair_json, get_parse_stats
+
+VALID = {"title": "Intro", "text": "Hello", "bullets": ["a"], "word_count": 1}
+
+@pytest.mark.parametrize("raw, expected", [
+    ('```json\n{"title": "A"}\n```', {"title": "A"}),
+    ('Sure! {"title": "A"} Let me know if you need more.', {"title": "A"}),
+    ('{"text": "<a href="https://x.com">link</a>", "bullets": ["a",],}', {"text": '<a href="https://x.com">link</a>', "bullets": ["a"]}),
+    ('{"text": "line one\nline two"}', {"text": "line one\nline two"}),
+    ('{"title": "A", "bullets": ["a", "b', {"title": "A", "bullets": ["a", "b"]}),
+    # Commas inside strings are content, not trailing commas
+    ('{"content": "<p>Options: [a, b, ]</p>"}\nHope this helps!', {"content": "<p>Options: [a, b, ]</p>"}),
+    ('{"content": "{x, }", "bullets": ["a", ],}', {"content": "{x, }", "bullets": ["a"]}),
+])
+def test_repair_json(raw, expected):
+    assert repair_json(raw) == expected
+
+def test_repair_json_gives_up_without_object():
+    assert repair_json("I can't help with that.") is None
+
+def section_parser(operation, fix_llm=None):
+    return RepairingOutputParser(parser=PydanticOutputParser(pydantic_object=SectionContentSchema), operation=operation, fix_llm=fix_llm)
+
+def test_parser_repairs_locally_before_reasking():
+    fix_llm = FakeListChatModel(responses=["should not be called"])
+    parser = section_parser("test_local", fix_llm)
+    raw = '{"title": "Intro", "text": "See <a href="https://x.com">this</a>", "bullets": ["a",], "word_count": 2}'
+    result = parser.parse(raw)
+    assert result.text == 'See <a href="https://x.com">this</a>'
+    assert get_parse_stats()["test_local"]["repaired"] == 1
+    assert fix_llm.i == 0
+
+def test_parser_reasks_llm_once_when_repair_fails():
+    # Missing required fields can't be repaired locally
+    fix_llm = FakeListChatModel(responses=[json.dumps(VALID)])
+    parser = section_parser("test_reask", fix_llm)
+    result = asyncio.run(parser.ainvoke('{"title": "Intro"}'))
+    assert result.bullets == ["a"]
+    stats = get_parse_stats()["test_reask"]
+    assert stats["reasked"] == 1 and stats["first_try_failure_rate"] == 1.0
+
+def test_parser_reask_waits_for_a_scheduler_slot():
+    from app.core.scheduler import LLMScheduler
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=0)
+    fix_llm = FakeListChatModel(responses=[json.dumps(VALID)])
+    parser = RepairingOutputParser(parser=PydanticOutputParser(pydantic_object=SectionContentSchema), operation="test_reask_slot", fix_llm=fix_llm, scheduler=scheduler)
+    asyncio.run(parser.ainvoke('{"title": "Intro"}'))
+    assert scheduler.stats()["priorities"]["interactive"]["granted"] == 1
+
+def test_parser_records_failures():
+    parser = section_parser("test_failed")
+    with pytest.raises(OutputParserException):
+        parser.parse("not json")
+    assert get_parse_stats()["test_failed"]["failure_rate"] == 1.0